@@ -0,0 +1,220 @@
+"""
+Privacy budget accounting.
+
+A `BudgetAccountant` can be attached to a dataset (and is shared by all
+datasets derived from it, e.g. by filtering or grouping). Every differentially
+private query on the dataset spends some of its budget. The epsilon value of a
+query is reserved before the query is evaluated, so that queries which would
+exceed the budget are refused before any data is read. The reservation is
+committed once the query returns, or released if it fails.
+
+Accountants are thread-safe. The lock is only held while the budget is
+updated, which takes constant time regardless of the number of queries.
+"""
+
+import functools
+import math
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from .instrumentation import span
+
+COMPOSITIONS = ("sequential", "advanced")
+
+
+class BudgetExceeded(ValueError):
+    pass
+
+
+class Reservation:
+    def __init__(self, epsilons: Sequence[float]):
+        self.epsilons = list(epsilons)
+        self.active = True
+
+
+class BudgetAccountant:
+
+    """
+    Tracks the privacy budget that is spent by queries on a dataset.
+
+    :param epsilon: The total privacy budget.
+    :param delta: The `delta` value that is allowed in addition to `epsilon`.
+      Advanced composition requires a positive `delta`.
+    :param composition: `"sequential"` adds up the epsilon values of all
+      queries. `"advanced"` uses the advanced composition theorem, which
+      allows for considerably more queries with small epsilon values (at the
+      cost of `delta`). As sequential composition holds as well, the smaller
+      of both bounds is used.
+    """
+
+    def __init__(
+        self, epsilon: float, delta: float = 0.0, composition: str = "sequential"
+    ):
+        if composition not in COMPOSITIONS:
+            raise ValueError(f"composition must be one of {', '.join(COMPOSITIONS)}")
+        if composition == "advanced" and not 0 < delta < 1:
+            raise ValueError("advanced composition requires 0 < delta < 1")
+        self.epsilon = epsilon
+        self.delta = delta
+        self.composition = composition
+        self.queries = 0
+        self._lock = threading.Lock()
+        # the sums required by the composition theorems, including reserved
+        # but uncommitted queries
+        self._sums = [0.0, 0.0, 0.0]
+        self._committed = [0.0, 0.0, 0.0]
+
+    @staticmethod
+    def terms(epsilons: Sequence[float]) -> List[float]:
+        return [
+            sum(epsilons),
+            sum(e * e for e in epsilons),
+            sum(e * math.expm1(e) for e in epsilons),
+        ]
+
+    def total(self, sums: Sequence[float]) -> float:
+        """
+        Returns the total epsilon value of all queries given the sums of their
+        epsilon values.
+        """
+        sequential, squares, excess = sums
+        if self.composition == "sequential":
+            return sequential
+        advanced = math.sqrt(2 * math.log(1 / self.delta) * squares) + excess
+        return min(sequential, advanced)
+
+    @property
+    def spent(self) -> float:
+        """
+        Returns the budget spent by all completed queries.
+        """
+        with self._lock:
+            return self.total(self._committed)
+
+    @property
+    def remaining(self) -> float:
+        """
+        Returns the budget that is neither spent nor reserved.
+        """
+        with self._lock:
+            return self.epsilon - self.total(self._sums)
+
+    def reserve(self, *epsilons: float) -> Reservation:
+        """
+        Reserves the budget for one or several queries, raising a
+        `BudgetExceeded` error if this would exceed the budget.
+        """
+        if any(e < 0 for e in epsilons):
+            raise ValueError("epsilon must not be negative")
+        terms = self.terms(epsilons)
+        with self._lock:
+            sums = [s + t for s, t in zip(self._sums, terms)]
+            # we allow for rounding errors when adding up epsilon values
+            if self.total(sums) > self.epsilon * (1 + 1e-9):
+                raise BudgetExceeded("privacy budget exceeded")
+            self._sums = sums
+        return Reservation(epsilons)
+
+    def commit(self, reservation: Reservation) -> None:
+        terms = self.terms(reservation.epsilons)
+        with self._lock:
+            if not reservation.active:
+                raise ValueError("reservation was already committed or released")
+            reservation.active = False
+            self._committed = [s + t for s, t in zip(self._committed, terms)]
+            self.queries += len(reservation.epsilons)
+
+    def release(self, reservation: Reservation) -> None:
+        terms = self.terms(reservation.epsilons)
+        with self._lock:
+            if not reservation.active:
+                raise ValueError("reservation was already committed or released")
+            reservation.active = False
+            self._sums = [s - t for s, t in zip(self._sums, terms)]
+
+    def spend(self, *epsilons: float) -> None:
+        self.commit(self.reserve(*epsilons))
+
+
+# whether the budget of the current query was already reserved
+_charging: ContextVar[bool] = ContextVar("dwork_budget_charging", default=False)
+
+
+def charging() -> bool:
+    """
+    Returns `True` if we are within a query whose budget was already
+    reserved.
+    """
+    return _charging.get()
+
+
+def accountants(obj: Any) -> List[BudgetAccountant]:
+    """
+    Returns the accountants of all datasets an expression (or a dataset)
+    refers to.
+    """
+    from .language.expression import Expression, datasets, inherited
+
+    found: Dict[int, BudgetAccountant] = {}
+    for dataset in datasets(obj) if isinstance(obj, Expression) else [obj]:
+        accountant = inherited(dataset, "accountant")
+        if accountant is not None:
+            found[id(accountant)] = accountant
+    return list(found.values())
+
+
+@contextmanager
+def charge(queries: Sequence[Tuple[Any, float]]) -> Iterator[None]:
+    """
+    Reserves the budget of several queries, given as `(expression, epsilon)`
+    or `(dataset, epsilon)` tuples, on the accountants of the datasets they
+    refer to. The budget is spent if the block succeeds and released
+    otherwise. Queries within the block (e.g. the `dp` calls of a batch) are
+    not charged again.
+    """
+    if _charging.get():
+        yield
+        return
+    epsilons: Dict[int, Tuple[BudgetAccountant, List[float]]] = {}
+    for obj, epsilon in queries:
+        for accountant in accountants(obj):
+            epsilons.setdefault(id(accountant), (accountant, []))[1].append(epsilon)
+    reservations: List[Tuple[BudgetAccountant, Reservation]] = []
+    try:
+        for accountant, values in epsilons.values():
+            reservations.append((accountant, accountant.reserve(*values)))
+    except BudgetExceeded:
+        for accountant, reservation in reservations:
+            accountant.release(reservation)
+        raise
+    token = _charging.set(True)
+    total = float(sum(epsilon for _, epsilon in queries))
+    try:
+        with span("query", epsilon=total, queries=len(queries)):
+            yield
+    except BaseException:
+        for accountant, reservation in reservations:
+            accountant.release(reservation)
+        raise
+    else:
+        for accountant, reservation in reservations:
+            accountant.commit(reservation)
+    finally:
+        _charging.reset(token)
+
+
+def charged(f: Any) -> Any:
+    """
+    Wraps the `dp` method of an expression so that the budget of the query
+    is charged to the accountants of all datasets the expression refers to.
+    """
+
+    @functools.wraps(f)
+    def dp(self: Any, epsilon: float, *args: Any, **kwargs: Any) -> Any:
+        if _charging.get():
+            return f(self, epsilon, *args, **kwargs)
+        with charge([(self, epsilon)]):
+            return f(self, epsilon, *args, **kwargs)
+
+    return dp
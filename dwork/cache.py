@@ -0,0 +1,177 @@
+"""
+Caching of differentially private results.
+
+Releasing the noisy result of a query a second time does not leak any
+additional information, so repeated queries can be answered from a cache
+without reading the data or spending privacy budget. A `ResultCache` can be
+attached to a dataset (and is shared by all datasets derived from it). Results
+are keyed by the structural key of the expression (see `Expression.key`), the
+epsilon value and the versions of the datasets the expression refers to, so
+cached results are not used anymore once a dataset changes (see
+`Dataset.invalidate`).
+"""
+
+import copy
+import functools
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+from .budget import charging
+from .instrumentation import materialized
+
+# marks missing cache entries
+MISSING = object()
+
+
+class ResultCache:
+    """
+    A thread-safe cache of differentially private results, which evicts the
+    least recently used results once it holds `maxsize` results or once the
+    arrays and series of its results take up more than `maxbytes` bytes.
+    Results that are larger than `maxbytes` on their own (e.g. the results of
+    queries on finely grouped datasets) are not cached. Scalar results are
+    only bounded by `maxsize`.
+    """
+
+    def __init__(self, maxsize: int = 1024, maxbytes: int = 64 * 2**20):
+        if maxsize < 1:
+            raise ValueError("maxsize must be positive")
+        if maxbytes < 0:
+            raise ValueError("maxbytes must not be negative")
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        # the cached results and their sizes in bytes
+        self._results: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Returns the cached result for the given key, or `MISSING`.
+        """
+        with self._lock:
+            if key not in self._results:
+                self.misses += 1
+                return MISSING
+            self.hits += 1
+            self._results.move_to_end(key)
+            return self._results[key][0]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        size = materialized(value)
+        with self._lock:
+            if key in self._results:
+                self.nbytes -= self._results.pop(key)[1]
+            if size > self.maxbytes:
+                return
+            self._results[key] = (value, size)
+            self.nbytes += size
+            while len(self._results) > self.maxsize or self.nbytes > self.maxbytes:
+                self.nbytes -= self._results.popitem(last=False)[1][1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._results.clear()
+            self.nbytes = 0
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+
+def caches(expression: Any) -> List[ResultCache]:
+    """
+    Returns the caches of all datasets an expression refers to.
+    """
+    from .language.expression import datasets, inherited
+
+    found: Dict[int, ResultCache] = {}
+    for dataset in datasets(expression):
+        cache = inherited(dataset, "cache")
+        if cache is not None:
+            found[id(cache)] = cache
+    return list(found.values())
+
+
+def result_key(expression: Any, epsilon: float) -> Optional[Hashable]:
+    """
+    Returns the key of the result of a query, which includes the current
+    versions of all datasets the query refers to, or `None` if the query
+    cannot be cached.
+    """
+    from .language.expression import datasets, inherited
+
+    key = expression.key
+    if key is None:
+        return None
+    versions = []
+    for dataset in datasets(expression):
+        source = inherited(dataset, "source")
+        if source is None:
+            return None
+        versions.append((source.token, source.version))
+    return (key, float(epsilon), tuple(versions))
+
+
+def get(caches: List[ResultCache], key: Hashable) -> Any:
+    for cache in caches:
+        value = cache.get(key)
+        if value is not MISSING:
+            # results like series are mutable, so we return a copy
+            return copy.copy(value)
+    return MISSING
+
+
+def put(caches: List[ResultCache], key: Hashable, value: Any) -> None:
+    for cache in caches:
+        cache.put(key, copy.copy(value))
+
+
+def cache_key(expression: Any, epsilon: float) -> Optional[Hashable]:
+    """
+    Returns the key of the result of a query, or `None` if the datasets of
+    the query have no cache or the query cannot be cached.
+    """
+    if not caches(expression):
+        return None
+    return result_key(expression, epsilon)
+
+
+def lookup(expression: Any, epsilon: float) -> Any:
+    """
+    Returns the cached result of a query, or `MISSING`.
+    """
+    key = cache_key(expression, epsilon)
+    if key is None:
+        return MISSING
+    return get(caches(expression), key)
+
+
+def store(expression: Any, epsilon: float, value: Any) -> None:
+    key = cache_key(expression, epsilon)
+    if key is not None:
+        put(caches(expression), key, value)
+
+
+def cached(f: Any) -> Any:
+    """
+    Wraps the `dp` method of an expression so that repeated queries return
+    the cached result.
+    """
+
+    @functools.wraps(f)
+    def dp(self: Any, epsilon: float, *args: Any, **kwargs: Any) -> Any:
+        if args or kwargs or charging():
+            return f(self, epsilon, *args, **kwargs)
+        found = caches(self)
+        key = result_key(self, epsilon) if found else None
+        if key is None:
+            return f(self, epsilon)
+        value = get(found, key)
+        if value is MISSING:
+            value = f(self, epsilon)
+            put(found, key, value)
+        return value
+
+    return dp
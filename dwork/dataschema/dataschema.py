@@ -1,5 +1,26 @@
-from ..language.types import Type
-from typing import Dict, Optional
+from ..language.types import Type, Integer, Float, Boolean
+from typing import Any, Dict, Optional
+
+# types that can be serialized, by name
+TYPES = {t.__name__: t for t in (Integer, Float, Boolean)}
+
+
+def type_to_dict(type: Type) -> Dict[str, Any]:
+    name = type.__class__.__name__
+    if TYPES.get(name) is not type.__class__:
+        raise ValueError(f"cannot serialize type: {name}")
+    if isinstance(type, (Integer, Float)):
+        return {"type": name, "min": type.min, "max": type.max}
+    return {"type": name}
+
+
+def type_from_dict(d: Dict[str, Any]) -> Type:
+    if d["type"] not in TYPES:
+        raise ValueError(f"unknown type: {d['type']}")
+    cls = TYPES[d["type"]]
+    if cls in (Integer, Float):
+        return cls(min=d["min"], max=d["max"])
+    return cls()
 
 
 class DataSchemaMeta(type):
@@ -17,3 +38,27 @@ class DataSchemaMeta(type):
 
 class DataSchema(metaclass=DataSchemaMeta):
     names: Optional[Dict[str, str]] = None
+
+    @classmethod
+    def to_dict(cls) -> Dict[str, Any]:
+        """
+        Returns a JSON-serializable description of the schema, which allows
+        other processes to reconstruct it via `from_dict`.
+        """
+        attributes = {
+            key: value for key, value in vars(cls).items() if isinstance(value, Type)
+        }
+        return {
+            "name": cls.__name__,
+            "attributes": {key: type_to_dict(t) for key, t in attributes.items()},
+            "names": cls.names,
+        }
+
+    @staticmethod
+    def from_dict(d: Dict[str, Any]) -> "DataSchemaMeta":
+        namespace: Dict[str, Any] = {
+            key: type_from_dict(t) for key, t in d["attributes"].items()
+        }
+        if d.get("names") is not None:
+            namespace["names"] = dict(d["names"])
+        return DataSchemaMeta(d["name"], (DataSchema,), namespace)
@@ -80,10 +80,23 @@ class TrueAttribute:
 
 
 class AttributeCondition(ConditionalExpression):
-    pass
+    @abc.abstractmethod
+    def __and__(self, other: "AttributeCondition") -> "AttributeCondition":
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def __or__(self, other: "AttributeCondition") -> "AttributeCondition":
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def __invert__(self) -> "AttributeCondition":
+        raise NotImplementedError
 
 
 class Attribute(Expression):
+    dataset: Any
+    column: str
+
     @abc.abstractmethod
     def __ge__(self, other: Any) -> AttributeCondition:
         raise NotImplementedError
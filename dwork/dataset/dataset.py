@@ -1,22 +1,83 @@
 import abc
-from typing import Type, TypeVar, Union, Iterable, Any
+import copy
+import itertools
+import numpy as np
+from typing import (
+    Type,
+    TypeVar,
+    Union,
+    Iterable,
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
 from .attribute import Attribute
 from ..language.types import Type as DworkType
-from ..language.expression import ConditionalExpression
+from ..language.expression import ConditionalExpression, Expression
+from ..language.evaluation import evaluation
 from ..dataschema import DataSchema
+from ..budget import BudgetAccountant, charge
+from .. import cache
+from ..cache import ResultCache
+from ..instrumentation import span
 
 DataSchemaType = TypeVar("DataSchemaType", bound=DataSchema)
 
+# unique tokens that identify datasets in the keys of expressions
+tokens = itertools.count()
+
 
 class Dataset:
 
     """Models a dataset with multiple attributes and rows of data. Allows
     slicing by attribute and filtering and provides functions like `len` and
     `group_by` that can be used to generated grouped datasets.
+
+    :param accountant: Tracks the privacy budget spent by queries on this
+      dataset and on all datasets derived from it (see `dwork.budget`).
+    :param cache: Caches the results of queries on this dataset and on all
+      datasets derived from it (see `dwork.cache`).
+
+    Every dataset has a `token` that identifies it in the keys of expressions.
+    Datasets derived from another dataset (e.g. by filtering) share its
+    `source`, whose `version` changes when the data changes.
     """
 
-    def __init__(self, schema: Type[DataSchemaType]):
+    def __init__(
+        self,
+        schema: Type[DataSchemaType],
+        *,
+        accountant: Optional[BudgetAccountant] = None,
+        cache: Optional[ResultCache] = None,
+    ):
         self.schema = schema
+        self.accountant = accountant
+        self.cache = cache
+        self.token: Optional[Hashable] = next(tokens)
+        # we do not store the dataset itself, as the reference cycle would
+        # keep it (and its data) alive until the garbage collector runs
+        self._source: Optional[Dataset] = None
+        self.version = 0
+
+    @property
+    def source(self) -> "Dataset":
+        return self if self._source is None else self._source
+
+    @source.setter
+    def source(self, source: "Dataset") -> None:
+        self._source = None if source is self else source
+
+    def invalidate(self) -> None:
+        """
+        Marks the data of the dataset as changed, so that cached results of
+        queries on it (or on datasets derived from it) are not used anymore.
+        """
+        self.source.version += 1
 
     @abc.abstractmethod
     def len(self) -> int:
@@ -29,6 +90,62 @@ class Dataset:
     def group_by(self, **kwargs) -> "GroupedDataset":
         raise NotImplementedError
 
+    def evaluate_batch(
+        self, expressions: Sequence[Expression], epsilons: Union[float, Sequence[float]]
+    ) -> List[Any]:
+        """
+        Returns the differentially private values of several expressions.
+        All expressions are evaluated together, so that the data required by
+        several of them only needs to be computed once.
+
+        :param epsilons: The epsilon value for every expression, or a single
+          value that is used for all of them.
+        """
+        return evaluate_batch(expressions, epsilons, self.precompute)
+
+    def histogram(self, column: str, bins: Any = None) -> Expression:
+        """
+        Returns an expression for the number of rows in every bin of a column
+        as a dense array (see `dwork.language.functions.Histogram`).
+
+        :param bins: `None` for a bin per value of a bounded integer column,
+          the number of bins of equal width, or the edges of the bins.
+        """
+        from ..language.functions import Histogram
+
+        return Histogram(self, [column], [bins])
+
+    def crosstab(
+        self, columns: Sequence[str], bins: Optional[Sequence[Any]] = None
+    ) -> Expression:
+        """
+        Returns an expression for the number of rows in every combination of
+        the bins of several columns (i.e. a contingency table) as a dense
+        array with one dimension per column.
+
+        :param bins: The bins of every column, please see `histogram`.
+        """
+        from ..language.functions import Histogram
+
+        return Histogram(self, columns, bins or [None] * len(columns))
+
+    def bin_counts(
+        self, columns: Sequence[str], edges: Sequence[np.ndarray]
+    ) -> np.ndarray:
+        """
+        Counts the rows in every cell of the grid that is spanned by the given
+        bins of the columns.
+        """
+        raise NotImplementedError
+
+    def precompute(self, expressions: Sequence[Expression]) -> None:
+        """
+        Computes true values that are required by the given expressions in the
+        current evaluation context. Datasets can override this to compute
+        values for several expressions at once.
+        """
+        pass
+
     @abc.abstractmethod
     def __getitem__(
         self, column_or_expression: Union[str, ConditionalExpression]
@@ -40,8 +157,22 @@ class GroupedDataset:
 
     """Groups a dataset using a number of expressions. Provides two functions
     that return the group attributes as well as the actual datasets.
+
+    Expressions built from a grouped dataset (e.g. `dsg["x"].sum()/dsg.len()`)
+    are evaluated for all groups at once and return a result per group.
     """
 
+    # the dataset that was grouped
+    dataset: Any
+
+    @abc.abstractmethod
+    def len(self) -> Any:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def __getitem__(self, column: str) -> Attribute:
+        raise NotImplementedError
+
     @abc.abstractproperty
     def groups(self) -> Iterable[Any]:
         raise NotImplementedError
@@ -49,3 +180,45 @@ class GroupedDataset:
     @abc.abstractproperty
     def datasets(self) -> Iterable[Dataset]:
         raise NotImplementedError
+
+
+def evaluate_batch(
+    expressions: Sequence[Expression],
+    epsilons: Union[float, Sequence[float]],
+    precompute: Callable[[Sequence[Expression]], None],
+) -> List[Any]:
+    """
+    Returns the differentially private values of several expressions. Cached
+    results are returned right away, the budget for all other expressions is
+    reserved at once before `precompute` computes the values they require.
+    """
+    if isinstance(epsilons, (int, float)):
+        epsilons = [epsilons] * len(expressions)
+    if len(epsilons) != len(expressions):
+        raise ValueError("expected an epsilon value for every expression")
+    results = [cache.lookup(e, eps) for e, eps in zip(expressions, epsilons)]
+    missing: List[int] = []
+    # cacheable queries that occur several times in the batch are only
+    # evaluated (and charged) once
+    first: Dict[Hashable, int] = {}
+    duplicates: List[Tuple[int, int]] = []
+    for i, result in enumerate(results):
+        if result is not cache.MISSING:
+            continue
+        key = cache.cache_key(expressions[i], epsilons[i])
+        if key is not None and key in first:
+            duplicates.append((i, first[key]))
+            continue
+        if key is not None:
+            first[key] = i
+        missing.append(i)
+    queries = [(expressions[i], epsilons[i]) for i in missing]
+    with charge(queries), evaluation():
+        with span("precompute", counted=True):
+            precompute([expression for expression, _ in queries])
+        for i, (expression, epsilon) in zip(missing, queries):
+            results[i] = expression.dp(epsilon)
+            cache.store(expression, epsilon, results[i])
+    for i, j in duplicates:
+        results[i] = copy.copy(results[j])
+    return results
@@ -0,0 +1,335 @@
+"""
+Fused evaluation of arithmetic column expressions.
+
+Arithmetic on the true values of pandas attributes is recorded as a tree of
+operations instead of being executed right away. When an aggregate like a sum
+is requested, the tree is compiled into a single function that evaluates the
+whole expression for a range of rows. We then aggregate the data in chunks, so
+that temporary arrays never grow beyond the chunk size, regardless of how many
+operations the expression contains.
+
+If `numexpr` is installed, it is used to evaluate every chunk, which avoids
+the temporary arrays within a chunk as well.
+"""
+
+import operator
+import numpy as np
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from .attribute import TrueAttribute
+
+try:
+    import numexpr  # type: ignore
+except ImportError:  # pragma: no cover
+    numexpr = None
+
+# number of rows that we evaluate at once
+CHUNK_SIZE = 1 << 16
+
+# expressions used to translate operations to numexpr
+NUMEXPR_OPERATIONS = {
+    operator.add: "({} + {})",
+    operator.sub: "({} - {})",
+    operator.mul: "({} * {})",
+    operator.truediv: "({} / {})",
+    operator.abs: "abs({})",
+}
+
+# maximum number of arrays that we pass to numexpr
+NUMEXPR_MAX_INPUTS = 32
+
+# maximum nesting of the expressions that we pass to numexpr, which parses
+# them with the Python parser (that refuses deeply nested parentheses)
+NUMEXPR_MAX_DEPTH = 100
+
+Evaluator = Callable[[int, int], Any]
+
+
+def is_integer(values: Any) -> bool:
+    return np.asarray(values).dtype.kind in "biu"
+
+
+def truediv(left: Any, right: Any) -> Any:
+    # like pandas, we return inf (or nan) for divisions by zero
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.true_divide(left, right)
+
+
+def floordiv(left: Any, right: Any) -> Any:
+    """
+    Floor division with the semantics of pandas, which returns inf (or nan)
+    for divisions of integers by zero, where NumPy returns 0.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if is_integer(left) and is_integer(right) and np.any(np.equal(right, 0)):
+            return np.floor_divide(np.asarray(left, dtype=np.float64), right)
+        return np.floor_divide(left, right)
+
+
+# operations that NumPy evaluates differently from pandas
+NUMPY_OPERATIONS = {operator.truediv: truediv, operator.floordiv: floordiv}
+
+
+def is_constant(node: Any) -> bool:
+    return not isinstance(node, TrueAttribute)
+
+
+def is_leaf(node: Any) -> bool:
+    return node.operation is None
+
+
+def postfix(node: Any) -> List[Any]:
+    """
+    Returns the nodes of an operation tree in postfix order, i.e. every
+    operation follows its operands. We use a stack instead of recursion, as
+    the trees of long expressions can be very deep.
+    """
+    nodes: List[Any] = []
+    stack = [(node, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded or is_constant(node) or is_leaf(node):
+            nodes.append(node)
+            continue
+        stack.append((node, True))
+        stack.extend((operand, False) for operand in reversed(node.operands))
+    return nodes
+
+
+def leaves(node: Any) -> Iterator[Any]:
+    """
+    Returns all columns of an operation tree.
+    """
+    for item in postfix(node):
+        if not is_constant(item) and is_leaf(item):
+            yield item
+
+
+def numeric(column: Any) -> bool:
+    """
+    Checks whether a column is backed by a plain numeric NumPy array.
+    """
+    return isinstance(column.dtype, np.dtype) and column.dtype.kind in "biuf"
+
+
+def widen(values: Any) -> Any:
+    """
+    Converts compact integer and float values (e.g. `uint8` columns created
+    from a schema, see `dwork.dataset.ingest`) to 64 bit values, so that
+    arithmetic on them cannot overflow. We only convert a chunk at a time.
+    """
+    dtype = getattr(values, "dtype", None)
+    if not isinstance(dtype, np.dtype) or dtype.itemsize >= 8:
+        return values
+    if dtype.kind in "biu":
+        return values.astype(np.int64)
+    if dtype.kind == "f":
+        return values.astype(np.float64)
+    return values
+
+
+def fusable(node: Any) -> bool:
+    """
+    Checks whether all columns of the tree are plain NumPy arrays, so that we
+    can evaluate slices of them without copying any data.
+    """
+    return all(numeric(leaf.column) for leaf in leaves(node))
+
+
+def compile_numpy(node: Any) -> Evaluator:
+    """
+    Compiles an operation tree into a function that evaluates the expression
+    for the rows `start:end` with NumPy.
+    """
+    steps: List[Tuple[str, Any]] = []
+    for item in postfix(node):
+        if is_constant(item):
+            steps.append(("constant", item))
+        elif is_leaf(item):
+            steps.append(("column", item.column.to_numpy()))
+        else:
+            op = NUMPY_OPERATIONS.get(item.operation, item.operation)
+            steps.append(("operation", (op, len(item.operands))))
+
+    def evaluate(start: int, end: int) -> Any:
+        # the values of the operands that were not used yet
+        stack: List[Any] = []
+        for kind, value in steps:
+            if kind == "constant":
+                stack.append(value)
+            elif kind == "column":
+                stack.append(widen(value[start:end]))
+            else:
+                op, count = value
+                operands = stack[-count:]
+                del stack[-count:]
+                stack.append(op(*operands))
+        return stack.pop()
+
+    return evaluate
+
+
+def compile_numexpr(node: Any) -> Optional[Evaluator]:
+    """
+    Compiles an operation tree into a function that evaluates the expression
+    for the rows `start:end` with numexpr. Returns `None` if numexpr is not
+    installed or does not support one of the operations.
+    """
+    if numexpr is None:
+        return None
+    arrays: Dict[str, np.ndarray] = {}
+    names: Dict[Any, str] = {}
+    # the translated operands that were not used yet and their nesting
+    stack: List[Tuple[str, int]] = []
+    for item in postfix(node):
+        if is_constant(item):
+            value = item.item() if isinstance(item, np.generic) else item
+            if not np.isfinite(value):
+                # numexpr has no literals for `inf` and `nan`
+                return None
+            stack.append((repr(value), 0))
+        elif is_leaf(item):
+            values = item.column.to_numpy()
+            # identical columns are passed to numexpr only once
+            key = (values.__array_interface__["data"], values.strides, values.dtype)
+            if key not in names:
+                names[key] = f"a{len(arrays)}"
+                arrays[names[key]] = values
+            stack.append((names[key], 0))
+        else:
+            template = NUMEXPR_OPERATIONS.get(item.operation)
+            if template is None:
+                return None
+            count = len(item.operands)
+            operands = stack[-count:]
+            del stack[-count:]
+            depth = 1 + max(depth for _, depth in operands)
+            if depth > NUMEXPR_MAX_DEPTH:
+                return None
+            stack.append((template.format(*(text for text, _ in operands)), depth))
+    expression, _ = stack.pop()
+    if len(arrays) > NUMEXPR_MAX_INPUTS:
+        return None
+
+    def evaluate(start: int, end: int) -> Any:
+        chunk = {name: widen(values[start:end]) for name, values in arrays.items()}
+        return numexpr.evaluate(expression, local_dict=chunk)
+
+    return evaluate
+
+
+def compile(node: Any) -> Evaluator:
+    evaluator = compile_numexpr(node)
+    if evaluator is None:
+        return compile_numpy(node)
+    return evaluator
+
+
+def chunks(
+    node: Any, rows: int, chunk_size: Optional[int] = None, start: int = 0
+) -> Iterator[Tuple[slice, np.ndarray]]:
+    """
+    Evaluates an operation tree in chunks of rows and yields the rows of every
+    chunk together with the values of the expression for these rows.
+
+    :param start: The first row to evaluate, `rows` is the end of the range.
+    """
+    if chunk_size is None:
+        chunk_size = CHUNK_SIZE
+    evaluate = compile(node)
+    for start in range(start, rows, chunk_size):
+        end = min(start + chunk_size, rows)
+        values = np.broadcast_to(evaluate(start, end), (end - start,))
+        yield slice(start, end), values
+
+
+def masked_sums(
+    columns: List[np.ndarray],
+    masks: List[Optional[np.ndarray]],
+    rows: int,
+    chunk_size: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sums up several columns for several row masks at once, reading every
+    column and mask only once. Returns a matrix with the sum of every column
+    for every mask, and the number of rows selected by every mask.
+
+    We sum up the rows of a chunk that every mask selects, so that values in
+    other rows (e.g. infinite ones) cannot affect the sums. Missing values are
+    ignored.
+    """
+    if chunk_size is None:
+        chunk_size = CHUNK_SIZE
+    sums = np.zeros((len(masks), len(columns)))
+    counts = np.zeros(len(masks), dtype=np.int64)
+    for start in range(0, rows, chunk_size):
+        end = min(start + chunk_size, rows)
+        values = np.empty((end - start, len(columns)))
+        for i, column in enumerate(columns):
+            values[:, i] = column[start:end]
+        values[np.isnan(values)] = 0
+        for i, mask in enumerate(masks):
+            if mask is None:
+                sums[i] += values.sum(axis=0)
+                counts[i] += end - start
+            else:
+                selected = mask[start:end]
+                sums[i] += values[selected].sum(axis=0)
+                counts[i] += np.count_nonzero(selected)
+    return sums, counts
+
+
+def bin_codes(values: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """
+    Returns the bin of every value given the edges of the bins, or -1 for
+    values outside of all bins (and missing values). Every bin includes its
+    lower edge, the last bin includes its upper edge as well.
+    """
+    values = widen(values)
+    bins = len(edges) - 1
+    step = edges[1] - edges[0] if bins else 0
+    if (
+        values.dtype.kind in "biu"
+        and step == 1
+        and float(edges[0] + 0.5).is_integer()
+        and edges[-1] - edges[0] == bins
+    ):
+        # bins of single integer values, which we can compute directly
+        codes = values - int(edges[0] + 0.5)
+    else:
+        codes = np.searchsorted(edges, values, side="right") - 1
+        codes[values == edges[-1]] = bins - 1
+    codes[(codes < 0) | (codes >= bins)] = -1
+    return codes
+
+
+def bin_counts(
+    columns: List[np.ndarray],
+    edges: List[np.ndarray],
+    mask: Optional[np.ndarray],
+    rows: int,
+    chunk_size: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Counts the rows in every cell of the grid that is spanned by the bins of
+    several columns (only considering the rows selected by the mask), reading
+    every column only once. Returns a dense array with one dimension per
+    column.
+    """
+    if chunk_size is None:
+        chunk_size = CHUNK_SIZE
+    shape = tuple(len(e) - 1 for e in edges)
+    cells = int(np.prod(shape, dtype=np.int64))
+    counts = np.zeros(cells, dtype=np.int64)
+    for start in range(0, rows, chunk_size):
+        end = min(start + chunk_size, rows)
+        # the index of the cell of every row
+        cell = np.zeros(end - start, dtype=np.int64)
+        valid = np.ones(end - start, dtype=bool)
+        for column, e in zip(columns, edges):
+            codes = bin_codes(column[start:end], e)
+            valid &= codes >= 0
+            cell = cell * (len(e) - 1) + codes
+        if mask is not None:
+            valid &= mask[start:end]
+        counts += np.bincount(cell[valid], minlength=cells)
+    return counts.reshape(shape)
@@ -0,0 +1,281 @@
+"""
+Datasets that only grow, e.g. tables of events.
+
+An incremental dataset maintains running totals (the number of rows and the
+sum of every numeric column, optionally per group) that are updated whenever
+a batch of rows is appended. Row counts and sums of columns are answered from
+these totals, so evaluating them again after an append only costs as much as
+the new rows. Other expressions (e.g. filters or arithmetic on columns) are
+evaluated on the full data as usual.
+
+Appended batches are only concatenated with the existing rows once an
+expression actually needs to read the data.
+"""
+
+import copy
+import numpy as np
+import pandas as pd
+from functools import cached_property
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+from . import fused
+from .dataset import GroupedDataset, tokens
+from .pandas import (
+    GroupedPandasDataset,
+    PandasAttribute,
+    PandasDataset,
+    PandasLength,
+    TruePandasAttribute,
+)
+from ..budget import charge
+from ..language import evaluation
+from ..language.expression import Expression, walk
+from ..language.functions import Sum
+from ..language.types import Integer
+
+# the name of the column that holds the row counts of grouped totals
+COUNT = "__count__"
+
+Grouping = Tuple[str, ...]
+
+
+def to_grouping(by: Union[str, Sequence[str]]) -> Grouping:
+    return (by,) if isinstance(by, str) else tuple(by)
+
+
+def column_sum(values: Any) -> Any:
+    values = fused.widen(values)
+    if values.dtype.kind in "biu":
+        return np.int64(np.sum(values, dtype=np.int64))
+    return np.nansum(values)
+
+
+class TrueIncrementalAttribute(TruePandasAttribute):
+
+    """
+    A column of an incremental dataset whose sum is known from the running
+    totals. The values of the column are only loaded if they are required.
+    """
+
+    def __init__(
+        self,
+        dataset: "IncrementalDataset",
+        name: str,
+        total: Any,
+        grouping: Optional[GroupedPandasDataset] = None,
+    ):
+        self.dataset = dataset
+        self.name = name
+        self.total = total
+        self.mask = None
+        self.grouping = grouping
+
+    @property  # type: ignore[override]
+    def column(self) -> pd.Series:
+        return self.dataset.df[self.name]
+
+    @property
+    def rows(self) -> int:
+        return self.dataset.rows
+
+    def sum(self, start: int = 0, end: Optional[int] = None) -> Any:
+        if start == 0 and end is None:
+            return self.total
+        return super().sum(start, end)
+
+
+class GroupedIncrementalDataset(GroupedPandasDataset):
+
+    """
+    Groups an incremental dataset by columns whose totals it maintains. The
+    groups are determined from the running totals, so grouping (and counting
+    or summing up the rows of every group) does not read the data. Takes the
+    same arguments as `GroupedPandasDataset`, please see there for the privacy
+    implications of the `treshold`.
+    """
+
+    def __init__(self, dataset, treshold=10, epsilon=0.3, **kwargs) -> None:
+        self.kwargs = kwargs
+        self.dataset = dataset
+        self.schema = dataset.schema
+        # every grouping yields different (noisy) groups
+        self.token = next(tokens)
+        totals = dataset.totals[to_grouping(kwargs["by"])]
+        with charge([(dataset, epsilon)] if treshold is not None else []):
+            counts = totals[COUNT].to_numpy()
+            keep = counts > 0
+            if treshold is not None:
+                noisy_counts = Integer(min=0).dp(counts, 1, epsilon)
+                keep &= noisy_counts >= treshold
+        self.suppressed_groups = int(len(keep) - keep.sum())
+        self.keys = totals.index[keep]
+        self.totals = totals[keep]
+        self._datasets = None
+
+    @cached_property
+    def codes(self) -> np.ndarray:  # type: ignore[override]
+        """
+        Returns the group code of every row, which requires reading the data.
+        """
+        grouper = self.dataset.df.groupby(**self.kwargs)
+        codes = grouper.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+        mapping = np.append(self.keys.get_indexer(grouper.size().index), -1)
+        return mapping[codes]
+
+    def count(self, start: int = 0, end: Optional[int] = None) -> pd.Series:
+        if start == 0 and end is None:
+            return self.totals[COUNT].rename(None)
+        return super().count(start, end)
+
+    def column(self, column: str) -> TruePandasAttribute:
+        if column not in self.totals.columns:
+            return super().column(column)
+        total = self.totals[column].rename(None)
+        return TrueIncrementalAttribute(self.dataset, column, total, grouping=self)
+
+
+class IncrementalDataset(PandasDataset):
+
+    """
+    A pandas dataset that rows can be appended to (see `append`), which
+    maintains the row count and the sums of all numeric columns.
+
+    :param groupings: Columns (or lists of columns) to maintain the row counts
+      and sums of every group for. Grouping the dataset by exactly these
+      columns does not read the data.
+
+    Filtered datasets and groupings reflect the rows of the dataset at the
+    time they were created.
+    """
+
+    def __init__(
+        self,
+        schema,
+        df: pd.DataFrame,
+        *args,
+        groupings: Sequence[Union[str, Sequence[str]]] = (),
+        **kwargs,
+    ):
+        if kwargs.get("mask") is not None:
+            raise ValueError("incremental datasets cannot be filtered")
+        self._batches: List[pd.DataFrame] = [df]
+        super().__init__(schema, df, *args, **kwargs)
+        self.columns = list(df.columns)
+        self.rows = 0
+        self.sums: Dict[str, Any] = {
+            column: column_sum(df[column].to_numpy()[:0])
+            for column in self.columns
+            if fused.numeric(df[column])
+        }
+        self.totals: Dict[Grouping, pd.DataFrame] = {}
+        for by in groupings:
+            grouping = to_grouping(by)
+            if any(column not in self.columns for column in grouping):
+                raise ValueError(f"cannot group by unknown columns {grouping}")
+            self.totals[grouping] = self.grouped_totals(df[:0], grouping)
+        self.update(df)
+
+    @property  # type: ignore[override]
+    def df(self) -> pd.DataFrame:
+        if len(self._batches) > 1:
+            self._batches = [pd.concat(self._batches, ignore_index=True)]
+        return self._batches[0]
+
+    @df.setter
+    def df(self, df: pd.DataFrame) -> None:
+        self._batches = [df]
+
+    def grouped_totals(self, batch: pd.DataFrame, grouping: Grouping) -> pd.DataFrame:
+        """
+        Returns the row counts and column sums of every group of a batch.
+        """
+        grouper = batch.groupby(by=list(grouping))
+        totals = grouper[[c for c in self.sums if c not in grouping]].sum()
+        totals[COUNT] = grouper.size()
+        return totals
+
+    def update(self, batch: pd.DataFrame) -> None:
+        # we replace the totals instead of modifying them, as snapshots of
+        # the dataset share them
+        self.rows += len(batch)
+        self.sums = {
+            column: total + column_sum(batch[column].to_numpy())
+            for column, total in self.sums.items()
+        }
+        totals = {}
+        for grouping, previous in self.totals.items():
+            current = self.grouped_totals(batch, grouping)
+            index = previous.index.union(current.index)
+            totals[grouping] = previous.reindex(index, fill_value=0) + current.reindex(
+                index, fill_value=0
+            )
+        self.totals = totals
+
+    def append(self, df: pd.DataFrame) -> None:
+        """
+        Appends rows to the dataset and updates the running totals, which
+        takes time proportional to the number of appended rows. Cached results
+        of queries on the dataset are invalidated.
+        """
+        if list(df.columns) != self.columns:
+            raise ValueError("appended rows must have the columns of the dataset")
+        if not len(df):
+            return
+        self.update(df)
+        self._batches.append(df)
+        self.invalidate()
+
+    def snapshot(self) -> "IncrementalDataset":
+        """
+        Returns a copy of the dataset that is not affected by later appends.
+        This takes constant time, as the copy shares the data and the running
+        totals with the dataset.
+        """
+        snapshot = copy.copy(self)
+        snapshot._batches = list(self._batches)
+        # the snapshot holds other rows than the dataset once rows are
+        # appended, so results of queries on them must not be mixed up
+        snapshot.token = next(tokens)
+        snapshot.source = snapshot
+        snapshot.version = 0
+        return snapshot
+
+    def count(self, start: int = 0, end: Optional[int] = None) -> int:
+        if start == 0 and end is None:
+            return self.rows
+        return super().count(start, end)
+
+    def column(self, column: str) -> TruePandasAttribute:
+        if column not in self.sums:
+            return super().column(column)
+        return TrueIncrementalAttribute(self, column, self.sums[column])
+
+    def group_by(self, **kwargs) -> GroupedDataset:
+        by = kwargs.get("by")
+        if (
+            isinstance(by, (str, list, tuple))
+            and to_grouping(by) in self.totals
+            and set(kwargs) <= {"by", "treshold", "epsilon"}
+        ):
+            return GroupedIncrementalDataset(self.snapshot(), **kwargs)
+        return GroupedPandasDataset(self.snapshot(), **kwargs)
+
+    def precompute(self, expressions: Sequence[Expression]) -> None:
+        """
+        Sets the row counts and column sums that are known from the running
+        totals, and computes all other aggregates as usual.
+        """
+        context = evaluation.current()
+        if context is None:
+            return
+        for expression in expressions:
+            for node in walk(expression):
+                if isinstance(node, PandasLength) and node.dataset is self:
+                    context.set(node, self.rows)
+                elif (
+                    isinstance(node, Sum)
+                    and isinstance(node.expression, PandasAttribute)
+                    and node.expression.dataset is self
+                    and node.expression.column in self.sums
+                ):
+                    context.set(node, self.sums[node.expression.column])
+        super().precompute(expressions)
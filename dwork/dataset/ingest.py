@@ -0,0 +1,109 @@
+"""
+Prepares data frames for use with a schema.
+
+The bounds of the attributes in a schema determine the sensitivities of all
+expressions, so every value needs to be within these bounds. `ingest` checks
+the values of every column of the schema and either clips them to the bounds
+or rejects the data. It also converts every integer column to the smallest
+data type that can hold all values within the bounds (e.g. `uint8` for
+`Integer(min=0, max=200)`), which considerably reduces the memory required by
+integer data. Expressions convert these values to 64 bit values chunk by
+chunk during evaluation, so arithmetic on them cannot overflow.
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Any, List
+from ..language.types import Integer, Float, Numeric
+
+# integer data types, from the smallest to the largest
+INTEGER_DTYPES: List[Any] = [
+    np.uint8,
+    np.int8,
+    np.uint16,
+    np.int16,
+    np.uint32,
+    np.int32,
+    np.uint64,
+    np.int64,
+]
+
+BOUNDS = ("clip", "reject")
+
+
+def integer_dtype(type: Integer) -> np.dtype:
+    """
+    Returns the smallest integer data type that can hold all values within
+    the bounds of the given type.
+    """
+    if type.min is None or type.max is None:
+        return np.dtype(np.int64)
+    for dtype in INTEGER_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= type.min and type.max <= info.max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def limits(type: Numeric, dtype: np.dtype) -> Any:
+    """
+    Returns the bounds of the given type, limited to the values that can be
+    represented by the given data type.
+    """
+    lower = -np.inf if type.min is None else type.min
+    upper = np.inf if type.max is None else type.max
+    if dtype.kind in "iu":
+        info = np.iinfo(dtype)
+        lower, upper = max(lower, info.min), min(upper, info.max)
+    return lower, upper
+
+
+def ingest_column(name: str, type: Numeric, values: np.ndarray, bounds: str) -> Any:
+    if not isinstance(values.dtype, np.dtype) or values.dtype.kind not in "biuf":
+        raise ValueError(f"column {name} is not numeric")
+    missing = values.dtype.kind == "f" and bool(np.isnan(values).any())
+    if isinstance(type, Integer) and not missing:
+        dtype = integer_dtype(type)
+    else:
+        # missing values require a float column
+        dtype = np.dtype(np.float64)
+    lower, upper = limits(type, dtype)
+    if isinstance(type, Integer) and values.dtype.kind == "f":
+        fractional = values != np.floor(values)
+        if missing:
+            fractional &= ~np.isnan(values)
+        if fractional.any():
+            if bounds == "reject":
+                raise ValueError(f"column {name} contains non-integer values")
+            values = np.rint(values)
+    if len(values) and (np.nanmin(values) < lower or np.nanmax(values) > upper):
+        if bounds == "reject":
+            outside = np.count_nonzero((values < lower) | (values > upper))
+            raise ValueError(f"column {name} has {outside} values outside of bounds")
+        values = np.clip(values, lower, upper)
+    return values.astype(dtype, copy=False)
+
+
+def ingest(schema, df: pd.DataFrame, bounds: str = "clip") -> pd.DataFrame:
+    """
+    Returns a copy of the data frame in which the values of all integer and
+    float attributes of the schema are within their bounds and stored in the
+    smallest suitable data type. Float columns are kept as 64 bit floats, as
+    smaller float types would lose precision. Other columns are copied as
+    they are.
+
+    :param bounds: `"clip"` clips values that are out of bounds, `"reject"`
+      raises a `ValueError` instead. Integer columns with fractional values
+      are rounded or rejected in the same way.
+    """
+    if bounds not in BOUNDS:
+        raise ValueError(f"bounds must be one of {', '.join(BOUNDS)}")
+    columns = {}
+    for column in df.columns:
+        type = schema.attributes.get(column)
+        if isinstance(type, (Integer, Float)):
+            values = df[column].to_numpy()
+            columns[column] = ingest_column(column, type, values, bounds)
+        else:
+            columns[column] = df[column]
+    return pd.DataFrame(columns, index=df.index)
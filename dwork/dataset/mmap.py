@@ -0,0 +1,87 @@
+"""
+An on-disk columnar format for datasets that are loaded many times.
+
+A dataset is stored in a directory that contains one `.npy` file per column
+and a `manifest.json` file that describes the columns and the schema of the
+dataset (including the types and bounds of all attributes). Opening a dataset
+memory-maps the column files without reading them, so it takes milliseconds
+regardless of the size of the data, and queries only page in the columns (and
+rows) that they actually read.
+"""
+
+import json
+import os
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, Optional, Sequence
+from .pandas import PandasDataset
+from . import fused
+from ..dataschema import DataSchema
+
+MANIFEST = "manifest.json"
+VERSION = 1
+
+
+def save(
+    dataset: PandasDataset, path: str, columns: Optional[Sequence[str]] = None
+) -> None:
+    """
+    Writes the numeric columns of a dataset (only the rows that belong to it)
+    to the given directory.
+
+    :param columns: The columns to write, defaults to all numeric columns of
+      the dataset.
+    """
+    df = dataset.df if dataset.mask is None else dataset.df[dataset.mask]
+    if columns is None:
+        columns = [c for c in df.columns if fused.numeric(df[c])]
+    os.makedirs(path, exist_ok=True)
+    manifest: Dict[str, Any] = {
+        "version": VERSION,
+        "rows": len(df),
+        "schema": dataset.schema.to_dict(),
+        "columns": [],
+    }
+    for i, column in enumerate(columns):
+        if not fused.numeric(df[column]):
+            raise ValueError(f"column {column} is not numeric")
+        filename = f"column_{i}.npy"
+        np.save(os.path.join(path, filename), df[column].to_numpy())
+        manifest["columns"].append(
+            {"name": column, "dtype": df[column].dtype.str, "file": filename}
+        )
+    # we write the manifest last, so that a dataset is only complete once
+    # all of its columns were written
+    with open(os.path.join(path, MANIFEST), "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+
+
+class MmapDataset(PandasDataset):
+
+    """
+    A pandas dataset whose columns are memory-mapped from a directory written
+    by `save`. The columns are read-only.
+
+    :param path: The directory that contains the dataset.
+    :param schema: The schema of the dataset, defaults to the schema stored in
+      the manifest.
+    """
+
+    def __init__(self, path: str, schema=None, *args, **kwargs):
+        with open(os.path.join(path, MANIFEST)) as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest.get("version") != VERSION:
+            raise ValueError("unsupported dataset version")
+        if schema is None:
+            schema = DataSchema.from_dict(manifest["schema"])
+        arrays = {}
+        for column in manifest["columns"]:
+            values = np.load(os.path.join(path, column["file"]), mmap_mode="r")
+            if values.dtype != np.dtype(column["dtype"]) or len(values) != int(
+                manifest["rows"]
+            ):
+                raise ValueError(f"column {column['name']} does not match manifest")
+            arrays[column["name"]] = values
+        super().__init__(schema, pd.DataFrame(arrays, copy=False), *args, **kwargs)
+        self.path = path
+        self.manifest = manifest
@@ -1,84 +1,292 @@
 import pandas as pd
+import numpy as np
+import abc
+from functools import cached_property
 import random
 import operator
 import math
-from typing import Any, Union, Iterable
-from .dataset import Dataset, GroupedDataset
+from typing import (
+    Any,
+    Union,
+    Iterable,
+    Optional,
+    List,
+    Tuple,
+    Dict,
+    Hashable,
+    Sequence,
+)
+from . import fused
+from .dataset import Dataset, GroupedDataset, tokens
 from .attribute import Attribute, AttributeCondition, TrueAttribute
-from ..language.types import Array, Type, Boolean
+from ..language.types import Array, Type, Boolean, Integer
 from ..mechanisms import geometric_noise, laplace_noise
-from ..language.expression import Expression, ConditionalExpression
+from ..language.expression import Expression, ConditionalExpression, value_key, walk
+from ..language import evaluation
 from ..language.functions import Length, Sum
+from ..budget import BudgetAccountant, charge
+from ..cache import ResultCache
 
 import math
 
+# the columns of grouped moments (see `TruePandasAttribute.moments`)
+MOMENTS = ["count", "sum", "squares"]
+
+
+def grouped_counts(codes: np.ndarray, groups: int) -> np.ndarray:
+    """
+    Returns the number of rows in every group given the group code of every
+    row, rows without a group have the code -1.
+    """
+    codes = codes[codes >= 0]
+    evaluation.processed(len(codes))
+    return np.bincount(codes, minlength=groups)
+
+
+def grouped_sums(
+    attribute: "TruePandasAttribute",
+    codes: np.ndarray,
+    groups: int,
+    start: int,
+    end: int,
+) -> np.ndarray:
+    """
+    Sums up the values of a (fusable) attribute in the rows `start:end` for
+    every group given the group code of every row, evaluating it in chunks.
+    """
+    sums = np.zeros(groups)
+    integer = True
+    for rows, values in fused.chunks(attribute, end, start=start):
+        group_codes = codes[rows]
+        valid = group_codes >= 0
+        if values.dtype.kind == "f":
+            integer = False
+            valid &= ~np.isnan(values)
+        group_codes, values = group_codes[valid], values[valid]
+        evaluation.processed(len(group_codes))
+        sums += np.bincount(group_codes, weights=values, minlength=groups)
+    if integer:
+        # we use floats to accumulate the sums, which is exact for all
+        # integers below 2^53
+        return sums.astype(np.int64)
+    return sums
+
 
 class PandasLength(Length):
     def true(self) -> Any:
-        if not isinstance(self.dataset, PandasDataset):
+        if not isinstance(self.dataset, (PandasDataset, GroupedPandasDataset)):
             raise ValueError("expected a pandas dataset")
-        return len(self.dataset.df)
+        return self.dataset.count()
 
 
 class TruePandasAttribute(TrueAttribute):
-    def __init__(self, series: pd.Series):
-        self.series = series
-
-    def __op__(self, op: Any, other: TrueAttribute) -> TrueAttribute:
-        if not isinstance(other, (TruePandasAttribute, float, int)):
-            raise ValueError("cannot add")
-        if isinstance(other, TruePandasAttribute):
-            return TruePandasAttribute(op(self.series, other.series))
-        else:
-            return TruePandasAttribute(op(self.series, other))
+
+    """
+    Wraps the values of a column. If the column belongs to a grouped dataset,
+    aggregates like `sum` are calculated for all groups at once and returned
+    as a series that is indexed by the group keys.
+
+    Arithmetic operations are not executed right away but return a
+    `TruePandasOperation`, which is evaluated in fused chunks when an
+    aggregate is calculated (see `dwork.dataset.fused`).
+
+    :param column: All values of the column, including the ones of rows that
+      are not part of the dataset.
+    :param mask: The rows of the column that belong to the dataset.
+    :param grouping: The grouped dataset that the column belongs to.
+    """
+
+    operation: Any = None
+    operands: Tuple[Any, ...] = ()
+
+    def __init__(
+        self,
+        column: pd.Series,
+        mask: Optional[np.ndarray] = None,
+        grouping: Optional["GroupedPandasDataset"] = None,
+    ):
+        self.column = column
+        self.mask = mask
+        self.grouping = grouping
+
+    @property
+    def series(self) -> pd.Series:
+        """
+        Returns the values of all rows that belong to the dataset.
+        """
+        if self.mask is not None:
+            return self.column[self.mask]
+        return self.column
+
+    @property
+    def rows(self) -> int:
+        """
+        Returns the number of rows of the underlying column.
+        """
+        return len(self.column)
+
+    def __op__(self, op: Any, *operands: Any) -> TrueAttribute:
+        for operand in operands:
+            if not isinstance(operand, (TruePandasAttribute, float, int, np.number)):
+                raise ValueError("unsupported operand")
+        attributes = [o for o in operands if isinstance(o, TruePandasAttribute)]
+        if any(a.grouping is not self.grouping for a in attributes):
+            raise ValueError("attributes must be grouped identically")
+        if any(a.mask is not self.mask or a.rows != self.rows for a in attributes):
+            # the operands do not refer to the same rows, so we let pandas
+            # align the values and continue with the result
+            values = [
+                fused.widen(o.series) if isinstance(o, TruePandasAttribute) else o
+                for o in operands
+            ]
+            return TruePandasAttribute(op(*values), grouping=self.grouping)
+        return TruePandasOperation(op, *operands)
 
     def __add__(self, other: TrueAttribute) -> TrueAttribute:
-        return self.__radd__(other)
+        return self.__op__(operator.add, self, other)
 
     def __radd__(self, other: TrueAttribute) -> TrueAttribute:
-        return self.__op__(operator.add, other)
+        return self.__op__(operator.add, other, self)
 
     def __sub__(self, other: TrueAttribute) -> TrueAttribute:
-        return self.__rsub__(other)
+        return self.__op__(operator.sub, self, other)
 
     def __rsub__(self, other: TrueAttribute) -> TrueAttribute:
-        return self.__op__(operator.sub, other)
+        return self.__op__(operator.sub, other, self)
 
     def __mul__(self, other: TrueAttribute) -> TrueAttribute:
-        return self.__rmul__(other)
+        return self.__op__(operator.mul, self, other)
 
     def __rmul__(self, other: TrueAttribute) -> TrueAttribute:
-        return self.__op__(operator.mul, other)
+        return self.__op__(operator.mul, other, self)
 
     def __truediv__(self, other: TrueAttribute) -> TrueAttribute:
-        return self.__rtruediv__(other)
+        return self.__op__(operator.truediv, self, other)
 
     def __rtruediv__(self, other: TrueAttribute) -> TrueAttribute:
-        return self.__op__(operator.truediv, other)
+        return self.__op__(operator.truediv, other, self)
 
     def __floordiv__(self, other: TrueAttribute) -> TrueAttribute:
-        return self.__rfloordiv__(other)
+        return self.__op__(operator.floordiv, self, other)
 
     def __rfloordiv__(self, other: TrueAttribute) -> TrueAttribute:
-        return self.__op__(operator.floordiv, other)
+        return self.__op__(operator.floordiv, other, self)
 
     def abs(self) -> Any:
-        return TruePandasAttribute(self.series.abs())
+        return self.__op__(operator.abs, self)
 
     def __len__(self) -> int:
-        return self.len()
-
-    def len(self) -> int:
-        return len(self.series)
-
-    def sum(self) -> Any:
-        return self.series.sum()
+        if self.grouping is not None:
+            return int(np.count_nonzero(self.grouping.codes >= 0))
+        if self.mask is not None:
+            return int(np.count_nonzero(self.mask))
+        return self.rows
+
+    def len(self) -> Any:
+        if self.grouping is not None:
+            return self.grouping.count()
+        return len(self)
+
+    def aggregate(self, how: str) -> Any:
+        if self.grouping is not None:
+            return self.grouping.aggregate(self.series, how)
+        return self.series.agg(how)
+
+    def sum(self, start: int = 0, end: Optional[int] = None) -> Any:
+        """
+        Returns the sum of all values. Passing `start` and `end` restricts the
+        sum to a range of rows of the underlying column, which is used to sum
+        up shards of the data in parallel (only for fusable attributes).
+        """
+        if not fused.fusable(self):
+            if start != 0 or end is not None:
+                raise ValueError("can only sum up a range of fusable attributes")
+            return self.aggregate("sum")
+        if end is None:
+            end = self.rows
+        if self.grouping is not None:
+            return self.grouping.sum(self, start, end)
+        total = 0
+        for rows, values in fused.chunks(self, end, start=start):
+            if self.mask is not None:
+                values = values[self.mask[rows]]
+            evaluation.processed(len(values))
+            total += np.nansum(values)
+        return total
 
     def max(self) -> Any:
-        return self.series.max()
+        return self.aggregate("max")
 
     def min(self) -> Any:
-        return self.series.min()
+        return self.aggregate("min")
+
+    def moments(self, center: float = 0.0) -> Any:
+        """
+        Returns the number of values, their sum and the sum of their squares
+        (after subtracting `center`) in a single pass over the values. Missing
+        values are ignored. For grouped attributes, returns a data frame with
+        the moments of every group.
+        """
+        if fused.fusable(self):
+            chunks: Iterable[Tuple[slice, Any]] = fused.chunks(self, self.rows)
+            mask = self.mask
+        else:
+            # the series only contains the values of the dataset
+            chunks, mask = [(slice(None), self.series.to_numpy())], None
+        groups = len(self.grouping.keys) if self.grouping is not None else 0
+        totals = np.zeros((3,) if self.grouping is None else (3, groups))
+        for rows, values in chunks:
+            values = np.asarray(values, dtype=np.float64) - center
+            valid = ~np.isnan(values)
+            if mask is not None:
+                valid &= mask[rows]
+            if self.grouping is None:
+                values = values[valid]
+                evaluation.processed(len(values))
+                totals += np.array([len(values), values.sum(), values @ values])
+                continue
+            codes = self.grouping.codes[rows]
+            valid &= codes >= 0
+            codes, values = codes[valid], values[valid]
+            evaluation.processed(len(codes))
+            totals += (
+                np.bincount(codes, minlength=groups),
+                np.bincount(codes, weights=values, minlength=groups),
+                np.bincount(codes, weights=values * values, minlength=groups),
+            )
+        if self.grouping is None:
+            return totals
+        return pd.DataFrame(totals.T, index=self.grouping.keys, columns=MOMENTS)
+
+
+class TruePandasOperation(TruePandasAttribute):
+
+    """
+    Represents an arithmetic operation on the values of one or several columns
+    that belong to the same rows.
+    """
+
+    def __init__(self, operation: Any, *operands: Any):
+        attribute = next(o for o in operands if isinstance(o, TruePandasAttribute))
+        super().__init__(attribute.column, attribute.mask, attribute.grouping)
+        self.operation = operation
+        self.operands = operands
+
+    @property
+    def series(self) -> pd.Series:
+        # the values of the operands that were not used yet
+        stack: List[Any] = []
+        for item in fused.postfix(self):
+            if isinstance(item, TruePandasOperation):
+                count = len(item.operands)
+                operands = stack[-count:]
+                del stack[-count:]
+                stack.append(item.operation(*operands))
+            elif isinstance(item, TruePandasAttribute):
+                stack.append(fused.widen(item.series))
+            else:
+                stack.append(item)
+        return stack.pop()
 
 
 class PandasAttribute(Attribute):
@@ -86,10 +294,15 @@ class PandasAttribute(Attribute):
         self.dataset = dataset
         self.column = column
 
-    @property
+    @cached_property
     def type(self) -> Type:
         return Array(self.dataset.type(self.column))
 
+    @cached_property
+    def key(self) -> Optional[Hashable]:
+        token = getattr(self.dataset, "token", None)
+        return None if token is None else (type(self), token, self.column)
+
     def len(self):
         """
         We use this unpythonic function to make all DP function calls look consistent.
@@ -103,7 +316,12 @@ class PandasAttribute(Attribute):
         raise NotImplementedError
 
     def true(self) -> Any:
-        return TruePandasAttribute(self.dataset.df[self.column])
+        return self.dataset.column(self.column)
+
+    @cached_property
+    def static_sensitivity(self) -> Optional[Any]:
+        dt = self.dataset.type(self.column)
+        return dt.max - dt.min
 
     def sensitivity(self) -> Any:
         dt = self.dataset.type(self.column)
@@ -113,25 +331,66 @@ class PandasAttribute(Attribute):
         return self.len()
 
     def __ge__(self, other: Any) -> AttributeCondition:
-        raise NotImplementedError
+        return PandasAttributeCondition(self, operator.ge, other)
 
     def __le__(self, other: Any) -> AttributeCondition:
-        raise NotImplementedError
+        return PandasAttributeCondition(self, operator.le, other)
 
     def __gt__(self, other: Any) -> AttributeCondition:
         return PandasAttributeCondition(self, operator.gt, other)
 
     def __lt__(self, other: Any) -> AttributeCondition:
-        raise NotImplementedError
+        return PandasAttributeCondition(self, operator.lt, other)
 
     def __eq__(self, other: Any) -> AttributeCondition:  # type: ignore[override]
-        raise NotImplementedError
+        return PandasAttributeCondition(self, operator.eq, other)
 
     def __ne__(self, other: Any) -> AttributeCondition:  # type: ignore[override]
+        return PandasAttributeCondition(self, operator.ne, other)
+
+    # defining __eq__ would make attributes unhashable otherwise
+    __hash__ = Expression.__hash__
+
+
+class PandasCondition(AttributeCondition):
+
+    """
+    Base class for conditions on pandas datasets. The true value of a condition
+    is a boolean array with an entry for every row of the underlying data frame,
+    which is `True` for all rows that match the condition (and are part of the
+    dataset the condition refers to).
+
+    Conditions can be combined using `&`, `|` and `~`.
+    """
+
+    @abc.abstractproperty
+    def dataset(self) -> "PandasDataset":
+        raise NotImplementedError
+
+    def __and__(self, other: AttributeCondition) -> AttributeCondition:
+        return PandasCompoundCondition(np.logical_and, self, other)
+
+    def __or__(self, other: AttributeCondition) -> AttributeCondition:
+        return PandasCompoundCondition(np.logical_or, self, other)
+
+    def __invert__(self) -> AttributeCondition:
+        return PandasCompoundCondition(np.logical_not, self)
+
+    def __bool__(self) -> bool:
+        raise ValueError("conditions can only be combined using &, | and ~")
+
+    def dp(self, epsilon: float) -> Any:
+        raise NotImplementedError
+
+    def sensitivity(self) -> Any:
         raise NotImplementedError
 
+    @cached_property
+    def type(self) -> Type:
+        return Array(Boolean())
+
 
-class PandasAttributeCondition(AttributeCondition):
+class PandasAttributeCondition(PandasCondition):
     attribute: PandasAttribute
     operator: Any
     operand: Any
@@ -141,18 +400,110 @@ class PandasAttributeCondition(AttributeCondition):
         self.operator = operator
         self.operand = operand
 
-    def dp(self, epsilon: float) -> Any:
-        raise NotImplementedError
+    @property
+    def dataset(self) -> "PandasDataset":
+        dataset = self.attribute.dataset
+        if not isinstance(dataset, PandasDataset):
+            raise ValueError("conditions require an ungrouped pandas dataset")
+        return dataset
 
-    def sensitivity(self) -> Any:
-        raise NotImplementedError
+    @property
+    def children(self) -> Tuple[Expression, ...]:
+        if isinstance(self.operand, Expression):
+            return (self.attribute, self.operand)
+        return (self.attribute,)
+
+    @cached_property
+    def key(self) -> Optional[Hashable]:
+        """
+        Returns a key that identifies structurally identical conditions, or
+        `None` if the operand cannot be used as a key.
+        """
+        attribute, operand = self.attribute.key, value_key(self.operand)
+        if attribute is None or operand is None:
+            return None
+        return (type(self), attribute, self.operator, operand)
 
     def true(self) -> Any:
-        return self.operator(self.attribute.true().series, self.operand)
+        key = self.key
+        context = evaluation.current()
+        if key is None or context is None:
+            return self.mask()
+        # identical conditions are only evaluated once
+        return context.shared_value(key, self.mask)
+
+    def mask(self) -> np.ndarray:
+        dataset = self.dataset
+        values = dataset.df[self.attribute.column]
+        operand = self.operand
+        if isinstance(operand, PandasAttribute):
+            if operand.dataset.df is not dataset.df:
+                raise ValueError("can only compare attributes of the same data")
+            operand = operand.dataset.df[operand.column]
+        mask = self.operator(values, operand).to_numpy(dtype=bool)
+        if dataset.mask is not None:
+            mask = mask & dataset.mask
+        return mask
+
+
+class PandasCompoundCondition(PandasCondition):
+
+    """
+    Combines several conditions using a logical operator. Nested compound
+    conditions with the same operator are flattened, so `a & b & c` is
+    evaluated as a single conjunction, which combines the boolean arrays of
+    the individual conditions in place.
+    """
+
+    operator: Any
+    conditions: List[PandasCondition]
+
+    def __init__(self, operator: Any, *conditions: Any):
+        flattened: List[PandasCondition] = []
+        for condition in conditions:
+            if not isinstance(condition, PandasCondition):
+                raise ValueError("can only combine pandas conditions")
+            if (
+                isinstance(condition, PandasCompoundCondition)
+                and condition.operator is operator
+                and operator is not np.logical_not
+            ):
+                flattened.extend(condition.conditions)
+            else:
+                flattened.append(condition)
+        df = flattened[0].dataset.df
+        if any(condition.dataset.df is not df for condition in flattened):
+            raise ValueError("can only combine conditions on the same data")
+        self.operator = operator
+        self.conditions = flattened
 
     @property
-    def type(self) -> Type:
-        return Array(Boolean())
+    def dataset(self) -> "PandasDataset":
+        return self.conditions[0].dataset
+
+    @property
+    def children(self) -> Tuple[Expression, ...]:
+        return tuple(self.conditions)
+
+    @cached_property
+    def key(self) -> Optional[Hashable]:
+        keys = tuple(condition.key for condition in self.conditions)
+        if any(key is None for key in keys):
+            return None
+        return (type(self), self.operator) + keys
+
+    def true(self) -> Any:
+        if self.operator is np.logical_not:
+            (condition,) = self.conditions
+            mask = np.logical_not(condition.true())
+            if condition.dataset.mask is not None:
+                mask &= condition.dataset.mask
+            return mask
+        first, *rest = self.conditions
+        mask = np.array(first.true(), dtype=bool)
+        for condition in rest:
+            self.operator(mask, condition.true(), out=mask)
+        return mask
 
 
 class GroupedPandasDataset(GroupedDataset):
@@ -176,6 +527,11 @@ class GroupedPandasDataset(GroupedDataset):
     :param epsilon: The $\epsilon$ value for the calculation of the row count
       of a group that is evaluated against the given treshold.
 
+    The noisy row counts of all groups are calculated in one vectorized pass
+    and groups that do not reach the treshold are dropped before any data is
+    copied. The number of dropped groups is available via
+    `suppressed_groups`. Passing `treshold=None` disables the treshold.
+
     .. warning:: Beware of setting a treshold to a very low value (e.g. 1 or 2)
       as this might leak sensitive information about the presence or absence of
       a given datapoint to an adversary. The reason for this is that currently
@@ -195,30 +551,151 @@ class GroupedPandasDataset(GroupedDataset):
 
     """
 
-    def __init__(self, dataset, treshold=10, epsilon=0.3, **kwargs):
+    def __init__(self, dataset, treshold=10, epsilon=0.3, **kwargs) -> None:
         self.kwargs = kwargs
         self.dataset = dataset
-        self._groups = []
-        self._datasets = []
-        for key, group in dataset.df.groupby(**kwargs):
-            self._groups.append(key)
-            self._datasets.append(PandasDataset(dataset.schema, group))
+        self.schema = dataset.schema
+        # every grouping yields different (noisy) groups
+        self.token = next(tokens)
+        # the noisy group sizes spend privacy budget, which is reserved
+        # before we group the data
+        with charge([(dataset, epsilon)] if treshold is not None else []):
+            grouper = dataset.df.groupby(**kwargs)
+            # the group code of every row, rows without a group get the code -1
+            codes = grouper.ngroup().fillna(-1).to_numpy(dtype=np.int64, copy=True)
+            if dataset.mask is not None:
+                # rows that are not part of a filtered dataset belong to no group
+                codes[~dataset.mask] = -1
+            keys = grouper.size().index
+            counts = np.bincount(codes[codes >= 0], minlength=len(keys))
+            keep = counts > 0
+            if treshold is not None:
+                noisy_counts = Integer(min=0).dp(counts, 1, epsilon)
+                keep &= noisy_counts >= treshold
+        self.suppressed_groups = int(len(keep) - keep.sum())
+        # we renumber the remaining groups, rows of dropped groups get the
+        # code -1 (the last entry of the mapping)
+        mapping = np.full(len(keep) + 1, -1, dtype=np.int64)
+        mapping[:-1][keep] = np.arange(keep.sum())
+        # the keys of all groups, in the order of the group codes
+        self.keys = keys[keep]
+        self.codes = mapping[codes]
+        self._datasets: Optional[List[Dataset]] = None
 
     @property
     def groups(self) -> Iterable[Any]:
-        return self._groups
+        return list(self.keys)
 
     @property
     def datasets(self) -> Iterable[Dataset]:
+        """
+        Returns a dataset for every group. As this copies the data of every
+        group, prefer working with the grouped dataset directly, which will
+        evaluate expressions for all groups at once.
+        """
+        if self._datasets is None:
+            df = self.dataset.df
+            valid = self.codes >= 0
+            self._datasets = [
+                PandasDataset(
+                    self.schema,
+                    group,
+                    accountant=self.dataset.accountant,
+                    cache=self.dataset.cache,
+                )
+                for _, group in df[valid].groupby(self.codes[valid])
+            ]
         return self._datasets
 
+    def type(self, column: str) -> Type:
+        return self.dataset.type(column)
+
+    def len(self) -> PandasLength:
+        return PandasLength(self)
+
+    def count(self, start: int = 0, end: Optional[int] = None) -> pd.Series:
+        """
+        Returns the number of rows in every group, optionally only considering
+        the given range of rows.
+        """
+        counts = grouped_counts(self.codes[start:end], len(self.keys))
+        return pd.Series(counts, index=self.keys)
+
+    def column(self, column: str) -> TruePandasAttribute:
+        return TruePandasAttribute(self.dataset.df[column], grouping=self)
+
+    def sum(
+        self, attribute: TruePandasAttribute, start: int = 0, end: Optional[int] = None
+    ) -> pd.Series:
+        """
+        Sums up the values of a (fusable) attribute for all groups, evaluating
+        it in chunks, optionally only for the given range of rows.
+        """
+        if end is None:
+            end = attribute.rows
+        sums = grouped_sums(attribute, self.codes, len(self.keys), start, end)
+        return pd.Series(sums, index=self.keys)
+
+    def aggregate(self, series: pd.Series, how: str) -> pd.Series:
+        """
+        Aggregates the values of a column for all groups in a single
+        vectorized pass and returns the results indexed by the group keys.
+        """
+        result = series.reset_index(drop=True).groupby(self.codes).agg(how)
+        result = result.reindex(range(len(self.keys)), fill_value=0)
+        return pd.Series(result.to_numpy(), index=self.keys)
+
+    def __getitem__(self, column: str) -> PandasAttribute:
+        if not isinstance(column, str):
+            raise ValueError("grouped datasets can only be indexed by column")
+        return PandasAttribute(self, column)
+
 
 class PandasDataset(Dataset):
-    def __init__(self, schema, df, *args, **kwargs):
-        super().__init__(schema, *args, **kwargs)
+
+    """
+    A dataset that is backed by a pandas data frame.
+
+    Filtering a dataset does not copy the data frame. Instead, the filtered
+    dataset shares the data frame with the original one and stores a boolean
+    mask of the rows that belong to it, which is only applied to the columns
+    that an expression actually reads.
+
+    :param mask: A boolean array with an entry for every row of the data frame
+      that indicates whether the row belongs to the dataset.
+    """
+
+    def __init__(
+        self,
+        schema,
+        df,
+        *args,
+        mask: Optional[np.ndarray] = None,
+        accountant: Optional[BudgetAccountant] = None,
+        cache: Optional[ResultCache] = None,
+        **kwargs,
+    ):
+        super().__init__(schema, *args, accountant=accountant, cache=cache, **kwargs)
         self.args = args
         self.kwargs = kwargs
         self.df = df
+        self.mask = mask
+        # the dataset and the condition that a view was created from
+        self.parent: Optional["PandasDataset"] = None
+        self.condition: Optional[PandasCondition] = None
+
+    @classmethod
+    def ingest(
+        cls, schema, df: pd.DataFrame, *args, bounds: str = "clip", **kwargs
+    ) -> "PandasDataset":
+        """
+        Creates a dataset from a data frame whose values are checked against
+        the bounds of the schema and stored in compact data types (please see
+        `dwork.dataset.ingest` for details).
+        """
+        from .ingest import ingest
+
+        return cls(schema, ingest(schema, df, bounds=bounds), *args, **kwargs)
 
     def len(self):
         return PandasLength(self)
@@ -226,9 +703,98 @@ class PandasDataset(Dataset):
     def __len__(self):
         return self.len()
 
+    def count(self, start: int = 0, end: Optional[int] = None) -> int:
+        """
+        Returns the number of rows, optionally only considering the given
+        range of rows of the data frame.
+        """
+        if self.mask is not None:
+            count = int(np.count_nonzero(self.mask[start:end]))
+            evaluation.processed(count)
+            return count
+        # the length of an unfiltered dataset is known without reading it
+        return len(range(len(self.df))[start:end])
+
+    def column(self, column: str) -> TruePandasAttribute:
+        return TruePandasAttribute(self.df[column], mask=self.mask)
+
     def group_by(self, **kwargs) -> GroupedDataset:
         return GroupedPandasDataset(self, **kwargs)
 
+    def bin_counts(
+        self, columns: Sequence[str], edges: Sequence[np.ndarray]
+    ) -> np.ndarray:
+        for column in columns:
+            if not fused.numeric(self.df[column]):
+                raise ValueError(f"column {column} is not numeric")
+        return fused.bin_counts(
+            [self.df[column].to_numpy() for column in columns],
+            list(edges),
+            self.mask,
+            len(self.df),
+        )
+
+    def precompute(self, expressions: Sequence[Expression]) -> None:
+        """
+        Computes the sums of columns and the row counts required by the given
+        expressions in a single pass over every involved column, even if the
+        expressions apply different filters.
+        """
+        context = evaluation.current()
+        if context is None:
+            return
+        # the aggregates that we compute, grouped by data frame
+        aggregates: Dict[int, List[Tuple[Expression, "PandasDataset", Any]]] = {}
+        for expression in expressions:
+            for node in walk(expression):
+                if id(node) in context.values:
+                    # the value is already known (e.g. from running totals)
+                    continue
+                if isinstance(node, PandasLength):
+                    dataset, column = node.dataset, None
+                elif isinstance(node, Sum) and isinstance(
+                    node.expression, PandasAttribute
+                ):
+                    dataset, column = node.expression.dataset, node.expression.column
+                else:
+                    continue
+                if not isinstance(dataset, PandasDataset):
+                    continue
+                if column is not None and not fused.numeric(dataset.df[column]):
+                    continue
+                aggregates.setdefault(id(dataset.df), []).append(
+                    (node, dataset, column)
+                )
+        for nodes in aggregates.values():
+            df = nodes[0][1].df
+            masks: Dict[int, Optional[np.ndarray]] = {}
+            columns: Dict[str, int] = {}
+            for _, dataset, column in nodes:
+                masks.setdefault(id(dataset.mask), dataset.mask)
+                if column is not None:
+                    columns.setdefault(column, len(columns))
+            mask_index = {key: i for i, key in enumerate(masks)}
+            sums, counts = fused.masked_sums(
+                [df[column].to_numpy() for column in columns],
+                list(masks.values()),
+                len(df),
+            )
+            if columns or any(mask is not None for mask in masks.values()):
+                evaluation.processed(len(df))
+            for node, dataset, column in nodes:
+                i = mask_index[id(dataset.mask)]
+                rows = int(counts[i])
+                if column is None:
+                    # the length of an unfiltered dataset needs no rows
+                    context.set(node, rows, 0 if dataset.mask is None else rows)
+                    continue
+                value = sums[i, columns[column]]
+                if df[column].dtype.kind in "biu":
+                    # we use floats to accumulate the sums, which is exact for
+                    # all integers below 2^53
+                    value = np.int64(value)
+                context.set(node, value, rows)
+
     def __getitem__(
         self, column_or_expression: Union[str, ConditionalExpression]
     ) -> Union["PandasDataset", PandasAttribute]:
@@ -240,9 +806,35 @@ class PandasDataset(Dataset):
         if isinstance(column_or_expression, str):
             # this is a column name, we return a pandas attribute
             return PandasAttribute(self, column_or_expression)
-        if not isinstance(column_or_expression, AttributeCondition):
+        if not isinstance(column_or_expression, PandasCondition):
             raise ValueError("not supported")
-        # this is a filter expression, we return a dataset with all matching rows
-        return PandasDataset(
-            self.schema, self.df[column_or_expression.true()], *self.args, **self.kwargs
+        # this is a filter expression, we return a view of the dataset that
+        # contains all matching rows
+        mask = column_or_expression.true()
+        condition_df = column_or_expression.dataset.df
+        if condition_df is not self.df:
+            # the condition refers to another data frame, so we align it
+            mask = (
+                pd.Series(mask, index=condition_df.index)
+                .reindex(self.df.index, fill_value=False)
+                .to_numpy(dtype=bool)
+            )
+        if self.mask is not None:
+            mask = mask & self.mask
+        view = PandasDataset(
+            self.schema,
+            self.df,
+            *self.args,
+            mask=mask,
+            accountant=self.accountant,
+            cache=self.cache,
+            **self.kwargs,
         )
+        view.source = self.source
+        view.parent = self
+        view.condition = column_or_expression
+        # identical filters on the same version of a dataset yield identical
+        # views, the mask only contains the rows at the time of filtering
+        if self.token is not None and column_or_expression.key is not None:
+            view.token = (self.token, self.source.version, column_or_expression.key)
+        return view
@@ -0,0 +1,480 @@
+"""
+Parallel evaluation of aggregates on pandas datasets.
+
+The executor splits the rows of a dataset into shards and computes the true
+values of sums and row counts (including those of grouped datasets) for every
+shard in a pool of worker processes. The partial results are merged and stored
+in the evaluation context, so that the noise is added exactly once, centrally,
+by the usual `dp` methods of the expressions. The differentially private
+results are therefore computed with the same sensitivities and noise as
+without the executor.
+
+Every executor owns a pool of worker processes, which is started on first use
+and kept until the executor is closed (see `ParallelExecutor.close`). The
+workers do not receive any data with a query, only the row ranges of their
+shards and a description of the expression in which every column, mask and
+array of group codes is replaced by a `Segment`. The workers attach to these
+segments without copying them:
+
+- Columns of shared datasets (see `dwork.dataset.shared`) and memory-mapped
+  datasets (see `dwork.dataset.mmap`) are used where they are.
+- All other arrays are copied into shared memory once, when a query first
+  reads them, and removed when they are garbage collected or the executor is
+  closed. Like the rest of dwork, the executor assumes that the columns of a
+  data frame are not modified in place.
+
+We start the workers with the `forkserver` (or `spawn`) method instead of
+forking the current process, as forking a process that runs other threads
+(e.g. a query service) can deadlock the workers on locks that were held during
+the fork.
+"""
+
+import multiprocessing
+import threading
+import weakref
+import numpy as np
+import pandas as pd
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+from .pandas import (
+    GroupedPandasDataset,
+    PandasAttribute,
+    PandasDataset,
+    PandasLength,
+    TruePandasAttribute,
+    TruePandasOperation,
+    grouped_counts,
+    grouped_sums,
+)
+from . import fused, shared
+from ..language.expression import Constant, Expression, walk
+from ..language.evaluation import current
+from .dataset import evaluate_batch
+from ..language.functions import Sum
+
+
+def shard_rows(rows: int, shard: int, shards: int) -> Tuple[int, int]:
+    """
+    Returns the range of rows that belongs to the given shard.
+    """
+    return rows * shard // shards, rows * (shard + 1) // shards
+
+
+class Segment:
+
+    """
+    Describes an array in a shared memory block or a memory-mapped file,
+    which workers can attach to.
+
+    :param name: The name of the shared memory block or of the file.
+    :param offset: The offset of the array in bytes.
+    :param dtype: The data type of the array.
+    :param length: The number of values of the array.
+    :param file: Whether the segment is part of a file.
+    """
+
+    def __init__(self, name: str, offset: int, dtype: str, length: int, file: bool):
+        self.name = name
+        self.offset = offset
+        self.dtype = dtype
+        self.length = length
+        self.file = file
+
+
+class SharedArrays:
+
+    """
+    Provides the segments of the arrays that an executor sends to its workers.
+    Arrays that are neither part of a shared dataset nor memory-mapped are
+    copied into a shared memory block of their own, which is reused as long
+    as the array exists.
+    """
+
+    def __init__(self) -> None:
+        self.blocks: Dict[Tuple[Any, ...], Tuple[SharedMemory, Any]] = {}
+        self.lock = threading.Lock()
+
+    def segment(self, values: np.ndarray) -> Segment:
+        values = np.asarray(values)
+        dtype, length = values.dtype.str, len(values)
+        if values.flags.c_contiguous:
+            found = shared.block(values)
+            if found is not None:
+                return Segment(found[0], found[1], dtype, length, file=False)
+        # the array that owns the memory of the values
+        owner = values
+        while isinstance(owner.base, np.ndarray):
+            owner = owner.base
+        if (
+            isinstance(owner, np.memmap)
+            and owner.filename is not None
+            and values.flags.c_contiguous
+        ):
+            # the data of the memory map starts at its offset within the file
+            start = values.__array_interface__["data"][0]
+            offset = start - owner.__array_interface__["data"][0] + owner.offset
+            return Segment(owner.filename, offset, dtype, length, file=True)
+        key = (
+            id(owner),
+            values.__array_interface__["data"][0],
+            values.strides,
+            dtype,
+            length,
+        )
+        with self.lock:
+            if key not in self.blocks:
+                memory = SharedMemory(create=True, size=max(values.nbytes, 1))
+                target = np.ndarray(values.shape, dtype=values.dtype, buffer=memory.buf)
+                target[:] = values
+                del target
+                finalizer = weakref.finalize(owner, self.discard, key)
+                self.blocks[key] = memory, finalizer
+            memory = self.blocks[key][0]
+        return Segment(memory.name, 0, dtype, length, file=False)
+
+    def discard(self, key: Tuple[Any, ...]) -> None:
+        with self.lock:
+            if key not in self.blocks:
+                return
+            memory, finalizer = self.blocks.pop(key)
+        finalizer.detach()
+        shared.release(memory)
+        shared.unlink(memory)
+
+    def close(self) -> None:
+        """
+        Removes all shared memory blocks.
+        """
+        for key in list(self.blocks):
+            self.discard(key)
+
+
+# the shared memory blocks and files that a worker process is attached to
+attachments: Dict[str, Any] = {}
+
+
+def attach(segment: Segment) -> np.ndarray:
+    """
+    Returns the array of a segment, attaching to its shared memory block or
+    file if the worker is not attached to it yet.
+    """
+    if segment.name not in attachments:
+        if segment.file:
+            attachments[segment.name] = np.memmap(segment.name, mode="r")
+        else:
+            attachments[segment.name] = shared.attach_memory(segment.name)
+    attachment = attachments[segment.name]
+    buffer = attachment if segment.file else attachment.buf
+    return np.ndarray(
+        (segment.length,),
+        dtype=np.dtype(segment.dtype),
+        buffer=buffer,
+        offset=segment.offset,
+    )
+
+
+def detach(names: Sequence[str]) -> None:
+    """
+    Releases all attachments of a worker except the given ones, so that the
+    blocks of arrays that no longer exist can be freed.
+    """
+    for name in list(attachments):
+        if name not in names:
+            attachment = attachments.pop(name)
+            if isinstance(attachment, SharedMemory):
+                shared.release(attachment)
+
+
+class Task:
+
+    """
+    A sum or row count that is computed in shards of rows.
+
+    :param kind: Either `sum` or `count`.
+    :param rows: The number of rows of the underlying data frame.
+    :param node: The values to sum up as a tree of operations, in which every
+      column is an array (or a segment) and every operation is a tuple that
+      contains the operation and its operands.
+    :param mask: The rows that belong to the dataset.
+    :param codes: The group code of every row (for grouped datasets).
+    :param keys: The keys of all groups (for grouped datasets), which are only
+      required to merge the partial results.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        rows: int,
+        node: Any = None,
+        mask: Any = None,
+        codes: Any = None,
+        keys: Optional[pd.Index] = None,
+        groups: int = 0,
+    ):
+        self.kind = kind
+        self.rows = rows
+        self.node = node
+        self.mask = mask
+        self.codes = codes
+        self.keys = keys
+        self.groups = len(keys) if keys is not None else groups
+
+    def map(self, f: Callable[[Any], Any]) -> "Task":
+        """
+        Returns a copy of the task without the group keys, in which every
+        array is replaced by `f(array)`.
+        """
+
+        def map_node(node: Any) -> Any:
+            if isinstance(node, tuple):
+                operation, *operands = node
+                return (operation, *(map_node(o) for o in operands))
+            if isinstance(node, (np.ndarray, Segment)):
+                return f(node)
+            return node
+
+        return Task(
+            self.kind,
+            self.rows,
+            map_node(self.node),
+            None if self.mask is None else f(self.mask),
+            None if self.codes is None else f(self.codes),
+            groups=self.groups,
+        )
+
+    def arrays(self) -> List[Any]:
+        """
+        Returns all arrays (or segments) of the task.
+        """
+        found = [a for a in (self.mask, self.codes) if a is not None]
+        stack = [self.node]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, tuple):
+                stack.extend(node[1:])
+            elif isinstance(node, (np.ndarray, Segment)):
+                found.append(node)
+        return found
+
+    def attribute(self, node: Any) -> Any:
+        if isinstance(node, tuple):
+            operation, *operands = node
+            return TruePandasOperation(
+                operation, *(self.attribute(o) for o in operands)
+            )
+        if isinstance(node, np.ndarray):
+            return TruePandasAttribute(pd.Series(node, copy=False), self.mask)
+        return node
+
+    def evaluate(self, start: int, end: int) -> Any:
+        """
+        Returns the partial result for the rows `start:end`.
+        """
+        if self.kind == "count":
+            if self.codes is not None:
+                return grouped_counts(self.codes[start:end], self.groups)
+            if self.mask is None:
+                return end - start
+            return int(np.count_nonzero(self.mask[start:end]))
+        attribute = self.attribute(self.node)
+        if self.codes is not None:
+            return grouped_sums(attribute, self.codes, self.groups, start, end)
+        return attribute.sum(start, end)
+
+
+def to_node(values: Any) -> Any:
+    """
+    Returns the operation tree of the true values of an attribute, in which
+    every column is replaced by its array.
+    """
+    if not isinstance(values, TruePandasAttribute):
+        # a constant
+        return values
+    if values.operation is None:
+        return values.column.to_numpy()
+    return (values.operation, *(to_node(o) for o in values.operands))
+
+
+def evaluate_shard(tasks: Sequence[Task], shard: int, shards: int) -> List[Any]:
+    """
+    Computes the partial results of all tasks for a single shard of rows.
+    """
+    return [task.evaluate(*shard_rows(task.rows, shard, shards)) for task in tasks]
+
+
+def evaluate_shared(tasks: Sequence[Task], shard: int, shards: int) -> List[Any]:
+    """
+    Computes the partial results of tasks whose arrays are segments in a
+    worker process.
+    """
+    segments = [s for task in tasks for s in task.arrays()]
+    detach([segment.name for segment in segments])
+    return evaluate_shard([task.map(attach) for task in tasks], shard, shards)
+
+
+class ParallelExecutor:
+
+    """
+    Evaluates the aggregates of expressions on pandas datasets in parallel.
+
+    :param processes: The number of worker processes, defaults to the number
+      of CPUs.
+    :param min_shard_rows: The minimum number of rows per shard. Smaller
+      datasets are split into fewer shards (or evaluated in the current
+      process), as the overhead of the worker processes would dominate.
+    :param start_method: The `multiprocessing` start method of the workers,
+      defaults to `forkserver` if the platform supports it and `spawn`
+      otherwise. Only use `fork` if no other threads are running when the
+      first query is evaluated.
+
+    The executor can be shared by several threads. Use it as a context
+    manager (or call `close`) to stop the worker processes and to remove the
+    shared memory blocks that it created.
+    """
+
+    def __init__(
+        self,
+        processes: Optional[int] = None,
+        min_shard_rows: int = 1 << 18,
+        start_method: Optional[str] = None,
+    ):
+        self.processes = processes or multiprocessing.cpu_count()
+        self.min_shard_rows = min_shard_rows
+        if start_method is None:
+            methods = multiprocessing.get_all_start_methods()
+            start_method = "forkserver" if "forkserver" in methods else "spawn"
+        self.start_method = start_method
+        self.arrays = SharedArrays()
+        self._pool: Optional[Any] = None
+        self._lock = threading.Lock()
+
+    def pool(self) -> Any:
+        """
+        Returns the pool of worker processes, which is started on first use.
+        """
+        with self._lock:
+            if self._pool is None:
+                context = multiprocessing.get_context(self.start_method)
+                self._pool = context.Pool(self.processes)
+            return self._pool
+
+    def close(self) -> None:
+        """
+        Stops the worker processes and removes the shared memory blocks. The
+        executor starts new workers if it is used again.
+        """
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.close()
+            pool.join()
+        self.arrays.close()
+
+    def __enter__(self) -> "ParallelExecutor":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def tasks(
+        self, expressions: Sequence[Expression]
+    ) -> Tuple[List[Expression], List[Task]]:
+        """
+        Returns all sums and row counts of the given expressions that can be
+        evaluated in shards, together with the tasks that compute them.
+        """
+        from ..language.operators import BinaryExpression
+
+        nodes: List[Expression] = []
+        tasks: List[Task] = []
+        for expression in expressions:
+            for node in walk(expression):
+                if isinstance(node, PandasLength):
+                    dataset = node.dataset
+                    if isinstance(dataset, GroupedPandasDataset):
+                        task = Task(
+                            "count",
+                            len(dataset.codes),
+                            codes=dataset.codes,
+                            keys=dataset.keys,
+                        )
+                    elif isinstance(dataset, PandasDataset):
+                        task = Task("count", len(dataset.df), mask=dataset.mask)
+                    else:
+                        continue
+                    nodes.append(node)
+                    tasks.append(task)
+                elif isinstance(node, Sum) and all(
+                    isinstance(n, (PandasAttribute, Constant, BinaryExpression))
+                    for n in walk(node.expression)
+                ):
+                    # arithmetic on attributes is lazy, so this does not
+                    # compute anything yet
+                    values = node.expression.true()
+                    if not isinstance(values, TruePandasAttribute):
+                        continue
+                    if not fused.fusable(values):
+                        continue
+                    grouping = values.grouping
+                    nodes.append(node)
+                    tasks.append(
+                        Task(
+                            "sum",
+                            values.rows,
+                            to_node(values),
+                            mask=values.mask,
+                            codes=None if grouping is None else grouping.codes,
+                            keys=None if grouping is None else grouping.keys,
+                        )
+                    )
+        return nodes, tasks
+
+    def precompute(self, expressions: Sequence[Expression]) -> None:
+        """
+        Computes the sums and row counts of the given expressions in parallel
+        and stores them in the current evaluation context.
+        """
+        context = current()
+        if context is None:
+            return
+        nodes, tasks = self.tasks(expressions)
+        if not tasks:
+            return
+        rows = max(task.rows for task in tasks)
+        shards = max(1, min(self.processes, rows // self.min_shard_rows))
+        if shards == 1:
+            partials = [evaluate_shard(tasks, 0, 1)]
+        else:
+            # the workers only receive the segments of the arrays
+            shared_tasks = [task.map(self.arrays.segment) for task in tasks]
+            partials = self.pool().starmap(
+                evaluate_shared,
+                [(shared_tasks, shard, shards) for shard in range(shards)],
+            )
+        for i, (node, task) in enumerate(zip(nodes, tasks)):
+            value = partials[0][i]
+            for partial in partials[1:]:
+                value = value + partial[i]
+            if task.keys is not None:
+                value = pd.Series(value, index=task.keys)
+            elif task.kind == "count":
+                value = int(value)
+            context.set(node, value)
+
+    def evaluate(
+        self,
+        expressions: Sequence[Expression],
+        epsilons: Union[float, Sequence[float]],
+    ) -> List[Any]:
+        """
+        Returns the differentially private values of several expressions,
+        computing their aggregates in parallel.
+
+        :param epsilons: The epsilon value for every expression, or a single
+          value that is used for all of them.
+        """
+        return evaluate_batch(expressions, epsilons, self.precompute)
+
+    def dp(self, expression: Expression, epsilon: float) -> Any:
+        (result,) = self.evaluate([expression], epsilon)
+        return result
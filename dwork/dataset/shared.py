@@ -0,0 +1,238 @@
+"""
+Datasets whose columns are stored in shared memory.
+
+Publishing a dataset copies its numeric columns into a single block of shared
+memory. Other processes can attach to this block and work with the columns
+without copying them, so several workers can share one resident copy of a
+large table. Pickling a shared dataset (e.g. to send it to a worker of a
+process pool) only pickles a small handle that describes the block, the
+schema and the layout of the columns.
+
+A published dataset keeps the budget accountant and the result cache of the
+original one. As other processes cannot charge the budget of an accountant,
+datasets with an accountant cannot be pickled.
+"""
+
+import sys
+import weakref
+import numpy as np
+import pandas as pd
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from .pandas import PandasDataset
+from . import fused
+from ..budget import BudgetAccountant
+from ..cache import ResultCache
+from ..dataschema import DataSchema
+from ..language.expression import inherited
+
+# columns are aligned to cache lines within the shared memory block
+ALIGNMENT = 64
+
+# the shared datasets of this process (see `block`)
+datasets: "weakref.WeakSet[SharedDataset]" = weakref.WeakSet()
+
+
+class SharedHandle:
+    """
+    Describes a dataset in shared memory. The handle can be pickled and sent
+    to other processes, which can use it to attach to the dataset.
+
+    :param name: The name of the shared memory block.
+    :param schema: The serialized schema of the dataset.
+    :param columns: The name, data type and offset of every column.
+    :param rows: The number of rows of the dataset.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        schema: Dict[str, Any],
+        columns: List[Tuple[str, str, int]],
+        rows: int,
+    ):
+        self.name = name
+        self.schema = schema
+        self.columns = columns
+        self.rows = rows
+
+
+def attach_memory(name: str) -> SharedMemory:
+    """
+    Attaches to an existing block of shared memory without taking ownership,
+    so the block is not removed when the attaching process exits.
+    """
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=name, track=False)  # type: ignore[call-arg]
+    memory = SharedMemory(name=name)
+    # older versions register every block with the resource tracker, which
+    # removes it as soon as the process exits
+    resource_tracker.unregister(memory._name, "shared_memory")  # type: ignore
+    return memory
+
+
+def block(values: np.ndarray) -> Optional[Tuple[str, int]]:
+    """
+    Returns the name of the shared memory block that contains the given
+    (contiguous) array and the offset of the array within the block, or `None`
+    if the array does not belong to a shared dataset of this process.
+    """
+    start = values.__array_interface__["data"][0]
+    for dataset in list(datasets):
+        if dataset.memory.buf is None:
+            # the dataset was closed
+            continue
+        offset = start - dataset.address
+        if 0 <= offset and offset + values.nbytes <= dataset.memory.size:
+            return dataset.memory.name, offset
+    return None
+
+
+def release(memory: SharedMemory) -> None:
+    try:
+        memory.close()
+    except BufferError:
+        # there are still references to the columns (e.g. in results of
+        # expressions), the memory is released once they are gone
+        pass
+
+
+def unlink(memory: SharedMemory) -> None:
+    """
+    Removes a block of shared memory that this process created.
+    """
+    if sys.version_info < (3, 13):
+        # attaching processes might have unregistered the block
+        resource_tracker.register(memory._name, "shared_memory")  # type: ignore
+    memory.unlink()
+
+
+class SharedDataset(PandasDataset):
+    """
+    A pandas dataset whose columns are stored in shared memory. Use `publish`
+    to create a shared dataset from an existing one, and `attach` (or simply
+    unpickle the dataset) to access it from other processes.
+
+    The columns are read-only. The process that published the dataset owns
+    the shared memory and must call `unlink` (or use the dataset as a context
+    manager) to release it once it is no longer needed. Attached datasets are
+    closed when they are garbage collected (e.g. in the workers of a process
+    pool).
+    """
+
+    def __init__(
+        self,
+        schema,
+        handle: SharedHandle,
+        memory: SharedMemory,
+        owner: bool = False,
+        *,
+        accountant: Optional[BudgetAccountant] = None,
+        cache: Optional[ResultCache] = None,
+    ):
+        arrays = {}
+        for column, dtype, offset in handle.columns:
+            values = np.ndarray(
+                (handle.rows,), dtype=np.dtype(dtype), buffer=memory.buf, offset=offset
+            )
+            values.flags.writeable = False
+            arrays[column] = values
+        super().__init__(
+            schema,
+            pd.DataFrame(arrays, copy=False),
+            accountant=accountant,
+            cache=cache,
+        )
+        self.handle = handle
+        self.memory = memory
+        self.owner = owner
+        view = np.ndarray((memory.size,), dtype=np.uint8, buffer=memory.buf)
+        self.address = view.__array_interface__["data"][0]
+        del view
+        datasets.add(self)
+        if not owner:
+            weakref.finalize(self, release, memory)
+
+    @classmethod
+    def publish(
+        cls, dataset: PandasDataset, columns: Optional[Sequence[str]] = None
+    ) -> "SharedDataset":
+        """
+        Copies the numeric columns of a dataset (only the rows that belong to
+        it) into shared memory. The shared dataset uses the accountant and the
+        cache of the dataset (or of the dataset it was derived from).
+
+        :param columns: The columns to publish, defaults to all numeric
+          columns of the dataset.
+        """
+        df = dataset.df if dataset.mask is None else dataset.df[dataset.mask]
+        if columns is None:
+            columns = [c for c in df.columns if fused.numeric(df[c])]
+        layout: List[Tuple[str, str, int]] = []
+        size = 0
+        for column in columns:
+            if not fused.numeric(df[column]):
+                raise ValueError(f"column {column} is not numeric")
+            dtype = df[column].dtype
+            size = -(-size // ALIGNMENT) * ALIGNMENT
+            layout.append((column, dtype.str, size))
+            size += dtype.itemsize * len(df)
+        memory = SharedMemory(create=True, size=max(size, 1))
+        for column, dtype, offset in layout:
+            target = np.ndarray(
+                (len(df),), dtype=np.dtype(dtype), buffer=memory.buf, offset=offset
+            )
+            target[:] = df[column].to_numpy()
+            del target
+        handle = SharedHandle(memory.name, dataset.schema.to_dict(), layout, len(df))
+        return cls(
+            dataset.schema,
+            handle,
+            memory,
+            owner=True,
+            accountant=inherited(dataset, "accountant"),
+            cache=inherited(dataset, "cache"),
+        )
+
+    @classmethod
+    def attach(cls, handle: SharedHandle) -> "SharedDataset":
+        """
+        Attaches to a dataset that was published by another process.
+        """
+        schema = DataSchema.from_dict(handle.schema)
+        return cls(schema, handle, attach_memory(handle.name))
+
+    def __reduce__(self) -> Any:
+        if self.accountant is not None:
+            raise TypeError(
+                "shared datasets with a budget accountant cannot be pickled"
+            )
+        return (SharedDataset.attach, (self.handle,))
+
+    def close(self) -> None:
+        """
+        Releases the shared memory of this process. The columns cannot be
+        used afterwards.
+        """
+        self.df = pd.DataFrame()
+        release(self.memory)
+
+    def unlink(self) -> None:
+        """
+        Removes the shared memory, which is freed as soon as all processes
+        closed it. Only the process that published the dataset may do this.
+        """
+        if not self.owner:
+            raise ValueError("only the owner can unlink a shared dataset")
+        self.close()
+        unlink(self.memory)
+
+    def __enter__(self) -> "SharedDataset":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        if self.owner:
+            self.unlink()
+        else:
+            self.close()
@@ -0,0 +1,735 @@
+"""
+Datasets that are read in chunks, e.g. from CSV or Parquet files that do not
+fit into memory.
+
+A streaming dataset never holds more than a single chunk of the data in
+memory. Attributes, filters and groupings are not evaluated right away but
+are recorded and applied to every chunk while the data is scanned. Every chunk
+is wrapped in a `PandasDataset`, so all the functionality of the pandas
+backend (fused arithmetic, lazy filter masks, vectorized grouping) is used
+within a chunk. Aggregates like sums and row counts are calculated for every
+chunk and then merged.
+
+Every aggregate scans the data once. Use `evaluate_batch` to compute all
+aggregates of several expressions in a single scan.
+"""
+
+import abc
+import functools
+import operator
+from contextlib import nullcontext
+import numpy as np
+import pandas as pd
+from functools import cached_property
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+    cast,
+)
+from .dataset import Dataset, GroupedDataset, tokens
+from .attribute import Attribute, AttributeCondition, TrueAttribute
+from .pandas import PandasDataset, GroupedPandasDataset, MOMENTS
+from . import fused
+from ..language.types import Array, Type, Boolean, Integer
+from ..language.expression import (
+    Expression,
+    ConditionalExpression,
+    Constant,
+    value_key,
+    walk,
+)
+from ..language import evaluation
+from ..language.functions import Length, Sum
+from ..budget import BudgetAccountant, charge
+from ..cache import ResultCache
+
+# a function that returns an iterator over the chunks of the data
+Chunks = Callable[[], Iterable[pd.DataFrame]]
+
+# a function that computes a partial aggregate for a single chunk
+Partial = Callable[[Any], Any]
+
+
+def combine(total: Any, partial: Any, how: str) -> Any:
+    """
+    Merges the partial aggregate of a chunk into the aggregate of all previous
+    chunks.
+    """
+    if total is None:
+        return partial
+    if how == "sum":
+        if isinstance(total, (pd.Series, pd.DataFrame)):
+            return total.add(partial, fill_value=0)
+        return total + partial
+    if how in ("min", "max"):
+        # missing values (e.g. the minimum of an empty chunk) are ignored
+        f = np.fmin if how == "min" else np.fmax
+        if isinstance(total, pd.Series):
+            total, partial = total.align(partial)
+        return f(total, partial)
+    raise ValueError(f"cannot merge aggregate: {how}")
+
+
+def rows(view: Any) -> int:
+    """
+    Returns the number of rows of a chunk that belong to a dataset.
+    """
+    if isinstance(view, GroupedPandasDataset):
+        view = view.dataset
+    return view.count()
+
+
+def scan(
+    aggregates: Sequence[Tuple[Any, Partial, str]],
+    counts: Optional[List[int]] = None,
+) -> List[Any]:
+    """
+    Computes several aggregates in a single scan over the data.
+
+    :param aggregates: A list of `(dataset, partial, how)` tuples, where
+      `partial` returns the aggregate of a chunk of the dataset and `how` is
+      the name of the aggregation that merges these partial aggregates. All
+      datasets must read from the same chunks.
+    :param counts: Receives the number of rows that every aggregate
+      processed if the processed rows are counted (see
+      `evaluation.counting`).
+    """
+    if not aggregates:
+        return []
+    chunks = aggregates[0][0].chunks
+    if any(dataset.chunks is not chunks for dataset, _, _ in aggregates):
+        raise ValueError("can only scan datasets that read the same chunks")
+    results: List[Any] = [None] * len(aggregates)
+    counted = evaluation.counted()
+    processed = [0] * len(aggregates)
+    total = 0
+    # we count the rows that every dataset reads from a chunk instead of the
+    # rows that the partial aggregates report (e.g. counting the rows of an
+    # unfiltered chunk reports none)
+    with evaluation.counting() if counted else nullcontext():
+        for df in chunks():
+            # the values of a chunk (e.g. its filter masks) are kept in an
+            # evaluation context of their own, which is released with the chunk
+            with evaluation.isolated():
+                # every dataset is evaluated only once per chunk
+                views: Dict[int, Any] = {}
+                sizes: Dict[int, int] = {}
+                for i, (dataset, partial, how) in enumerate(aggregates):
+                    if id(dataset) not in views:
+                        views[id(dataset)] = dataset.view(df)
+                        if counted:
+                            sizes[id(dataset)] = rows(views[id(dataset)])
+                            total += sizes[id(dataset)]
+                    if counted:
+                        processed[i] += sizes[id(dataset)]
+                    value = dataset.align(partial(views[id(dataset)]), how)
+                    results[i] = combine(results[i], value, how)
+                del views, value
+            del df
+    if counted:
+        evaluation.processed(total)
+        if counts is not None:
+            counts[:] = processed
+    return [
+        dataset.align(result, how) if result is not None else dataset.empty(how)
+        for result, (dataset, _, how) in zip(results, aggregates)
+    ]
+
+
+class StreamingLength(Length):
+    def true(self) -> Any:
+        if not isinstance(self.dataset, (StreamingDataset, GroupedStreamingDataset)):
+            raise ValueError("expected a streaming dataset")
+        return self.dataset.count()
+
+
+class TrueStreamingAttribute(TrueAttribute):
+
+    """
+    Represents the values of a column (or of an arithmetic expression on
+    several columns) of a streaming dataset. The values are never
+    materialized, instead we record how to compute them for a single chunk
+    and aggregate them while scanning the data.
+
+    :param read: Returns the true pandas attribute of the column for a chunk
+      of the dataset.
+    """
+
+    operation: Any = None
+    operands: Tuple[Any, ...] = ()
+
+    def __init__(self, dataset: Any, read: Partial):
+        self.dataset = dataset
+        self.read = read
+
+    def evaluate(self, view: Any) -> Any:
+        """
+        Returns the true pandas attribute for a chunk of the dataset. We use a
+        stack instead of recursion, as the operations of long expressions can
+        be nested very deeply.
+        """
+        # the values of the operands that were not used yet
+        stack: List[Any] = []
+        for item in fused.postfix(self):
+            if fused.is_constant(item):
+                stack.append(item)
+            elif fused.is_leaf(item):
+                stack.append(item.read(view))
+            else:
+                count = len(item.operands)
+                operands = stack[-count:]
+                del stack[-count:]
+                stack.append(item.operation(*operands))
+        return stack.pop()
+
+    def __op__(self, op: Any, *operands: Any) -> TrueAttribute:
+        for operand in operands:
+            if isinstance(operand, TrueStreamingAttribute):
+                if operand.dataset is not self.dataset:
+                    raise ValueError("attributes must belong to the same dataset")
+            elif not isinstance(operand, (float, int, np.number)):
+                raise ValueError("unsupported operand")
+        return TrueStreamingOperation(self.dataset, op, *operands)
+
+    def __add__(self, other: TrueAttribute) -> TrueAttribute:
+        return self.__op__(operator.add, self, other)
+
+    def __radd__(self, other: TrueAttribute) -> TrueAttribute:
+        return self.__op__(operator.add, other, self)
+
+    def __sub__(self, other: TrueAttribute) -> TrueAttribute:
+        return self.__op__(operator.sub, self, other)
+
+    def __rsub__(self, other: TrueAttribute) -> TrueAttribute:
+        return self.__op__(operator.sub, other, self)
+
+    def __mul__(self, other: TrueAttribute) -> TrueAttribute:
+        return self.__op__(operator.mul, self, other)
+
+    def __rmul__(self, other: TrueAttribute) -> TrueAttribute:
+        return self.__op__(operator.mul, other, self)
+
+    def __truediv__(self, other: TrueAttribute) -> TrueAttribute:
+        return self.__op__(operator.truediv, self, other)
+
+    def __rtruediv__(self, other: TrueAttribute) -> TrueAttribute:
+        return self.__op__(operator.truediv, other, self)
+
+    def __floordiv__(self, other: TrueAttribute) -> TrueAttribute:
+        return self.__op__(operator.floordiv, self, other)
+
+    def __rfloordiv__(self, other: TrueAttribute) -> TrueAttribute:
+        return self.__op__(operator.floordiv, other, self)
+
+    def abs(self) -> Any:
+        return self.__op__(lambda value: value.abs(), self)
+
+    def partial(self, how: str) -> Partial:
+        """
+        Returns a function that aggregates the values of a chunk.
+        """
+        return lambda view: getattr(self.evaluate(view), how)()
+
+    def aggregate(self, how: str) -> Any:
+        (result,) = scan([(self.dataset, self.partial(how), how)])
+        return result
+
+    def sum(self) -> Any:
+        return self.aggregate("sum")
+
+    def max(self) -> Any:
+        return self.aggregate("max")
+
+    def min(self) -> Any:
+        return self.aggregate("min")
+
+    def moments(self, center: float = 0.0) -> Any:
+        """
+        Returns the number, the sum and the sum of squares of the values in a
+        single scan (please see `TruePandasAttribute.moments`).
+        """
+        partial: Partial = lambda view: self.evaluate(view).moments(center)
+        (result,) = scan([(self.dataset, partial, "sum")])
+        if isinstance(self.dataset, GroupedStreamingDataset):
+            if not isinstance(result, pd.DataFrame):
+                # there were no chunks
+                return pd.DataFrame(0.0, index=self.dataset.keys, columns=MOMENTS)
+            return result
+        return np.zeros(3) + result
+
+    def len(self) -> Any:
+        return self.dataset.count()
+
+    def __len__(self) -> int:
+        return int(np.sum(self.len()))
+
+
+class TrueStreamingOperation(TrueStreamingAttribute):
+
+    """
+    Represents an arithmetic operation on the values of one or several columns
+    of a streaming dataset.
+    """
+
+    def __init__(self, dataset: Any, operation: Any, *operands: Any):
+        self.dataset = dataset
+        self.operation = operation
+        self.operands = operands
+
+
+class StreamingAttribute(Attribute):
+    def __init__(self, dataset, column):
+        self.dataset = dataset
+        self.column = column
+
+    @cached_property
+    def type(self) -> Type:
+        return Array(self.dataset.type(self.column))
+
+    @cached_property
+    def key(self) -> Optional[Hashable]:
+        token = getattr(self.dataset, "token", None)
+        return None if token is None else (type(self), token, self.column)
+
+    def len(self):
+        return self.dataset.len()
+
+    def sum(self):
+        return Sum(self)
+
+    def dp(self, epsilon: float) -> Any:
+        raise NotImplementedError
+
+    def true(self) -> Any:
+        return self.dataset.column(self.column)
+
+    @cached_property
+    def static_sensitivity(self) -> Optional[Any]:
+        dt = self.dataset.type(self.column)
+        return dt.max - dt.min
+
+    def sensitivity(self) -> Any:
+        dt = self.dataset.type(self.column)
+        return dt.max - dt.min
+
+    def __len__(self):
+        return self.len()
+
+    def __ge__(self, other: Any) -> AttributeCondition:
+        return StreamingAttributeCondition(self, operator.ge, other)
+
+    def __le__(self, other: Any) -> AttributeCondition:
+        return StreamingAttributeCondition(self, operator.le, other)
+
+    def __gt__(self, other: Any) -> AttributeCondition:
+        return StreamingAttributeCondition(self, operator.gt, other)
+
+    def __lt__(self, other: Any) -> AttributeCondition:
+        return StreamingAttributeCondition(self, operator.lt, other)
+
+    def __eq__(self, other: Any) -> AttributeCondition:  # type: ignore[override]
+        return StreamingAttributeCondition(self, operator.eq, other)
+
+    def __ne__(self, other: Any) -> AttributeCondition:  # type: ignore[override]
+        return StreamingAttributeCondition(self, operator.ne, other)
+
+    # defining __eq__ would make attributes unhashable otherwise
+    __hash__ = Expression.__hash__
+
+
+class StreamingCondition(AttributeCondition):
+
+    """
+    Base class for conditions on streaming datasets. Conditions are translated
+    to the equivalent pandas conditions for every chunk of the data.
+    """
+
+    @abc.abstractproperty
+    def dataset(self) -> "StreamingDataset":
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def translate(self, view: PandasDataset) -> Any:
+        """
+        Returns the pandas condition for a chunk of the dataset.
+        """
+        raise NotImplementedError
+
+    def __and__(self, other: AttributeCondition) -> AttributeCondition:
+        return StreamingCompoundCondition(operator.and_, self, other)
+
+    def __or__(self, other: AttributeCondition) -> AttributeCondition:
+        return StreamingCompoundCondition(operator.or_, self, other)
+
+    def __invert__(self) -> AttributeCondition:
+        return StreamingCompoundCondition(operator.invert, self)
+
+    def __bool__(self) -> bool:
+        raise ValueError("conditions can only be combined using &, | and ~")
+
+    def true(self) -> Any:
+        raise NotImplementedError("conditions on streaming datasets are lazy")
+
+    def dp(self, epsilon: float) -> Any:
+        raise NotImplementedError
+
+    def sensitivity(self) -> Any:
+        raise NotImplementedError
+
+    @cached_property
+    def type(self) -> Type:
+        return Array(Boolean())
+
+
+class StreamingAttributeCondition(StreamingCondition):
+    attribute: StreamingAttribute
+    operator: Any
+    operand: Any
+
+    def __init__(self, attribute: StreamingAttribute, operator: Any, operand: Any):
+        if (
+            isinstance(operand, StreamingAttribute)
+            and operand.dataset is not attribute.dataset
+        ):
+            raise ValueError("can only compare attributes of the same dataset")
+        self.attribute = attribute
+        self.operator = operator
+        self.operand = operand
+
+    @property
+    def dataset(self) -> "StreamingDataset":
+        dataset = self.attribute.dataset
+        if not isinstance(dataset, StreamingDataset):
+            raise ValueError("conditions require an ungrouped streaming dataset")
+        return dataset
+
+    @property
+    def children(self) -> Tuple[Expression, ...]:
+        if isinstance(self.operand, Expression):
+            return (self.attribute, self.operand)
+        return (self.attribute,)
+
+    @cached_property
+    def key(self) -> Optional[Hashable]:
+        attribute, operand = self.attribute.key, value_key(self.operand)
+        if attribute is None or operand is None:
+            return None
+        return (type(self), attribute, self.operator, operand)
+
+    def translate(self, view: PandasDataset) -> Any:
+        operand = self.operand
+        if isinstance(operand, StreamingAttribute):
+            operand = view[operand.column]
+        return self.operator(view[self.attribute.column], operand)
+
+
+class StreamingCompoundCondition(StreamingCondition):
+
+    """
+    Combines several conditions on the same streaming dataset using a logical
+    operator.
+    """
+
+    operator: Any
+    conditions: List[StreamingCondition]
+
+    def __init__(self, operator: Any, *conditions: Any):
+        for condition in conditions:
+            if not isinstance(condition, StreamingCondition):
+                raise ValueError("can only combine streaming conditions")
+        if any(c.dataset is not conditions[0].dataset for c in conditions):
+            raise ValueError("can only combine conditions on the same dataset")
+        self.operator = operator
+        self.conditions = list(conditions)
+
+    @property
+    def dataset(self) -> "StreamingDataset":
+        return self.conditions[0].dataset
+
+    @property
+    def children(self) -> Tuple[Expression, ...]:
+        return tuple(self.conditions)
+
+    @cached_property
+    def key(self) -> Optional[Hashable]:
+        keys = tuple(condition.key for condition in self.conditions)
+        if any(key is None for key in keys):
+            return None
+        return (type(self), self.operator) + keys
+
+    def translate(self, view: PandasDataset) -> Any:
+        conditions = [condition.translate(view) for condition in self.conditions]
+        if self.operator is operator.invert:
+            (condition,) = conditions
+            return ~condition
+        return functools.reduce(self.operator, conditions)
+
+
+class GroupedStreamingDataset(GroupedDataset):
+
+    """
+    Groups a streaming dataset. Takes the same arguments as
+    `GroupedPandasDataset`, including the `treshold` for the noisy row count
+    of every group (please see there for the privacy implications).
+
+    The groups are determined in a first scan over the data, which counts the
+    rows of every group. Aggregates are then computed for all groups of a
+    chunk at once and merged by group key, so memory is bounded by the chunk
+    size and the number of groups.
+    """
+
+    def __init__(self, dataset, treshold=10, epsilon=0.3, **kwargs) -> None:
+        self.kwargs = kwargs
+        self.dataset = dataset
+        self.schema = dataset.schema
+        self.chunks = dataset.chunks
+        self.keys: Optional[pd.Index] = None
+        # every grouping yields different (noisy) groups
+        self.token = next(tokens)
+        # the noisy group sizes spend privacy budget, which is reserved
+        # before we scan the data
+        with charge([(dataset, epsilon)] if treshold is not None else []):
+            counts = self.count()
+            if not isinstance(counts, pd.Series):
+                counts = pd.Series([], dtype=np.int64)
+            counts = counts[counts > 0].sort_index().astype(np.int64)
+            keep = np.ones(len(counts), dtype=bool)
+            if treshold is not None:
+                noisy_counts = Integer(min=0).dp(counts.to_numpy(), 1, epsilon)
+                keep &= noisy_counts >= treshold
+        self.suppressed_groups = int(len(keep) - keep.sum())
+        self.keys = counts.index[keep]
+
+    def view(self, df: pd.DataFrame) -> GroupedPandasDataset:
+        return GroupedPandasDataset(self.dataset.view(df), treshold=None, **self.kwargs)
+
+    def align(self, partial: Any, how: str) -> Any:
+        """
+        Reindexes the aggregate of a chunk by the keys of all groups.
+        """
+        if self.keys is None:
+            return partial
+        return partial.reindex(self.keys, fill_value=0 if how == "sum" else np.nan)
+
+    def empty(self, how: str) -> Any:
+        return self.align(pd.Series([], dtype=np.int64), how)
+
+    @property
+    def groups(self) -> Iterable[Any]:
+        return list(self.keys if self.keys is not None else [])
+
+    @property
+    def datasets(self) -> Iterable[Dataset]:
+        """
+        Returns a filtered streaming dataset for every group. This is only
+        possible if the dataset is grouped by columns.
+        """
+        by = self.kwargs.get("by")
+        if isinstance(by, str):
+            by = [by]
+        if not isinstance(by, list) or not all(isinstance(c, str) for c in by):
+            raise NotImplementedError("can only return datasets for column groups")
+        datasets = []
+        for key in self.groups:
+            values = key if isinstance(key, tuple) else (key,)
+            dataset = self.dataset
+            for column, value in zip(by, values):
+                dataset = dataset[dataset[column] == value]
+            datasets.append(dataset)
+        return datasets
+
+    def type(self, column: str) -> Type:
+        return self.dataset.type(column)
+
+    def len(self) -> StreamingLength:
+        return StreamingLength(self)
+
+    def count(self) -> Any:
+        (result,) = scan([(self, lambda view: view.count(), "sum")])
+        return result
+
+    def column(self, column: str) -> TrueStreamingAttribute:
+        return TrueStreamingAttribute(self, lambda view: view.column(column))
+
+    def __getitem__(self, column: str) -> StreamingAttribute:
+        if not isinstance(column, str):
+            raise ValueError("grouped datasets can only be indexed by column")
+        return StreamingAttribute(self, column)
+
+
+class StreamingDataset(Dataset):
+
+    """
+    A dataset that is read in chunks of rows, e.g. from a large CSV file.
+
+    :param chunks: A function that returns an iterator over the chunks of the
+      data as pandas data frames. It is called for every scan over the data.
+    :param parent: The dataset that this (filtered) dataset was derived from.
+    :param condition: The condition that selects the rows of the dataset
+      from the rows of the parent.
+    """
+
+    def __init__(
+        self,
+        schema,
+        chunks: Chunks,
+        *args,
+        parent: Optional["StreamingDataset"] = None,
+        condition: Optional[StreamingCondition] = None,
+        accountant: Optional[BudgetAccountant] = None,
+        cache: Optional[ResultCache] = None,
+        **kwargs,
+    ):
+        super().__init__(schema, *args, accountant=accountant, cache=cache, **kwargs)
+        self.args = args
+        self.kwargs = kwargs
+        self.chunks = chunks
+        self.parent = parent
+        self.condition = condition
+
+    @classmethod
+    def from_csv(
+        cls, schema, filename: str, chunksize: int = 100_000, **kwargs
+    ) -> "StreamingDataset":
+        """
+        Reads a CSV file in chunks of rows. Additional arguments are passed to
+        `pandas.read_csv`.
+        """
+        return cls(schema, lambda: pd.read_csv(filename, chunksize=chunksize, **kwargs))
+
+    @classmethod
+    def from_parquet(
+        cls, schema, filename: str, batch_size: int = 100_000, **kwargs
+    ) -> "StreamingDataset":
+        """
+        Reads a Parquet file in batches of rows. Requires `pyarrow`, additional
+        arguments are passed to `pyarrow.parquet.ParquetFile.iter_batches`.
+        """
+        import pyarrow.parquet as pq  # type: ignore
+
+        def chunks() -> Iterator[pd.DataFrame]:
+            parquet_file = pq.ParquetFile(filename)
+            for batch in parquet_file.iter_batches(batch_size=batch_size, **kwargs):
+                yield batch.to_pandas()
+
+        return cls(schema, chunks)
+
+    def view(self, df: pd.DataFrame) -> PandasDataset:
+        """
+        Returns the rows of a chunk that belong to the dataset.
+        """
+        if self.parent is None or self.condition is None:
+            return PandasDataset(self.schema, df)
+        view = self.parent.view(df)
+        dataset = self.condition.dataset
+        # the condition might refer to another dataset on the same data
+        base = view if dataset is self.parent else dataset.view(df)
+        return cast(PandasDataset, view[self.condition.translate(base)])
+
+    def align(self, partial: Any, how: str) -> Any:
+        return partial
+
+    def empty(self, how: str) -> Any:
+        return 0 if how == "sum" else np.nan
+
+    def len(self):
+        return StreamingLength(self)
+
+    def __len__(self):
+        return self.len()
+
+    def count(self) -> int:
+        (result,) = scan([(self, lambda view: view.count(), "sum")])
+        return int(result)
+
+    def column(self, column: str) -> TrueStreamingAttribute:
+        return TrueStreamingAttribute(self, lambda view: view.column(column))
+
+    def group_by(self, **kwargs) -> GroupedDataset:
+        return GroupedStreamingDataset(self, **kwargs)
+
+    def bin_counts(
+        self, columns: Sequence[str], edges: Sequence[np.ndarray]
+    ) -> np.ndarray:
+        (result,) = scan([(self, lambda view: view.bin_counts(columns, edges), "sum")])
+        if result is None:
+            return np.zeros(tuple(len(e) - 1 for e in edges), dtype=np.int64)
+        return result
+
+    def precompute(self, expressions: Sequence[Expression]) -> None:
+        """
+        Computes the sums and row counts required by the given expressions in
+        a single scan over the data.
+        """
+        from ..language.operators import BinaryExpression
+
+        context = evaluation.current()
+        if context is None:
+            return
+        nodes: List[Expression] = []
+        aggregates: List[Tuple[Any, Partial, str]] = []
+        for expression in expressions:
+            for node in walk(expression):
+                if isinstance(node, StreamingLength):
+                    dataset = node.dataset
+                    aggregates.append((dataset, lambda view: view.count(), "sum"))
+                elif isinstance(node, Sum) and all(
+                    isinstance(n, (StreamingAttribute, Constant, BinaryExpression))
+                    for n in walk(node.expression)
+                ):
+                    # this only records how to compute the values of a chunk
+                    values = node.expression.true()
+                    if not isinstance(values, TrueStreamingAttribute):
+                        continue
+                    aggregates.append((values.dataset, values.partial("sum"), "sum"))
+                else:
+                    continue
+                if aggregates[-1][0].chunks is not self.chunks:
+                    aggregates.pop()
+                    continue
+                nodes.append(node)
+        counts: List[int] = []
+        results = scan(aggregates, counts)
+        for i, (node, value) in enumerate(zip(nodes, results)):
+            if isinstance(node, StreamingLength) and not isinstance(value, pd.Series):
+                value = int(value)
+            context.set(node, value, counts[i] if counts else None)
+
+    def __getitem__(
+        self, column_or_expression: Union[str, ConditionalExpression]
+    ) -> Union["StreamingDataset", StreamingAttribute]:
+        """
+        :params column_or_expression: If a string, returns the attribute
+          corresponding to the column named by the string. If a conditional
+          expression, returns a dataset with all rows that match the condition.
+        """
+        if isinstance(column_or_expression, str):
+            return StreamingAttribute(self, column_or_expression)
+        if not isinstance(column_or_expression, StreamingCondition):
+            raise ValueError("not supported")
+        if column_or_expression.dataset.chunks is not self.chunks:
+            raise ValueError("can only filter by conditions on the same data")
+        view = StreamingDataset(
+            self.schema,
+            self.chunks,
+            *self.args,
+            parent=self,
+            condition=column_or_expression,
+            accountant=self.accountant,
+            cache=self.cache,
+            **self.kwargs,
+        )
+        view.source = self.source
+        # identical filters on the same dataset yield identical views
+        if self.token is not None and column_or_expression.key is not None:
+            view.token = (self.token, column_or_expression.key)
+        return view
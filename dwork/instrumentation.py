@@ -0,0 +1,325 @@
+"""
+Instrumentation of the evaluation of queries.
+
+Collectors (see `Collector`) are called before and after the following
+events, with the time the event took and some metrics about it:
+
+- `query`: A query (or a batch of queries) whose budget is charged, with the
+  `epsilon` that it spends (see `dwork.budget.charge`).
+- `dp`: A call of `Expression.dp`.
+- `precompute`: The values that a dataset computes for a batch of queries at
+  once (see `Dataset.precompute`), with the `rows_scanned`.
+- `true`: The computation of the true value of an expression node. Values
+  that are already known within an evaluation are not reported. Nodes that
+  pass over the data report the `rows_scanned` (the rows they actually
+  processed, see `dwork.language.evaluation.counting`), nodes that return an
+  array (e.g. the mask of a filter) the `bytes_materialized`. Arithmetic on
+  columns is evaluated lazily (see `dwork.dataset.fused`) and materializes
+  nothing.
+- `sensitivity`: A data-dependent sensitivity calculation.
+- `noise`: A call of `Type.dp`, with the number of `noised_values`. Types
+  that add noise with other types (e.g. arrays) are reported once.
+- `mechanism`: A call of a function of `dwork.mechanisms`, with the number
+  of `noise_draws`. Mechanisms that call other mechanisms are reported once.
+
+Collectors are installed globally, as queries might be evaluated in other
+threads (see `dwork.dataset.parallel`). If no collector is installed, every
+instrumented call only checks whether the list of collectors is empty.
+
+`MetricsCollector` aggregates the events into timing histograms and counters
+and exports them in the Prometheus text format or as JSON::
+
+    collector = MetricsCollector()
+    with collecting(collector):
+        ds["Weight"].sum().dp(0.5)
+    print(collector.to_prometheus())
+"""
+
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional
+from typing import Sequence, Tuple
+import numpy as np
+
+Metrics = Dict[str, Any]
+Measure = Callable[[Tuple[Any, ...], Dict[str, Any], Any], Metrics]
+
+# the installed collectors, which we replace instead of modifying them
+collectors: Tuple["Collector", ...] = ()
+
+_lock = threading.Lock()
+_inactive = nullcontext()
+_events: ContextVar[Tuple[str, ...]] = ContextVar("dwork_events", default=())
+
+# the upper bounds (in seconds) of the buckets of the timing histograms
+BUCKETS = (1e-5, 1e-4, 1e-3, 1e-2, 0.1, 1.0, 10.0)
+
+
+class Collector:
+
+    """
+    Base class for collectors, which are called before (`pre`) and after
+    (`post`) every instrumented event. Events that raise an exception are not
+    reported by `post`.
+    """
+
+    def pre(self, event: str, target: Any) -> None:
+        pass
+
+    def post(self, event: str, target: Any, duration: float, metrics: Metrics) -> None:
+        pass
+
+
+def install(collector: Collector) -> None:
+    global collectors
+    with _lock:
+        if collector not in collectors:
+            collectors = collectors + (collector,)
+
+
+def uninstall(collector: Collector) -> None:
+    global collectors
+    with _lock:
+        collectors = tuple(c for c in collectors if c is not collector)
+
+
+@contextmanager
+def collecting(collector: Collector) -> Iterator[Collector]:
+    """
+    Installs a collector within a block.
+    """
+    install(collector)
+    try:
+        yield collector
+    finally:
+        uninstall(collector)
+
+
+@contextmanager
+def _span(
+    event: str, target: Any, metrics: Metrics, counted: bool = False
+) -> Iterator[Metrics]:
+    from .language.evaluation import counting
+
+    active = collectors
+    for collector in active:
+        collector.pre(event, target)
+    token = _events.set(_events.get() + (event,))
+    start = time.perf_counter()
+    try:
+        if not counted:
+            yield metrics
+        else:
+            with counting() as rows:
+                yield metrics
+            if rows[0]:
+                metrics["rows_scanned"] = rows[0]
+    finally:
+        _events.reset(token)
+    duration = time.perf_counter() - start
+    for collector in active:
+        collector.post(event, target, duration, metrics)
+
+
+def span(
+    event: str, target: Any = None, counted: bool = False, **metrics: Any
+) -> ContextManager[Metrics]:
+    """
+    Reports the block as an event. Metrics can be added to the yielded
+    dictionary within the block.
+
+    :param counted: Whether the rows that the block processes are reported
+      as `rows_scanned`.
+    """
+    if not collectors:
+        return _inactive  # type: ignore[return-value]
+    return _span(event, target, metrics, counted)
+
+
+def instrumented(
+    event: str,
+    measure: Optional[Measure] = None,
+    nested: bool = True,
+    method: bool = False,
+    counted: bool = False,
+) -> Callable[[Any], Any]:
+    """
+    Reports every call of a function as an event.
+
+    :param measure: Returns the metrics of a call from its arguments and its
+      result.
+    :param nested: Whether calls within another call of the same event are
+      reported.
+    :param method: Whether the function is a method, whose target is the
+      object that it is called on (instead of the function itself).
+    :param counted: Whether the rows that a call processes are reported as
+      `rows_scanned`. Rows that nested calls of the same event process are
+      reported by these calls.
+    """
+
+    def decorator(f: Any) -> Any:
+        @functools.wraps(f)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not collectors or (not nested and event in _events.get()):
+                return f(*args, **kwargs)
+            target = args[0] if method else f
+            with _span(event, target, {}, counted) as metrics:
+                value = f(*args, **kwargs)
+                if measure is not None:
+                    metrics.update(measure(args, kwargs, value))
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+def materialized(value: Any) -> int:
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if hasattr(value, "memory_usage"):
+        # a pandas series or data frame
+        return int(np.sum(value.memory_usage(index=False)))
+    return 0
+
+
+def allocated(args: Tuple[Any, ...], kwargs: Dict[str, Any], value: Any) -> Metrics:
+    size = materialized(value)
+    return {"bytes_materialized": size} if size else {}
+
+
+def noised(args: Tuple[Any, ...], kwargs: Dict[str, Any], value: Any) -> Metrics:
+    return {"noised_values": int(np.size(value))}
+
+
+def draws(args: Tuple[Any, ...], kwargs: Dict[str, Any], value: Any) -> Metrics:
+    return {"noise_draws": int(np.size(value))}
+
+
+def name(target: Any) -> str:
+    if target is None:
+        return ""
+    if callable(target) and hasattr(target, "__name__"):
+        return target.__name__
+    return type(target).__name__
+
+
+class Timing:
+
+    """
+    A histogram of the durations of an event.
+    """
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, duration: float) -> None:
+        self.count += 1
+        self.sum += duration
+        for i, bound in enumerate(self.buckets):
+            if duration <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self) -> List[int]:
+        return np.cumsum(self.counts).tolist()
+
+
+def escape(label: str) -> str:
+    return label.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsCollector(Collector):
+
+    """
+    Aggregates the durations of all events into histograms and sums up their
+    metrics, both per event and target (e.g. the class of an expression node
+    or the name of a mechanism).
+
+    :param buckets: The upper bounds of the buckets of the histograms in
+      seconds.
+    """
+
+    def __init__(self, buckets: Sequence[float] = BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.lock = threading.Lock()
+        self.timings: Dict[Tuple[str, str], Timing] = {}
+        self.counters: Dict[Tuple[str, str, str], float] = {}
+
+    def post(self, event: str, target: Any, duration: float, metrics: Metrics) -> None:
+        labels = (event, name(target))
+        with self.lock:
+            timing = self.timings.get(labels)
+            if timing is None:
+                timing = self.timings[labels] = Timing(self.buckets)
+            timing.observe(duration)
+            for metric, value in metrics.items():
+                key = (metric,) + labels
+                self.counters[key] = self.counters.get(key, 0) + value
+
+    def reset(self) -> None:
+        with self.lock:
+            self.timings = {}
+            self.counters = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            timings = [
+                {
+                    "event": event,
+                    "target": target,
+                    "count": timing.count,
+                    "sum": timing.sum,
+                    "buckets": dict(zip(self.buckets, timing.cumulative())),
+                }
+                for (event, target), timing in self.timings.items()
+            ]
+            counters = [
+                {"metric": metric, "event": event, "target": target, "value": value}
+                for (metric, event, target), value in self.counters.items()
+            ]
+        return {"timings": timings, "counters": counters}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+    def to_prometheus(self, prefix: str = "dwork") -> str:
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        data = self.to_dict()
+        lines = [
+            f"# HELP {prefix}_duration_seconds The duration of instrumented events.",
+            f"# TYPE {prefix}_duration_seconds histogram",
+        ]
+        for timing in data["timings"]:
+            labels = (
+                f'event="{escape(timing["event"])}",target="{escape(timing["target"])}"'
+            )
+            for bound, count in timing["buckets"].items():
+                lines.append(
+                    f'{prefix}_duration_seconds_bucket{{{labels},le="{bound}"}} {count}'
+                )
+            lines.append(
+                f'{prefix}_duration_seconds_bucket{{{labels},le="+Inf"}} {timing["count"]}'
+            )
+            lines.append(f"{prefix}_duration_seconds_sum{{{labels}}} {timing['sum']}")
+            lines.append(
+                f"{prefix}_duration_seconds_count{{{labels}}} {timing['count']}"
+            )
+        metrics: Dict[str, List[Dict[str, Any]]] = {}
+        for counter in data["counters"]:
+            metrics.setdefault(counter["metric"], []).append(counter)
+        for metric, counters in metrics.items():
+            lines.append(f"# TYPE {prefix}_{metric}_total counter")
+            for counter in counters:
+                labels = f'event="{escape(counter["event"])}",target="{escape(counter["target"])}"'
+                lines.append(f"{prefix}_{metric}_total{{{labels}}} {counter['value']}")
+        return "\n".join(lines) + "\n"
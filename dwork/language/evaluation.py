@@ -0,0 +1,278 @@
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+
+class EvaluationContext:
+
+    """
+    Stores the true values of all expressions that were evaluated during a
+    single call of `true`, `dp` or `sensitivity` on an expression tree. This
+    ensures that every node of the tree is evaluated only once, even if it
+    appears several times in the tree or if its value is required by the
+    sensitivity calculation as well.
+
+    Values are keyed by the identity of the expression. We keep a reference
+    to the expression itself so that its `id` cannot be reused by another
+    object while the context is alive.
+    """
+
+    def __init__(self) -> None:
+        self.values: Dict[int, Tuple[Any, Any]] = {}
+        # the data-dependent sensitivities, keyed like the values
+        self.sensitivities: Dict[int, Tuple[Any, Any]] = {}
+        self.shared: Dict[Hashable, Any] = {}
+        # the rows that were processed to compute the values that were set
+        self.rows: Dict[int, int] = {}
+
+    def true(self, expression: Any, f: Callable[[Any], Any]) -> Any:
+        key = id(expression)
+        if key in self.values:
+            return self.values[key][1]
+        value = compute(expression, f)
+        self.values[key] = (expression, value)
+        return value
+
+    def set(self, expression: Any, value: Any, rows: Optional[int] = None) -> None:
+        """
+        Stores the true value of an expression that was computed elsewhere,
+        e.g. together with other values in a single pass over the data.
+
+        :param rows: The number of rows that were processed to compute the
+          value (see `processed`), if known.
+        """
+        self.values[id(expression)] = (expression, value)
+        if rows is not None:
+            self.rows[id(expression)] = rows
+
+    def shared_value(self, key: Hashable, f: Callable[[], Any]) -> Any:
+        """
+        Returns a value that is shared by structurally identical expressions
+        (e.g. identical filter conditions), computing it only once.
+        """
+        if key not in self.shared:
+            self.shared[key] = f()
+        return self.shared[key]
+
+
+_context: ContextVar[Optional[EvaluationContext]] = ContextVar(
+    "dwork_evaluation_context", default=None
+)
+
+Observer = Callable[[Any, Callable[[Any], Any]], Any]
+
+_observer: ContextVar[Optional[Observer]] = ContextVar(
+    "dwork_evaluation_observer", default=None
+)
+
+
+def compute(expression: Any, f: Callable[[Any], Any]) -> Any:
+    """
+    Computes the true value of an expression, passing the computation to the
+    active observer (if any).
+    """
+    observer = _observer.get()
+    if observer is None:
+        return f(expression)
+    return observer(expression, f)
+
+
+@contextmanager
+def observe(observer: Observer) -> Iterator[None]:
+    """
+    Calls `observer(expression, f)` instead of `f(expression)` whenever the
+    true value of an expression is computed (i.e. not taken from the current
+    evaluation context), e.g. to measure the time that every node of an
+    expression tree takes (see `dwork.language.explain`).
+    """
+    token = _observer.set(observer)
+    try:
+        yield
+    finally:
+        _observer.reset(token)
+
+
+_counter: ContextVar[Optional[List[int]]] = ContextVar(
+    "dwork_evaluation_counter", default=None
+)
+
+
+@contextmanager
+def counting() -> Iterator[List[int]]:
+    """
+    Counts the rows that the computations within the block process (see
+    `processed`). The yielded list contains the count as its only item.
+    Rows that are counted by a nested block are not added to this one.
+    """
+    counter = [0]
+    token = _counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _counter.reset(token)
+
+
+def counted() -> bool:
+    """
+    Returns whether the processed rows are currently counted.
+    """
+    return _counter.get() is not None
+
+
+def processed(rows: int) -> None:
+    """
+    Reports that a computation processed the given number of rows, e.g. the
+    rows of a filtered dataset that a sum added up.
+    """
+    counter = _counter.get()
+    if counter is not None:
+        counter[0] += rows
+
+
+def current() -> Optional[EvaluationContext]:
+    """
+    Returns the active evaluation context, or `None` if no evaluation is
+    currently running.
+    """
+    return _context.get()
+
+
+@contextmanager
+def evaluation() -> Iterator[EvaluationContext]:
+    """
+    Opens a new evaluation context, or reuses the active one if we are
+    already inside of an evaluation. The cached values are released as soon
+    as the outermost evaluation finishes.
+    """
+    context = _context.get()
+    if context is not None:
+        yield context
+        return
+    context = EvaluationContext()
+    token = _context.set(context)
+    try:
+        yield context
+    finally:
+        _context.reset(token)
+
+
+@contextmanager
+def isolated() -> Iterator[EvaluationContext]:
+    """
+    Opens a new evaluation context even if we are already inside of an
+    evaluation, e.g. to evaluate expressions on a single chunk of the data
+    whose values must not outlive the chunk. The active context is restored
+    afterwards.
+    """
+    context = EvaluationContext()
+    token = _context.set(context)
+    try:
+        yield context
+    finally:
+        _context.reset(token)
+
+
+def prepare(expression: Any, values: Dict[int, Any], method: str) -> None:
+    """
+    Computes the true values (or the sensitivities) of the children of a
+    strict expression (see `Expression.strict`) before the expression itself,
+    going down into the children that are strict as well (the other children
+    are computed by the expression itself). We use a stack instead of
+    recursion, so deep trees (e.g. long sums of attributes) do not exceed the
+    recursion limit, as every node then finds the values of its children in
+    the evaluation context.
+
+    :param values: The values of the context that `method` stores its results
+      in.
+    """
+    stack = [
+        (child, False)
+        for child in reversed(expression.children)
+        if child.strict and id(child) not in values
+    ]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            getattr(node, method)()
+            continue
+        if id(node) in values:
+            continue
+        stack.append((node, True))
+        stack.extend(
+            (child, False)
+            for child in reversed(node.children)
+            if child.strict and id(child) not in values
+        )
+
+
+def memoized(f: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    """
+    Wraps the `true` method of an expression so that its value is computed
+    only once per evaluation.
+    """
+
+    @functools.wraps(f)
+    def true(self: Any) -> Any:
+        context = _context.get()
+        if context is None:
+            with evaluation():
+                return true(self)
+        # this is the hot path, so we access the cache directly
+        entry = context.values.get(id(self))
+        if entry is not None:
+            return entry[1]
+        observer = _observer.get()
+        if observer is not None:
+            # observers measure the values of the children as well
+            value = observer(self, f)
+        else:
+            if self.strict:
+                prepare(self, context.values, "true")
+            value = f(self)
+        context.values[id(self)] = (self, value)
+        return value
+
+    return true
+
+
+def scoped(f: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Wraps a method of an expression (e.g. `dp` or `sensitivity`) so that it
+    runs within an evaluation context.
+    """
+
+    @functools.wraps(f)
+    def method(self: Any, *args: Any, **kwargs: Any) -> Any:
+        with evaluation():
+            return f(self, *args, **kwargs)
+
+    return method
+
+
+def static_or_scoped(f: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Wraps the `sensitivity` method of an expression so that it returns the
+    cached static sensitivity of the expression if there is one, and runs
+    within an evaluation context otherwise. Like true values, the sensitivity
+    is only computed once per evaluation.
+    """
+
+    @functools.wraps(f)
+    def sensitivity(self: Any, *args: Any, **kwargs: Any) -> Any:
+        static = self.static_sensitivity
+        if static is not None:
+            return static
+        with evaluation() as context:
+            if args or kwargs:
+                return f(self, *args, **kwargs)
+            entry = context.sensitivities.get(id(self))
+            if entry is not None:
+                return entry[1]
+            if self.strict:
+                prepare(self, context.sensitivities, "sensitivity")
+            value = f(self)
+            context.sensitivities[id(self)] = (self, value)
+            return value
+
+    return sensitivity
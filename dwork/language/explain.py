@@ -0,0 +1,510 @@
+"""
+Describes how an expression is evaluated, without evaluating it.
+
+`explain` returns a plan with a node for every node of the expression tree.
+Every plan node lists the columns that the node reads, the filters of the
+dataset it reads them from, the number of passes over the rows it needs and
+the estimated number of rows and bytes that these passes read, together with
+the type bounds and the sensitivity of the node. For example::
+
+    print(ds[ds["Height"] > 170]["Weight"].sum().explain())
+
+In `analyze` mode the expression is evaluated as well (without adding noise,
+so no privacy budget is spent), and every plan node records the time its true
+value took (including the time of its children) and the number of rows it
+actually processed (e.g. the rows that a sum over a filtered dataset added
+up, not counting the rows that its children processed). Values that the
+datasets compute together in a single pass (see `Dataset.precompute`) are
+marked as `precomputed`, the time of this pass is recorded by the plan instead
+of the nodes.
+"""
+
+import operator
+import time
+import numpy as np
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+from . import evaluation
+from .expression import Constant, Expression, datasets, walk
+from .functions import Histogram, Length, Moments, Quantile, Sum
+from .operators import Add, BinaryExpression, FloorDiv, Mul, Sub, TrueDiv
+from .types import Array, Type
+from ..dataset.attribute import Attribute
+from ..dataset.dataset import GroupedDataset
+
+OPERATORS = {
+    operator.ge: ">=",
+    operator.le: "<=",
+    operator.gt: ">",
+    operator.lt: "<",
+    operator.eq: "==",
+    operator.ne: "!=",
+    operator.and_: "&",
+    operator.or_: "|",
+    operator.invert: "~",
+    np.logical_and: "&",
+    np.logical_or: "|",
+    np.logical_not: "~",
+    Add: "+",
+    Sub: "-",
+    Mul: "*",
+    TrueDiv: "/",
+    FloorDiv: "//",
+}
+
+# functions that read the rows of their dataset once
+SCANS = (Sum, Moments, Quantile, Histogram)
+
+
+def describe(expression: Any, known: Optional[Dict[int, str]] = None) -> str:
+    """
+    Returns a short, human-readable description of an expression.
+
+    :param known: The descriptions of expressions that were described before
+      (e.g. the children of the expression), keyed by their identity.
+    """
+    if known is not None and id(expression) in known:
+        return known[id(expression)]
+    if not isinstance(expression, Expression):
+        return repr(expression)
+    if isinstance(expression, Attribute):
+        return str(expression.column)
+    if isinstance(expression, Constant):
+        return repr(expression.value)
+    if isinstance(expression, BinaryExpression):
+        op = OPERATORS[type(expression)]
+        left = describe(expression.left, known)
+        right = describe(expression.right, known)
+        return f"({left} {op} {right})"
+    if isinstance(expression, Length):
+        return "len()"
+    if isinstance(expression, Histogram):
+        return f"histogram({', '.join(expression.columns)})"
+    if isinstance(expression, Quantile):
+        q = expression.q[0] if expression.scalar else list(expression.q)
+        return f"quantile({describe(expression.expression, known)}, {q})"
+    op = OPERATORS.get(getattr(expression, "operator", None), "?")
+    if hasattr(expression, "attribute"):
+        # a condition on an attribute
+        operand = describe(getattr(expression, "operand"), known)
+        return f"{describe(expression.attribute, known)} {op} {operand}"
+    if hasattr(expression, "conditions"):
+        conditions = [describe(c, known) for c in expression.conditions]
+        if op == "~":
+            return f"~({conditions[0]})"
+        return f" {op} ".join(f"({c})" for c in conditions)
+    arguments = ", ".join(describe(child, known) for child in expression.children)
+    return f"{type(expression).__name__.lower()}({arguments})"
+
+
+def describe_type(type: Type) -> str:
+    if isinstance(type, Array):
+        return f"Array({describe_type(type.type)})"
+    if hasattr(type, "min") and hasattr(type, "max"):
+        return f"{type.__class__.__name__}[{type.min}, {type.max}]"
+    return type.__class__.__name__
+
+
+def filters(dataset: Any) -> List[str]:
+    """
+    Returns the conditions that select the rows of a (filtered) dataset, from
+    the outermost to the innermost filter.
+    """
+    dataset = base(dataset)
+    conditions: List[str] = []
+    while dataset is not None:
+        condition = getattr(dataset, "condition", None)
+        if condition is not None:
+            conditions.append(describe(condition))
+        dataset = getattr(dataset, "parent", None)
+    return conditions[::-1]
+
+
+def base(dataset: Any) -> Any:
+    """
+    Returns the ungrouped dataset of a grouped dataset.
+    """
+    while isinstance(dataset, GroupedDataset):
+        dataset = dataset.dataset
+    return dataset
+
+
+def plain(value: Any) -> Any:
+    """
+    Converts numpy and pandas values to Python values.
+    """
+    if isinstance(value, np.generic):
+        return value.item()
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return value
+
+
+class PlanNode:
+
+    """
+    Describes how a single node of an expression is evaluated.
+
+    :ivar passes: The number of passes over the rows of the dataset that the
+      node needs. Attributes and arithmetic on them need no passes of their
+      own, as their values are only read by the aggregates that use them.
+    :ivar rows: The estimated number of rows that these passes read, or
+      `None` if the number of rows is not known (e.g. for streaming datasets).
+    :ivar bytes: The estimated number of bytes that these passes read.
+    :ivar shared: `True` if the node already appeared elsewhere in the plan,
+      so that its value is only computed once.
+    """
+
+    def __init__(self, expression: Expression, children: List["PlanNode"]):
+        self.expression = expression
+        self.children = children
+        self.operation = type(expression).__name__
+        known = {id(child.expression): child.description for child in children}
+        self.description: str = describe(expression, known)
+        self.type: Optional[str] = None
+        self.bounds: Optional[List[Any]] = None
+        self.sensitivity: Any = expression.static_sensitivity
+        self.columns: List[str] = []
+        self.filters: List[str] = []
+        self.grouping: Optional[Any] = None
+        self.passes = 0
+        self.rows: Optional[int] = None
+        self.bytes: Optional[int] = None
+        self.shared = False
+        # only set in analyze mode
+        self.time: Optional[float] = None
+        self.rows_processed: Optional[int] = None
+        self.precomputed: Optional[bool] = None
+
+    def walk(self) -> Iterator["PlanNode"]:
+        """
+        Returns this node and all nodes below it, parents before their
+        children. Like all methods of plans, this does not use recursion, as
+        the plans of long expressions can be very deep.
+        """
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+
+    def to_dict(self) -> Dict[str, Any]:
+        results: Dict[int, Dict[str, Any]] = {}
+        # children before their parents
+        for node in reversed(list(self.walk())):
+            result = node.fields()
+            result["children"] = [results.pop(id(c)) for c in node.children]
+            results[id(node)] = result
+        return results[id(self)]
+
+    def fields(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = {
+            "operation": self.operation,
+            "description": self.description,
+            "type": self.type,
+            "bounds": self.bounds,
+            "sensitivity": plain(self.sensitivity),
+            "columns": self.columns,
+            "filters": self.filters,
+            "grouping": self.grouping,
+            "passes": self.passes,
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "shared": self.shared,
+        }
+        if self.time is not None:
+            result["time"] = self.time
+            result["rows_processed"] = self.rows_processed
+            result["precomputed"] = self.precomputed
+        return result
+
+    def lines(self) -> Iterator[str]:
+        stack = [(self, 0)]
+        while stack:
+            node, depth = stack.pop()
+            yield f"{'  ' * depth}{node.line()}"
+            stack.extend((child, depth + 1) for child in reversed(node.children))
+
+    def line(self) -> str:
+        details = [f"type={self.type}", f"sensitivity={plain(self.sensitivity)}"]
+        if self.shared:
+            details.append("shared")
+        if self.passes:
+            details.append(f"passes={self.passes}")
+            details.append(f"rows={self.rows}")
+            details.append(f"bytes={self.bytes}")
+        if self.columns:
+            details.append(f"columns={','.join(self.columns)}")
+        if self.filters:
+            details.append(f"filters={' and '.join(self.filters)}")
+        if self.grouping is not None:
+            details.append(f"grouping={self.grouping}")
+        if self.time is not None:
+            details.append(f"time={self.time * 1000:.3f}ms")
+            details.append(f"rows_processed={self.rows_processed}")
+            if self.precomputed:
+                details.append("precomputed")
+        return f"{self.operation} {self.description} [{', '.join(details)}]"
+
+
+class Plan:
+
+    """
+    The plan of an expression (see `explain`), whose totals sum up the work
+    of all nodes.
+    """
+
+    def __init__(self, root: PlanNode, analyze: bool = False):
+        self.root = root
+        self.analyze = analyze
+        self.time: Optional[float] = None
+        self.precompute_time: Optional[float] = None
+
+    def nodes(self) -> Iterator[PlanNode]:
+        return self.root.walk()
+
+    @property
+    def passes(self) -> int:
+        return sum(node.passes for node in self.nodes())
+
+    @property
+    def rows(self) -> Optional[int]:
+        rows = [node.rows for node in self.nodes() if node.passes]
+        return None if None in rows else sum(r for r in rows if r is not None)
+
+    @property
+    def bytes(self) -> Optional[int]:
+        sizes = [node.bytes for node in self.nodes() if node.passes]
+        return None if None in sizes else sum(s for s in sizes if s is not None)
+
+    @property
+    def columns(self) -> List[str]:
+        columns: Dict[str, None] = {}
+        for node in self.nodes():
+            columns.update(dict.fromkeys(node.columns))
+        return list(columns)
+
+    def to_dict(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = {
+            "passes": self.passes,
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "columns": self.columns,
+        }
+        if self.analyze:
+            result["time"] = self.time
+            result["precompute_time"] = self.precompute_time
+        result["plan"] = self.root.to_dict()
+        return result
+
+    def __str__(self) -> str:
+        return "\n".join(self.root.lines())
+
+
+class Planner:
+
+    """
+    Builds the plan of an expression, visiting every node only once.
+    """
+
+    def __init__(self) -> None:
+        self.seen: Set[int] = set()
+        # the nodes whose sensitivity is computed without reading any data
+        self.local: Set[int] = set()
+        # the first dataset that every node refers to (see `datasets`)
+        self.datasets: Dict[int, Any] = {}
+
+    def plan(self, expression: Expression) -> PlanNode:
+        # the plans of the children that were not used yet
+        planned: List[PlanNode] = []
+        stack = [(expression, False)]
+        # the context of the local sensitivities (see `local_sensitivity`)
+        with evaluation.isolated():
+            while stack:
+                node, expanded = stack.pop()
+                if not expanded:
+                    stack.append((node, True))
+                    stack.extend((c, False) for c in reversed(node.children))
+                    continue
+                start = len(planned) - len(node.children)
+                children = planned[start:]
+                del planned[start:]
+                planned.append(self.node(node, children))
+        return planned.pop()
+
+    def node(self, expression: Expression, children: List[PlanNode]) -> PlanNode:
+        node = PlanNode(expression, children)
+        if id(expression) in self.seen:
+            node.shared = True
+        self.seen.add(id(expression))
+        try:
+            type: Any = expression.type
+            node.type = describe_type(type)
+            if hasattr(type, "min"):
+                node.bounds = [plain(type.min), plain(type.max)]
+        except (ValueError, NotImplementedError):
+            # e.g. conditions, which have no type
+            pass
+        if isinstance(expression, (Attribute, BinaryExpression, Constant)) and all(
+            id(child) in self.local for child in expression.children
+        ):
+            self.local.add(id(expression))
+        if node.sensitivity is None:
+            if id(expression) in self.local:
+                node.sensitivity = local_sensitivity(expression)
+            elif isinstance(expression, Sum):
+                node.sensitivity = children[0].sensitivity
+        node.columns = columns(expression)
+        dataset = expression.__dict__.get("dataset")
+        for child in expression.children:
+            if dataset is None:
+                dataset = self.datasets.get(id(child))
+        self.datasets[id(expression)] = dataset
+        if dataset is not None:
+            node.filters = filters(dataset)
+            if isinstance(dataset, GroupedDataset):
+                node.grouping = getattr(dataset, "kwargs", {}).get("by")
+            if not node.shared:
+                node.passes = passes(expression, dataset)
+            if node.passes:
+                node.rows, node.bytes = estimate(dataset, node.columns)
+        return node
+
+
+def local_sensitivity(expression: Expression) -> Optional[Any]:
+    """
+    Computes the sensitivity of arithmetic on attributes and constants (see
+    `optimizer.is_local`) without reading any data. The sensitivity only
+    depends on the types of the attributes, so we evaluate it with empty
+    arrays in place of their values. The planner computes the sensitivities
+    of all nodes in the same evaluation context, from the bottom up, so the
+    sensitivities of the children are already known.
+    """
+    context = evaluation.current()
+    assert context is not None
+    for child in expression.children:
+        if isinstance(child, Attribute):
+            context.set(child, np.empty(0))
+    try:
+        sensitivity = expression.sensitivity()
+    except (ArithmeticError, ValueError, NotImplementedError):
+        # e.g. divisions by attributes that can be zero
+        return None
+    # a value-dependent sensitivity would be derived from the empty arrays
+    return None if np.ndim(sensitivity) else sensitivity
+
+
+def columns(expression: Expression) -> List[str]:
+    """
+    Returns the columns that a node reads.
+    """
+    if isinstance(expression, Attribute):
+        return [expression.column]
+    if isinstance(expression, Histogram):
+        return list(expression.columns)
+    if isinstance(expression, SCANS):
+        return [n.column for n in walk(expression) if isinstance(n, Attribute)]
+    return []
+
+
+def passes(expression: Expression, dataset: Any) -> int:
+    """
+    Returns the number of passes over the rows of a dataset that a node needs.
+    """
+    if isinstance(expression, SCANS):
+        return 1
+    if isinstance(expression, Length):
+        ungrouped = base(dataset)
+        # the length of an unfiltered data frame is known without a pass
+        if dataset is ungrouped and hasattr(dataset, "df"):
+            return 0 if dataset.mask is None else 1
+        return 1
+    return 0
+
+
+def estimate(
+    dataset: Any, columns: Sequence[str]
+) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Estimates the rows and bytes that a pass over columns of a dataset reads,
+    which is not possible for streaming datasets.
+    """
+    ungrouped = base(dataset)
+    df = getattr(ungrouped, "df", None)
+    if df is None:
+        return None, None
+    rows = len(df)
+    size = sum(getattr(df[column].dtype, "itemsize", 8) for column in columns)
+    if getattr(ungrouped, "mask", None) is not None:
+        size += 1
+    if dataset is not ungrouped:
+        # the group code of every row
+        size += 8
+    return rows, rows * size
+
+
+def cost(expression: Expression) -> Tuple[int, Optional[int], Optional[int]]:
+    """
+    Returns the number of passes over the data that a node needs, and the
+    estimated rows and bytes that every pass reads.
+    """
+    if not isinstance(expression, SCANS + (Length,)):
+        return 0, None, None
+    found = datasets(expression)
+    if not found:
+        return 0, None, None
+    count = passes(expression, found[0])
+    if not count:
+        return 0, None, None
+    return (count, *estimate(found[0], columns(expression)))
+
+
+def explain(expression: Expression, analyze: bool = False) -> Plan:
+    """
+    Returns the plan of an expression (see above). In `analyze` mode, the
+    expression is evaluated and the data-dependent sensitivities of all
+    nodes are computed as well.
+    """
+    root = Planner().plan(expression)
+    plan = Plan(root, analyze)
+    if analyze:
+        run(expression, plan)
+    return plan
+
+
+def run(expression: Expression, plan: Plan) -> None:
+    nodes: Dict[int, PlanNode] = {}
+    for node in plan.nodes():
+        if not node.shared:
+            nodes[id(node.expression)] = node
+            node.time = 0.0
+            node.rows_processed = 0
+            node.precomputed = False
+
+    def observer(expression: Any, f: Any) -> Any:
+        start = time.perf_counter()
+        with evaluation.counting() as rows:
+            value = f(expression)
+        node = nodes.get(id(expression))
+        if node is not None:
+            node.time = time.perf_counter() - start
+            node.rows_processed = rows[0]
+        return value
+
+    start = time.perf_counter()
+    with evaluation.evaluation() as context, evaluation.observe(observer):
+        with evaluation.counting():
+            for dataset in {id(d): base(d) for d in datasets(expression)}.values():
+                dataset.precompute([expression])
+        plan.precompute_time = time.perf_counter() - start
+        for node in nodes.values():
+            if id(node.expression) in context.values:
+                node.precomputed = True
+                node.rows_processed = context.rows.get(id(node.expression), 0)
+        expression.true()
+        for node in nodes.values():
+            if node.sensitivity is None:
+                try:
+                    node.sensitivity = node.expression.sensitivity()
+                except (ValueError, NotImplementedError):
+                    pass
+    plan.time = time.perf_counter() - start
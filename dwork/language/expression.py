@@ -1,9 +1,111 @@
 import abc
-from typing import Any
+from functools import cached_property
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    cast,
+)
 from .types import Type
+from .evaluation import memoized, scoped, static_or_scoped
+from ..budget import charged
+from ..cache import cached
+from ..instrumentation import instrumented, allocated
+
+# cached properties that depend on the same property of the children
+TREE_PROPERTIES = ("type", "static_sensitivity", "key")
+
+
+class tree_property(cached_property):
+
+    """
+    A cached property of an expression that depends on the same property of
+    its children, like its type. Computing it for a deep tree would exceed
+    the recursion limit, so we compute it for the children first (from the
+    bottom up, see `postorder`).
+    """
+
+    def __get__(self, instance: Any, owner: Any = None) -> Any:
+        name = cast(str, self.attrname)
+        if instance is None or name in instance.__dict__:
+            return super().__get__(instance, owner)
+        if any(name not in child.__dict__ for child in instance.children):
+            for node in postorder(instance, lambda node: name in node.__dict__):
+                if node is instance:
+                    break
+                try:
+                    getattr(node, name)
+                except Exception:
+                    # e.g. conditions have no type, the error is raised again
+                    # if the property of the expression requires it
+                    pass
+        return super().__get__(instance, owner)
+
+
+class ExpressionMeta(abc.ABCMeta):
+    def __call__(cls, *args, **kwargs):
+        """
+        Freezes expressions after their construction, which allows us to cache
+        properties like the type or the static sensitivity of an expression.
+        """
+        expression = super().__call__(*args, **kwargs)
+        expression.__dict__["_frozen"] = True
+        return expression
+
 
+class Expression(metaclass=ExpressionMeta):
+    # whether `true` always computes the true values of all children, which
+    # allows us to compute them beforehand (see `evaluation.prepare`)
+    strict = False
+
+    def __init_subclass__(cls, **kwargs):
+        """
+        Makes sure that the true value of every expression is only computed
+        once per evaluation, and that `dp` and `sensitivity` share these
+        values with each other. Calls of `dp` are charged to the budget
+        accountants of the datasets (see `dwork.budget`), and repeated calls
+        return cached results if the datasets have a result cache (see
+        `dwork.cache`). All of them report their calls to the installed
+        collectors (see `dwork.instrumentation`). Properties like the type
+        are computed for the children of an expression first.
+        """
+        super().__init_subclass__(**kwargs)
+        for name in TREE_PROPERTIES:
+            prop = cls.__dict__.get(name)
+            if isinstance(prop, cached_property) and not isinstance(
+                prop, tree_property
+            ):
+                prop = tree_property(prop.func)
+                prop.__set_name__(cls, name)
+                setattr(cls, name, prop)
+        if "true" in cls.__dict__:
+            cls.true = memoized(  # type: ignore[assignment]
+                instrumented("true", allocated, method=True, counted=True)(
+                    cls.__dict__["true"]
+                )
+            )
+        if "dp" in cls.__dict__:
+            # the budget is reserved before anything is evaluated
+            cls.dp = cached(  # type: ignore[assignment]
+                instrumented("dp", method=True)(charged(scoped(cls.__dict__["dp"])))
+            )
+        if "sensitivity" in cls.__dict__:
+            cls.sensitivity = static_or_scoped(  # type: ignore[assignment]
+                instrumented("sensitivity", method=True)(cls.__dict__["sensitivity"])
+            )
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if self.__dict__.get("_frozen"):
+            raise AttributeError("expressions cannot be modified")
+        super().__setattr__(name, value)
 
-class Expression(abc.ABC):
     def __add__(self, right: Any) -> "Expression":
         from .operators import Add
 
@@ -33,6 +135,39 @@ class Expression(abc.ABC):
     def type(self) -> Type:
         raise NotImplementedError
 
+    @property
+    def children(self) -> Tuple["Expression", ...]:
+        """
+        Returns the subexpressions of this expression.
+        """
+        return ()
+
+    @tree_property
+    def static_sensitivity(self) -> Optional[Any]:
+        """
+        Returns the sensitivity of the expression if it does not depend on the
+        data, otherwise `None`. If available, `sensitivity` returns this value
+        without evaluating the expression.
+        """
+        return None
+
+    @tree_property
+    def key(self) -> Optional[Hashable]:
+        """
+        Returns a canonical key that is identical for structurally identical
+        expressions on the same data, or `None` if the expression cannot be
+        identified (e.g. as it contains values that cannot be hashed). By
+        default, the key consists of the class and the keys of the children
+        of the expression, so expressions that hold other values need to
+        extend it.
+        """
+        if not self.children:
+            return None
+        keys = tuple(child.key for child in self.children)
+        if any(key is None for key in keys):
+            return None
+        return (type(self),) + keys
+
     def is_dp(self) -> bool:
         """
         Returns `True` if the value of this expression already fulfills
@@ -48,6 +183,62 @@ class Expression(abc.ABC):
 
         return Sum(self)
 
+    def optimize(self) -> "Expression":
+        """
+        Returns an equivalent expression that is cheaper to evaluate (please
+        see `dwork.language.optimizer`).
+        """
+        from .optimizer import optimize
+
+        return optimize(self)
+
+    def explain(self, analyze: bool = False) -> Any:
+        """
+        Returns the plan of the expression, which describes the columns,
+        passes over the data, type bounds and sensitivity of every node
+        (please see `dwork.language.explain`). In `analyze` mode the true
+        value of the expression is computed as well, and the plan records the
+        time and rows that every node actually took.
+        """
+        from .explain import explain
+
+        return explain(self, analyze)
+
+    def quantile(self, q: float) -> "Expression":
+        """
+        Returns a quantile of an expression, e.g. the median for `q=0.5`.
+        """
+        from .functions import Quantile
+
+        return Quantile(self, q)
+
+    def quantiles(self, q: Sequence[float]) -> "Expression":
+        """
+        Returns several quantiles of an expression, which share the privacy
+        budget and a single sort of the values.
+        """
+        from .functions import Quantile
+
+        return Quantile(self, list(q))
+
+    def median(self) -> "Expression":
+        return self.quantile(0.5)
+
+    def mean(self) -> "Expression":
+        from .functions import Mean
+
+        return Mean(self)
+
+    def variance(self) -> "Expression":
+        from .functions import Variance
+
+        return Variance(self)
+
+    def std(self) -> "Expression":
+        from .functions import StdDev
+
+        return StdDev(self)
+
     @abc.abstractmethod
     def true(self) -> Any:
         raise NotImplementedError
@@ -61,6 +252,85 @@ class Expression(abc.ABC):
         raise NotImplementedError
 
 
+def walk(expression: Expression) -> Iterator[Expression]:
+    """
+    Returns all nodes of an expression tree, visiting every node only once
+    even if it appears several times in the tree.
+    """
+    seen: Set[int] = set()
+    stack = [expression]
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        yield node
+        stack.extend(reversed(node.children))
+
+
+def postorder(
+    expression: Expression, done: Callable[[Expression], bool]
+) -> Iterator[Expression]:
+    """
+    Returns the nodes of an expression tree, children before their parents,
+    without recursion. Nodes for which `done` returns `True` are skipped
+    together with their children.
+    """
+    seen: Set[int] = set()
+    stack = [(expression, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            yield node
+            continue
+        if id(node) in seen or done(node):
+            continue
+        seen.add(id(node))
+        stack.append((node, True))
+        stack.extend((child, False) for child in reversed(node.children))
+
+
+def datasets(expression: Expression) -> List[Any]:
+    """
+    Returns all datasets (including grouped datasets) that the nodes of an
+    expression refer to.
+    """
+    found: Dict[int, Any] = {}
+    for node in walk(expression):
+        dataset = node.__dict__.get("dataset")
+        if dataset is not None:
+            found[id(dataset)] = dataset
+    return list(found.values())
+
+
+def inherited(dataset: Any, name: str) -> Any:
+    """
+    Returns an attribute of a dataset (e.g. its budget accountant), following
+    grouped datasets to the dataset they were created from.
+    """
+    while dataset is not None:
+        value = getattr(dataset, name, None)
+        if value is not None:
+            return value
+        dataset = getattr(dataset, "dataset", None)
+    return None
+
+
+def value_key(value: Any) -> Optional[Hashable]:
+    """
+    Returns the key of a value that is part of an expression (e.g. the value
+    of a constant), or `None` if the value cannot be hashed.
+    """
+    if isinstance(value, Expression):
+        return value.key
+    try:
+        hash(value)
+    except TypeError:
+        return None
+    # we include the type so that e.g. `1` and `1.0` are distinguished
+    return (type(value), value)
+
+
 def to_expression(value: Any) -> Expression:
     return Constant(value)
 
@@ -79,7 +349,7 @@ class Constant(Expression):
         # we call this to check whether we have a type for this constant
         self.type
 
-    @property
+    @cached_property
     def type(self) -> Type:
         if isinstance(self.value, int):
             from .types import Integer
@@ -92,6 +362,14 @@ class Constant(Expression):
         else:
             raise ValueError("unsupported constant type")
 
+    @cached_property
+    def static_sensitivity(self) -> Optional[Any]:
+        return 0
+
+    @cached_property
+    def key(self) -> Optional[Hashable]:
+        return value_key(self.value)
+
     def sensitivity(self) -> Any:
         return 0
 
@@ -1,8 +1,18 @@
+import abc
 from .expression import Expression
 from ..dataset import Dataset
-from ..mechanisms import geometric_noise
+from ..dataset.dataset import GroupedDataset
+from ..mechanisms import geometric_noise, exponential_mechanism
+from ..mechanisms.random import random
+from . import evaluation
 from .types import Type, Array, Integer, Float, Numeric
-from typing import Any, Optional
+from functools import cached_property
+from typing import Any, Hashable, Optional, Sequence, Tuple, Union
+import numpy as np
+import pandas as pd
+
+# the maximum number of cells of a histogram
+MAX_CELLS = 1 << 28
 
 
 class Function(Expression):
@@ -10,13 +20,22 @@ class Function(Expression):
 
 
 class Length(Function):
-    def __init__(self, dataset: Dataset):
+    def __init__(self, dataset: Union[Dataset, GroupedDataset]):
         self.dataset = dataset
 
-    @property
+    @cached_property
     def type(self) -> Type:
         return Integer(min=0)
 
+    @cached_property
+    def static_sensitivity(self) -> Optional[Any]:
+        return 1
+
+    @cached_property
+    def key(self) -> Optional[Hashable]:
+        token = getattr(self.dataset, "token", None)
+        return None if token is None else (type(self), token)
+
     def sensitivity(self, value: Optional[Any] = None) -> Any:
         return 1
 
@@ -29,6 +48,10 @@ class Sum(Function):
         self.expression = expression
 
     @property
+    def children(self) -> Tuple[Expression, ...]:
+        return (self.expression,)
+
+    @cached_property
     def type(self) -> Type:
         if not isinstance(self.expression.type, Array):
             raise ValueError("not an array")
@@ -40,20 +63,365 @@ class Sum(Function):
     def dp(self, epsilon: float) -> Any:
         if not isinstance(self.expression.type, Array):
             raise ValueError("not an array")
-        tv = self.expression.true()
         # if differential privacy was applied on the level of the expression
         # already, we just return the true value
         if self.expression.is_dp():
-            return tv
+            return self.expression.true()
         st = self.expression.type.sum()
-        return st.dp(tv.sum(), self.sensitivity(), epsilon)
+        return st.dp(self.true(), self.sensitivity(), epsilon)
 
     def true(self) -> Any:
         return self.expression.true().sum()
 
+    @cached_property
+    def static_sensitivity(self) -> Optional[Any]:
+        return self.expression.static_sensitivity
+
     def sensitivity(self, value: Optional[Any] = None) -> Any:
         """
         The sensitivity of a sum is given as the sensitivity of the expression
         that constitutes the sum.
         """
         return self.expression.sensitivity()
+
+
+def bounded(type: Type) -> bool:
+    """
+    Checks whether a type is numeric and has finite bounds.
+    """
+    if not isinstance(type, Numeric) or type.min is None or type.max is None:
+        return False
+    return bool(np.isfinite(np.array([type.min, type.max], dtype=np.float64)).all())
+
+
+def bin_count(type: Type, bins: Any = None) -> int:
+    """
+    Returns the number of bins of a histogram (see `bin_edges`) without
+    creating their edges.
+    """
+    if bins is not None and not isinstance(bins, (int, np.integer)):
+        return max(len(bins) - 1, 0)
+    if not isinstance(type, Numeric) or not bounded(type):
+        raise ValueError("bins require a bounded numeric type")
+    if bins is None:
+        if not isinstance(type, Integer):
+            raise ValueError("expected the number or the edges of the bins")
+        return int(type.max) - int(type.min) + 1
+    if bins < 1:
+        raise ValueError("expected at least one bin")
+    return int(bins)
+
+
+def bin_edges(type: Type, bins: Any = None) -> np.ndarray:
+    """
+    Returns the edges of the bins of a histogram, which only depend on the
+    type of a column (and not on its values):
+
+    - `None` creates a bin for every value of a bounded integer type.
+    - A number of bins divides the range of a bounded type into bins of equal
+      width.
+    - A sequence of increasing values is used as the edges of the bins.
+    """
+    if bins is not None and not isinstance(bins, (int, np.integer)):
+        edges = np.asarray(bins, dtype=np.float64)
+        if edges.ndim != 1 or len(edges) < 2 or (np.diff(edges) <= 0).any():
+            raise ValueError("bins must be increasing and contain two edges")
+        return edges
+    if bin_count(type, bins) > MAX_CELLS:
+        raise ValueError("too many cells")
+    assert isinstance(type, Numeric)
+    if bins is None:
+        # the bins are centered on the integer values
+        return np.arange(type.min, type.max + 2) - 0.5
+    return np.linspace(type.min, type.max, bins + 1)
+
+
+class Histogram(Function):
+
+    """
+    Counts the rows of a dataset in every cell of a grid that is spanned by
+    the bins of one or several columns (i.e. a histogram or a contingency
+    table). The cells are determined by the schema, so the result includes
+    empty cells and does not reveal which values actually occur. Adding or
+    removing a row changes a single cell by one, so noise with a sensitivity
+    of one is added to all cells at once.
+
+    :param columns: The columns that span the grid.
+    :param bins: The bins of every column (see `bin_edges`).
+    """
+
+    def __init__(self, dataset: Dataset, columns: Sequence[str], bins: Sequence[Any]):
+        if not columns or len(bins) != len(columns):
+            raise ValueError("expected the bins of every column")
+        self.dataset = dataset
+        self.columns = tuple(columns)
+        types = [dataset.type(column) for column in columns]
+        # we check the size of the grid before creating the edges of the bins
+        counts = [bin_count(type, b) for type, b in zip(types, bins)]
+        if np.prod(counts, dtype=np.float64) > MAX_CELLS:
+            raise ValueError("too many cells")
+        self.edges = tuple(bin_edges(type, b) for type, b in zip(types, bins))
+
+    @cached_property
+    def shape(self) -> Tuple[int, ...]:
+        return tuple(len(edges) - 1 for edges in self.edges)
+
+    @cached_property
+    def type(self) -> Type:
+        return Array(Integer(min=0))
+
+    @cached_property
+    def static_sensitivity(self) -> Optional[Any]:
+        return 1
+
+    @cached_property
+    def key(self) -> Optional[Hashable]:
+        token = getattr(self.dataset, "token", None)
+        if token is None:
+            return None
+        edges = tuple(tuple(e.tolist()) for e in self.edges)
+        return (type(self), token, self.columns, edges)
+
+    def sensitivity(self, value: Optional[Any] = None) -> Any:
+        return 1
+
+    def true(self) -> Any:
+        return self.dataset.bin_counts(self.columns, self.edges)
+
+    def dp(self, epsilon: float) -> Any:
+        return self.type.dp(self.true(), self.sensitivity(), epsilon)
+
+
+class Quantile(Function):
+
+    """
+    Returns one or several quantiles of an expression (e.g. the median for
+    `q=0.5`). Differentially private quantiles are sampled using the
+    exponential mechanism: the values (clamped to the bounds of their type)
+    are sorted once, and an interval between two neighboring values is
+    sampled with a probability that decreases exponentially with the distance
+    of its rank from the requested rank and is proportional to its width. The
+    result is a uniformly sampled value from that interval.
+
+    Sorting takes `O(n log n)` time and sampling a quantile `O(n)` time.
+    Several quantiles share a single sort (also across expressions within a
+    batch) and split the epsilon value evenly.
+
+    :param q: A quantile between 0 and 1, or a sequence of quantiles.
+    """
+
+    def __init__(self, expression: Expression, q: Union[float, Sequence[float]]):
+        self.expression = expression
+        self.scalar = np.ndim(q) == 0
+        self.q = tuple(float(v) for v in np.atleast_1d(q))
+        if not self.q or any(not 0 <= v <= 1 for v in self.q):
+            raise ValueError("quantiles must be between 0 and 1")
+
+    @property
+    def children(self) -> Tuple[Expression, ...]:
+        return (self.expression,)
+
+    @cached_property
+    def type(self) -> Float:
+        if not isinstance(self.expression.type, Array):
+            raise ValueError("not an array")
+        it = self.expression.type.itemtype
+        if not isinstance(it, Numeric) or not bounded(it):
+            raise ValueError("quantiles require a bounded numeric type")
+        return Float(min=it.min, max=it.max)
+
+    @cached_property
+    def key(self) -> Optional[Hashable]:
+        key = self.expression.key
+        return None if key is None else (type(self), key, self.q, self.scalar)
+
+    @cached_property
+    def static_sensitivity(self) -> Optional[Any]:
+        return 1
+
+    def sensitivity(self, value: Optional[Any] = None) -> Any:
+        """
+        Returns the sensitivity of the utility function of the exponential
+        mechanism (the rank of a value changes by at most one).
+        """
+        return 1
+
+    def sorted(self) -> np.ndarray:
+        """
+        Returns the values of the expression clamped to the bounds of their
+        type and sorted, sharing them with all other quantiles of the same
+        expression in the current evaluation.
+        """
+        context = evaluation.current()
+        key = self.expression.key
+        if context is None or key is None:
+            return self.sort()
+        return context.shared_value((Quantile, key), self.sort)
+
+    def sort(self) -> np.ndarray:
+        values = self.expression.true()
+        if getattr(values, "grouping", None) is not None:
+            raise ValueError("quantiles of grouped datasets are not supported")
+        values = np.asarray(getattr(values, "series", values), dtype=np.float64)
+        values = values[~np.isnan(values)]
+        return np.sort(np.clip(values, self.type.min, self.type.max))
+
+    def true(self) -> Any:
+        values = self.sorted()
+        if not len(values):
+            raise ValueError("cannot compute quantiles without values")
+        result = np.quantile(values, self.q)
+        return result[0] if self.scalar else result
+
+    def dp(self, epsilon: float) -> Any:
+        values = self.sorted()
+        n = len(values)
+        # the n + 1 intervals between the bounds and the sorted values
+        edges = np.concatenate([[self.type.min], values, [self.type.max]])
+        widths = np.diff(edges)
+        ranks = np.arange(n + 1)
+        utilities = -np.abs(ranks[None, :] - np.array(self.q)[:, None] * n)
+        intervals = exponential_mechanism(
+            utilities, epsilon / len(self.q), self.sensitivity(), weights=widths
+        )
+        result = edges[intervals] + random(len(self.q)) * widths[intervals]
+        return result[0] if self.scalar else result
+
+
+class Moments(Function):
+
+    """
+    Base class for statistics that are calculated from the number, the sum
+    and the sum of squares of the values of an expression. These moments are
+    computed in a single pass over the values (for all groups at once if the
+    expression belongs to a grouped dataset) and shared by all statistics of
+    the same expression within an evaluation.
+
+    Values are centered on the middle of the range of their type, so that the
+    sensitivity of their sum is half of the range and the sensitivity of the
+    sum of squares the square of that. Both only depend on the schema. For
+    differentially private statistics, every moment that a statistic requires
+    receives an equal share of the epsilon value.
+    """
+
+    # the number of moments that the statistic requires
+    moment_count = 2
+
+    def __init__(self, expression: Expression):
+        self.expression = expression
+
+    @property
+    def children(self) -> Tuple[Expression, ...]:
+        return (self.expression,)
+
+    @cached_property
+    def bounds(self) -> Numeric:
+        if not isinstance(self.expression.type, Array):
+            raise ValueError("not an array")
+        it = self.expression.type.itemtype
+        if not isinstance(it, Numeric) or not bounded(it):
+            raise ValueError("expected a bounded numeric type")
+        return it
+
+    @cached_property
+    def center(self) -> float:
+        return (self.bounds.min + self.bounds.max) / 2
+
+    @cached_property
+    def static_sensitivity(self) -> Optional[Any]:
+        """
+        Returns the sensitivity of the sum of the centered values.
+        """
+        return (self.bounds.max - self.bounds.min) / 2
+
+    def sensitivity(self, value: Optional[Any] = None) -> Any:
+        return self.static_sensitivity
+
+    def moments(self) -> Any:
+        context = evaluation.current()
+        key = self.expression.key
+        if context is None or key is None:
+            return self.compute_moments()
+        return context.shared_value((Moments, key), self.compute_moments)
+
+    def compute_moments(self) -> Any:
+        values = self.expression.true()
+        if not hasattr(values, "moments"):
+            raise ValueError("expression does not support moments")
+        return values.moments(self.center)
+
+    @abc.abstractmethod
+    def statistic(self, count: Any, total: Any, squares: Any) -> Any:
+        """
+        Calculates the statistic from the moments of the centered values.
+        """
+        raise NotImplementedError
+
+    def true(self) -> Any:
+        moments = self.moments()
+        if isinstance(moments, pd.DataFrame):
+            count, total, squares = (moments[column] for column in moments.columns)
+        else:
+            count, total, squares = moments
+        if np.any(np.asarray(count) == 0):
+            raise ValueError("cannot compute statistics without values")
+        return self.statistic(count, total, squares)
+
+    def dp(self, epsilon: float) -> Any:
+        moments = self.moments()
+        if isinstance(moments, pd.DataFrame):
+            count, total, squares = (moments[column] for column in moments.columns)
+        else:
+            count, total, squares = moments
+        epsilon /= self.moment_count
+        sensitivity = self.sensitivity()
+        count = np.maximum(Integer(min=0).dp(count, 1, epsilon), 1)
+        total = Float().dp(total, sensitivity, epsilon)
+        if self.moment_count > 2:
+            squares = Float().dp(squares, sensitivity**2, epsilon)
+        return self.statistic(count, total, squares)
+
+
+class Mean(Moments):
+
+    """
+    The mean of the values of an expression.
+    """
+
+    @cached_property
+    def type(self) -> Type:
+        return Float(min=self.bounds.min, max=self.bounds.max)
+
+    def statistic(self, count: Any, total: Any, squares: Any) -> Any:
+        return np.clip(self.center + total / count, self.bounds.min, self.bounds.max)
+
+
+class Variance(Moments):
+
+    """
+    The (population) variance of the values of an expression.
+    """
+
+    moment_count = 3
+
+    @cached_property
+    def type(self) -> Type:
+        return Float(min=0, max=self.sensitivity() ** 2)
+
+    def statistic(self, count: Any, total: Any, squares: Any) -> Any:
+        mean = total / count
+        return np.clip(squares / count - mean * mean, 0, self.sensitivity() ** 2)
+
+
+class StdDev(Variance):
+
+    """
+    The (population) standard deviation of the values of an expression.
+    """
+
+    @cached_property
+    def type(self) -> Type:
+        return Float(min=0, max=self.sensitivity())
+
+    def statistic(self, count: Any, total: Any, squares: Any) -> Any:
+        return np.sqrt(super().statistic(count, total, squares))
@@ -1,7 +1,9 @@
-from typing import Any
+from typing import Any, List, Optional, Tuple
+from functools import cached_property, reduce
 from .expression import Expression
 from ..dataset.attribute import Attribute
 from .types import Type, Numeric, Array
+import numpy as np
 
 
 def numeric(type: Type) -> Numeric:
@@ -10,32 +12,110 @@ def numeric(type: Type) -> Numeric:
     return type
 
 
+def elementwise(values: Any) -> Any:
+    """
+    Returns the given values if one of them is an array (e.g. the per-group
+    values of a grouped dataset), otherwise `None`. Integer bounds that do
+    not fit into a 64 bit integer are converted to floats for NumPy.
+    """
+    if not any(np.ndim(value) > 0 for value in values):
+        return None
+    return [
+        float(value) if isinstance(value, int) and abs(value) >= 2**63 else value
+        for value in values
+    ]
+
+
+def maximum(*values: Any) -> Any:
+    """
+    Maximum of the given values, calculated element-wise for arrays.
+    """
+    arrays = elementwise(values)
+    if arrays is None:
+        return max(values)
+    return reduce(np.maximum, arrays)
+
+
+def minimum(*values: Any) -> Any:
+    """
+    Minimum of the given values, calculated element-wise for arrays.
+    """
+    arrays = elementwise(values)
+    if arrays is None:
+        return min(values)
+    return reduce(np.minimum, arrays)
+
+
+def unbounded(sensitivity: Any, infinite: Any) -> Any:
+    """
+    Makes the sensitivity infinite where the divisor of a division can become
+    zero, calculated element-wise for arrays.
+    """
+    if not np.any(infinite):
+        return sensitivity
+    return np.where(infinite, np.inf, sensitivity)
+
+
 class BinaryExpression(Expression):
     left: Expression
     right: Expression
 
+    strict = True
+
     def __init__(self, left: Expression, right: Expression):
         if not isinstance(left.type, Numeric) or not isinstance(right.type, Numeric):
             raise ValueError("expected Numeric arguments")
         self.left = left
         self.right = right
 
+    @property
+    def children(self) -> Tuple[Expression, ...]:
+        return (self.left, self.right)
+
     def dp(self, epsilon: float) -> Any:
         if self.is_dp():
             # if DP was applied on the leven of the individual operands we
             # simply return the true value.
             return self.true()
-        return self.type.dp(self.true(), self.sensitivity(), epsilon)
+        sensitivity = self.sensitivity()
+        if np.ndim(sensitivity) == 0:
+            return self.type.dp(self.true(), sensitivity, epsilon)
+        # values with an infinite sensitivity (e.g. the mean of a group with a
+        # single row) are suppressed instead of being clamped to the bounds
+        finite = np.isfinite(sensitivity)
+        value = self.type.dp(self.true(), np.where(finite, sensitivity, 0), epsilon)
+        if finite.all():
+            return value
+        return value * np.where(finite, 1.0, np.nan)
 
     def is_dp(self) -> bool:
-        return self.left.is_dp() and self.right.is_dp()
+        # we use a stack, as chains of operations can be very deep
+        stack: List[Expression] = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, BinaryExpression):
+                stack.extend((node.right, node.left))
+            elif not node.is_dp():
+                return False
+        return True
 
 
 class TrueDiv(BinaryExpression):
-    @property
+    @cached_property
     def type(self) -> Type:
         return numeric(self.left.type) / numeric(self.right.type)
 
+    @cached_property
+    def static_sensitivity(self) -> Optional[Any]:
+        lt = numeric(self.left.type)
+        rt = numeric(self.right.type)
+        # only the sensitivity of two arrays does not depend on the data
+        if not isinstance(lt, Array) or not isinstance(rt, Array):
+            return None
+        if rt.max > 0 and rt.min < 0:
+            return None
+        return lt.absmax / rt.absmin
+
     def sensitivity(self) -> Any:
         rs = self.right.sensitivity()
         ls = self.left.sensitivity()
@@ -46,16 +126,26 @@ class TrueDiv(BinaryExpression):
         rt = numeric(self.right.type)
 
         # minimum possible left value given the current base value
-        lv_min = max(lb - ls, lt.min)
+        lv_min = maximum(lb - ls, lt.min)
         # maximum possible left value given the current base value
-        lv_max = min(lb + ls, lt.max)
+        lv_max = minimum(lb + ls, lt.max)
 
         # minimum possible right value given the current base value
-        rv_min = max(rb - rs, rt.min)
+        rv_min = maximum(rb - rs, rt.min)
         # maximum possible right value given the current base value
-        rv_max = min(rb + rs, rt.max)
-
-        if rv_max > 0 and rv_min < 0 or rt.max > 0 and rt.min < 0:
+        rv_max = minimum(rb + rs, rt.max)
+
+        # right values that can become zero make the sensitivity infinite
+        infinite = (rv_max > 0) & (rv_min < 0)
+        if not isinstance(rt, Array):
+            # this includes scalar right values that can become zero (e.g. the
+            # row count of a group with a single row)
+            infinite = infinite | (rv_min == 0) | (rv_max == 0)
+        # only the values of grouped datasets can have an infinite sensitivity,
+        # which we suppress for the affected groups (see `BinaryExpression.dp`)
+        if (rt.max > 0 and rt.min < 0) or (
+            np.any(infinite) and (isinstance(rt, Array) or np.ndim(infinite) == 0)
+        ):
             raise ValueError("infinite sensitivity")
 
         # both values are arrays
@@ -63,27 +153,42 @@ class TrueDiv(BinaryExpression):
             return lt.absmax / rt.absmin
         # left value is array, right is scalar
         if isinstance(lt, Array):
-            return lt.absmax / min(abs(rv_min), abs(rv_max))
+            with np.errstate(divide="ignore", invalid="ignore"):
+                sensitivity = lt.absmax / minimum(abs(rv_min), abs(rv_max))
+            return unbounded(sensitivity, infinite)
         # right value is array, left is scalar
         if isinstance(rt, Array):
-            return max(abs(lv_min), abs(lv_max)) / rt.absmin
+            return maximum(abs(lv_min), abs(lv_max)) / rt.absmin
         # both values are scalars
-        return max(
-            abs(lv_min / rv_min - lb / rb),
-            abs(lv_max / rv_min - lb / rb),
-            abs(lv_min / rv_max - lb / rb),
-            abs(lv_max / rv_max - lb / rb),
-        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sensitivity = maximum(
+                abs(lv_min / rv_min - lb / rb),
+                abs(lv_max / rv_min - lb / rb),
+                abs(lv_min / rv_max - lb / rb),
+                abs(lv_max / rv_max - lb / rb),
+            )
+        return unbounded(sensitivity, infinite)
 
     def true(self) -> Any:
         return self.left.true() / self.right.true()
 
 
 class FloorDiv(BinaryExpression):
-    @property
+    @cached_property
     def type(self) -> Type:
         return numeric(self.left.type) // numeric(self.right.type)
 
+    @cached_property
+    def static_sensitivity(self) -> Optional[Any]:
+        lt = numeric(self.left.type)
+        rt = numeric(self.right.type)
+        # only the sensitivity of two arrays does not depend on the data
+        if not isinstance(lt, Array) or not isinstance(rt, Array):
+            return None
+        if rt.max > 0 and rt.min < 0:
+            return None
+        return lt.absmax // rt.absmin
+
     def sensitivity(self) -> Any:
         rs = self.right.sensitivity()
         ls = self.left.sensitivity()
@@ -94,16 +199,26 @@ class FloorDiv(BinaryExpression):
         rt = numeric(self.right.type)
 
         # minimum possible left value given the current base value
-        lv_min = max(lb - ls, lt.min)
+        lv_min = maximum(lb - ls, lt.min)
         # maximum possible left value given the current base value
-        lv_max = min(lb + ls, lt.max)
+        lv_max = minimum(lb + ls, lt.max)
 
         # minimum possible right value given the current base value
-        rv_min = max(rb - rs, rt.min)
+        rv_min = maximum(rb - rs, rt.min)
         # maximum possible right value given the current base value
-        rv_max = min(rb + rs, rt.max)
-
-        if rv_max > 0 and rv_min < 0 or rt.max > 0 and rt.min < 0:
+        rv_max = minimum(rb + rs, rt.max)
+
+        # right values that can become zero make the sensitivity infinite
+        infinite = (rv_max > 0) & (rv_min < 0)
+        if not isinstance(rt, Array):
+            # this includes scalar right values that can become zero (e.g. the
+            # row count of a group with a single row)
+            infinite = infinite | (rv_min == 0) | (rv_max == 0)
+        # only the values of grouped datasets can have an infinite sensitivity,
+        # which we suppress for the affected groups (see `BinaryExpression.dp`)
+        if (rt.max > 0 and rt.min < 0) or (
+            np.any(infinite) and (isinstance(rt, Array) or np.ndim(infinite) == 0)
+        ):
             raise ValueError("infinite sensitivity")
 
         # both values are arrays
@@ -111,17 +226,21 @@ class FloorDiv(BinaryExpression):
             return lt.absmax // rt.absmin
         # left value is array, right is scalar
         if isinstance(lt, Array):
-            return lt.absmax // min(abs(rv_min), abs(rv_max))
+            with np.errstate(divide="ignore", invalid="ignore"):
+                sensitivity = lt.absmax // minimum(abs(rv_min), abs(rv_max))
+            return unbounded(sensitivity, infinite)
         # right value is array, left is scalar
         if isinstance(rt, Array):
-            return max(abs(lv_min), abs(lv_max)) // rt.absmin
+            return maximum(abs(lv_min), abs(lv_max)) // rt.absmin
         # both values are scalars
-        return max(
-            abs(lv_min // rv_min - lb // rb),
-            abs(lv_max // rv_min - lb // rb),
-            abs(lv_min // rv_max - lb // rb),
-            abs(lv_max // rv_max - lb // rb),
-        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sensitivity = maximum(
+                abs(lv_min // rv_min - lb // rb),
+                abs(lv_max // rv_min - lb // rb),
+                abs(lv_min // rv_max - lb // rb),
+                abs(lv_max // rv_max - lb // rb),
+            )
+        return unbounded(sensitivity, infinite)
 
     def true(self) -> Any:
         return self.left.true() // self.right.true()
@@ -134,12 +253,20 @@ class Add(BinaryExpression):
     expressions that return Numeric values.
     """
 
-    @property
+    @cached_property
     def type(self) -> Type:
         return numeric(self.left.type) + numeric(self.right.type)
 
+    @cached_property
+    def static_sensitivity(self) -> Optional[Any]:
+        ls = self.left.static_sensitivity
+        rs = self.right.static_sensitivity
+        if ls is None or rs is None:
+            return None
+        return maximum(ls, rs)
+
     def sensitivity(self) -> Any:
-        return max(self.left.sensitivity(), self.right.sensitivity())
+        return maximum(self.left.sensitivity(), self.right.sensitivity())
 
     def true(self) -> Any:
         return self.left.true() + self.right.true()
@@ -152,10 +279,23 @@ class Mul(BinaryExpression):
     expressions that return Numeric values.
     """
 
-    @property
+    @cached_property
     def type(self) -> Type:
         return numeric(self.left.type) * numeric(self.right.type)
 
+    @cached_property
+    def static_sensitivity(self) -> Optional[Any]:
+        # only the sensitivity of two arrays does not depend on the data
+        if not isinstance(self.left.type, Array) or not isinstance(
+            self.right.type, Array
+        ):
+            return None
+        ls = self.left.static_sensitivity
+        rs = self.right.static_sensitivity
+        if ls is None or rs is None:
+            return None
+        return ls * rs
+
     def sensitivity(self) -> Any:
         lt = numeric(self.left.type)
         rt = numeric(self.right.type)
@@ -166,27 +306,27 @@ class Mul(BinaryExpression):
         if not isinstance(lt, Array):
             lb = self.left.true()
             # minimum possible left value given the current base value
-            lv_min = min(lb + ls, lt.max)
+            lv_min = minimum(lb + ls, lt.max)
             # maximum possible left value given the current base value
-            lv_max = max(lb - ls, lt.min)
+            lv_max = maximum(lb - ls, lt.min)
         if not isinstance(self.right.type, Array):
             rb = self.right.true()
             # minimum possible right value given the current base value
-            rv_min = min(rb + rs, rt.max)
+            rv_min = minimum(rb + rs, rt.max)
             # maximum possible right value given the current base value
-            rv_max = max(rb - rs, rt.min)
+            rv_max = maximum(rb - rs, rt.min)
 
         # both values are arrays
         if isinstance(lt, Array) and isinstance(rt, Array):
             return ls * rs
         # left value is array, right is scalar
         if isinstance(lt, Array):
-            return ls * max(abs(rv_min), abs(rv_max))
+            return ls * maximum(abs(rv_min), abs(rv_max))
         # right value is array, left is scalar
         if isinstance(rt, Array):
-            return rs * max(abs(lv_min), abs(lv_max))
+            return rs * maximum(abs(lv_min), abs(lv_max))
         # both values are scalar
-        return max(
+        return maximum(
             abs(lv_min * rv_min - lb * rb),
             abs(lv_max * rv_min - lb * rb),
             abs(lv_min * rv_max - lb * rb),
@@ -204,12 +344,20 @@ class Sub(BinaryExpression):
     expressions that return Numeric values.
     """
 
-    @property
+    @cached_property
     def type(self) -> Type:
         return numeric(self.left.type) - numeric(self.right.type)
 
+    @cached_property
+    def static_sensitivity(self) -> Optional[Any]:
+        ls = self.left.static_sensitivity
+        rs = self.right.static_sensitivity
+        if ls is None or rs is None:
+            return None
+        return maximum(ls, rs)
+
     def sensitivity(self) -> Any:
-        return max(self.left.sensitivity(), self.right.sensitivity())
+        return maximum(self.left.sensitivity(), self.right.sensitivity())
 
     def true(self) -> Any:
         return self.left.true() - self.right.true()
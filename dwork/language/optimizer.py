@@ -0,0 +1,195 @@
+"""
+Rewrites expressions into equivalent expressions that are cheaper to evaluate.
+
+The optimizer performs three rewrites:
+
+- Constant folding: subexpressions that only consist of constants are
+  replaced by their value.
+- Hoisting: scalar work is moved out of column work, e.g. `(x * 2) * 3` is
+  rewritten to `x * 6`, so that the columns are only multiplied once.
+- Common subexpression elimination: structurally identical subexpressions
+  (see `Expression.key`) are replaced by a single expression, whose true
+  value is then only computed once per evaluation.
+
+Every rewritten node has the same type as the node it replaces. Rewrites that
+would change the type or the sensitivity of an expression (e.g. due to the
+bounds of intermediate types) are not applied, so the optimized expression
+has the same type and sensitivity as the original one.
+"""
+
+from functools import cached_property
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+from .expression import Constant, Expression, value_key, walk
+from .operators import Add, BinaryExpression, Mul
+from .functions import Moments, Sum
+from .types import Array, Type
+from ..dataset.attribute import Attribute
+
+# operators whose operands can be reordered and regrouped
+ASSOCIATIVE = (Add, Mul)
+
+
+def type_key(type: Type) -> Hashable:
+    """
+    Returns a key that is identical for identical types (including their
+    bounds).
+    """
+    if isinstance(type, Array):
+        return (Array, type_key(type.type))
+    return (type.__class__, getattr(type, "min", None), getattr(type, "max", None))
+
+
+class Folded(Constant):
+
+    """
+    A constant that replaces a constant subexpression and keeps its type.
+    """
+
+    def __init__(self, value: Any, type: Type):
+        self.folded_type = type
+        super().__init__(value)
+
+    @cached_property
+    def type(self) -> Type:
+        return self.folded_type
+
+    @cached_property
+    def key(self) -> Optional[Hashable]:
+        key = value_key(self.value)
+        return None if key is None else (Folded, key, type_key(self.type))
+
+
+def is_constant(expression: Expression) -> bool:
+    return isinstance(expression, Constant)
+
+
+def is_local(expression: Expression) -> bool:
+    """
+    Checks whether the sensitivity of an expression can be calculated without
+    reading any data, which is the case for arithmetic on attributes and
+    constants.
+    """
+    return all(
+        isinstance(node, (Attribute, BinaryExpression, Constant))
+        for node in walk(expression)
+    )
+
+
+class Optimizer:
+
+    """
+    Optimizes one or several expressions. Subexpressions are shared between
+    all expressions optimized by the same optimizer.
+    """
+
+    def __init__(self) -> None:
+        self.interned: Dict[Hashable, Expression] = {}
+        self.optimized: Dict[int, Tuple[Expression, Expression]] = {}
+
+    def optimize(self, expression: Expression) -> Expression:
+        entry = self.optimized.get(id(expression))
+        if entry is not None:
+            return entry[1]
+        result = self.rewrite(expression)
+        # we keep a reference to the original expression, so that its id
+        # cannot be reused
+        self.optimized[id(expression)] = (expression, result)
+        return result
+
+    def rewrite(self, node: Expression) -> Expression:
+        children = tuple(self.optimize(child) for child in node.children)
+        if any(new is not old for new, old in zip(children, node.children)):
+            rebuilt = self.rebuild(node, children)
+            if rebuilt is not None:
+                node = rebuilt
+        if isinstance(node, BinaryExpression):
+            node = self.fold(node)
+        if isinstance(node, ASSOCIATIVE):
+            node = self.hoist(node)
+        return self.intern(node)
+
+    def rebuild(
+        self, node: Expression, children: Tuple[Expression, ...]
+    ) -> Optional[Expression]:
+        """
+        Returns a copy of a node with new children, or `None` if we do not
+        know how to construct the node.
+        """
+        if isinstance(node, BinaryExpression):
+            rebuilt: Expression = type(node)(*children)
+        elif isinstance(node, (Sum, Moments)) and type(node).__init__ in (
+            Sum.__init__,
+            Moments.__init__,
+        ):
+            rebuilt = type(node)(*children)
+        else:
+            return None
+        if type_key(rebuilt.type) != type_key(node.type):
+            return None
+        return rebuilt
+
+    def fold(self, node: BinaryExpression) -> Expression:
+        if not is_constant(node.left) or not is_constant(node.right):
+            return node
+        try:
+            value = node.true()
+        except (ArithmeticError, ValueError):
+            # e.g. a division by zero, which we leave to the evaluation
+            return node
+        return Folded(value, node.type)
+
+    def hoist(self, node: Expression) -> Expression:
+        """
+        Rewrites `(x op a) op b` (in any order of the operands) to
+        `x op (a op b)` for constants `a` and `b`, if this does not change
+        the type and the sensitivity of the expression.
+        """
+        assert isinstance(node, BinaryExpression)
+        op = type(node)
+        if is_constant(node.right) and type(node.left) is op:
+            inner, b = node.left, node.right
+        elif is_constant(node.left) and type(node.right) is op:
+            inner, b = node.right, node.left
+        else:
+            return node
+        assert isinstance(inner, BinaryExpression)
+        if is_constant(inner.right):
+            x, a = inner.left, inner.right
+        elif is_constant(inner.left):
+            x, a = inner.right, inner.left
+        else:
+            return node
+        if not is_local(node):
+            return node
+        constant = self.fold(op(a, b))
+        if not is_constant(constant):
+            return node
+        for candidate in (op(x, constant), op(constant, x)):
+            if type_key(candidate.type) != type_key(node.type):
+                continue
+            if candidate.sensitivity() != node.sensitivity():
+                continue
+            return candidate
+        return node
+
+    def intern(self, node: Expression) -> Expression:
+        key = node.key
+        if key is None:
+            return node
+        return self.interned.setdefault(key, node)
+
+
+def optimize(expression: Expression) -> Expression:
+    """
+    Returns an equivalent expression that is cheaper to evaluate.
+    """
+    return Optimizer().optimize(expression)
+
+
+def optimize_all(expressions: Sequence[Expression]) -> List[Expression]:
+    """
+    Optimizes several expressions (e.g. for `Dataset.evaluate_batch`), sharing
+    identical subexpressions between them.
+    """
+    optimizer = Optimizer()
+    return [optimizer.optimize(expression) for expression in expressions]
@@ -1,5 +1,7 @@
 from ..mechanisms import laplace_noise, geometric_noise
+from ..instrumentation import instrumented, noised
 from typing import Optional, Union, Any
+import numpy as np
 import math
 import abc
 
@@ -7,6 +9,15 @@ maxint = int(2e31 - 1)
 
 
 class Type:
+    def __init_subclass__(cls, **kwargs):
+        # reports the noise that is added to values (see dwork.instrumentation),
+        # types that add noise with other types (e.g. arrays) are reported once
+        super().__init_subclass__(**kwargs)
+        if "dp" in cls.__dict__:
+            cls.dp = instrumented(  # type: ignore
+                "noise", noised, nested=False, method=True
+            )(cls.__dict__["dp"])
+
     @abc.abstractmethod
     def dp(self, value: Any, sensitivity: Any, epsilon: float) -> Any:
         raise NotImplementedError
@@ -122,7 +133,10 @@ class Array(Numeric):
         return Array(self.type * other_type)
 
     def dp(self, value: Any, sensitivity: Any, epsilon: float) -> Any:
-        raise NotImplementedError
+        """
+        Adds noise to all values of the array at once.
+        """
+        return self.type.dp(np.asarray(value), sensitivity, epsilon)
 
     def sum(self) -> Numeric:
         if not isinstance(self.type, Numeric):
@@ -192,6 +206,10 @@ class Integer(Numeric):
         return Integer()
 
     def dp(self, value: Any, sensitivity: Any, epsilon: float) -> Any:
+        if np.ndim(value) > 0:
+            # we add noise to all values at once and clamp them in one go
+            noise = geometric_noise(epsilon, symmetric=True, size=np.shape(value))
+            return np.clip(value + noise * sensitivity, self.min, self.max)
         return min(
             max(
                 value + geometric_noise(epsilon, symmetric=True) * sensitivity, self.min
@@ -264,6 +282,10 @@ class Float(Numeric):
         return Float(self.min + other.min, self.max + other.max)
 
     def dp(self, value: Any, sensitivity: Any, epsilon: float) -> Any:
+        if np.ndim(value) > 0:
+            # we add noise to all values at once and clamp them in one go
+            noise = laplace_noise(epsilon, size=np.shape(value))
+            return np.clip(value + noise * sensitivity, self.min, self.max)
         return min(
             max(value + laplace_noise(epsilon) * sensitivity, self.min), self.max
         )
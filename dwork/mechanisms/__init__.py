@@ -1,3 +1,4 @@
 from .geometric import geometric_noise
 from .laplace import laplace_noise
-from .exponential import exponential_noise
+from .exponential import exponential_noise, exponential_mechanism
+from .continual import ContinualCounter, KeyedCounter
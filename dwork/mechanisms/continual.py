@@ -0,0 +1,272 @@
+"""
+Continual release of counts and sums over a stream of events.
+
+Releasing a noisy total after every update of a stream would spend the
+privacy budget once per release. The binary tree mechanism (Chan, Shi and
+Song, "Private and Continual Release of Statistics") instead adds noise to
+partial sums over dyadic ranges of time steps. Every update belongs to at
+most `log2(T)` of these partial sums, and every total is the sum of at most
+`log2(T)` of them, so all `T` releases together are `epsilon`-differentially
+private while their error only grows polylogarithmically with `T`. Updates
+take `O(log T)` time and the mechanism only stores `O(log T)` partial sums.
+
+If the number of time steps is not known in advance, we use the hybrid
+mechanism of the same paper: the stream is split into epochs whose lengths
+are powers of two. Every epoch uses its own binary tree, and the total of
+every finished epoch is released once with additional noise.
+
+All counters work on vectors of values, so `KeyedCounter` maintains the
+counters of many keys at once with a single vectorized update per step.
+"""
+
+import numpy as np
+from typing import Any, Dict, Hashable, Iterable, Mapping, Optional
+from .geometric import geometric_noise
+from .laplace import laplace_noise
+from ..budget import BudgetAccountant
+
+
+def noise(epsilon: float, sensitivity: Any, integer: bool, size: Any) -> np.ndarray:
+    if integer:
+        return geometric_noise(epsilon, symmetric=True, size=size) * sensitivity
+    return laplace_noise(epsilon, size=size) * sensitivity
+
+
+class BinaryTree:
+
+    """
+    The binary tree mechanism for a fixed number of time steps, which releases
+    the noisy running totals of a vector of values.
+
+    :param epsilon: The privacy budget for all releases together.
+    :param horizon: The maximum number of time steps.
+    :param sensitivity: The maximum change of a value in a single time step
+      caused by a single individual.
+    :param integer: Whether the values are integers (which uses geometric
+      instead of Laplace noise).
+    """
+
+    def __init__(
+        self,
+        epsilon: float,
+        horizon: int,
+        sensitivity: Any = 1,
+        integer: bool = True,
+        size: int = 1,
+    ):
+        if horizon < 1:
+            raise ValueError("horizon must be positive")
+        self.horizon = horizon
+        self.levels = horizon.bit_length()
+        # every value is part of at most one partial sum per level
+        self.epsilon = epsilon / self.levels
+        self.sensitivity = sensitivity
+        self.integer = integer
+        self.steps = 0
+        dtype = np.int64 if integer else np.float64
+        # the true and noisy partial sums of every level of the tree
+        self.sums = np.zeros((self.levels, size), dtype=dtype)
+        self.noisy_sums = np.zeros((self.levels, size), dtype=dtype)
+        self.total = np.zeros(size, dtype=dtype)
+
+    @property
+    def size(self) -> int:
+        return self.sums.shape[1]
+
+    def resize(self, size: int) -> None:
+        """
+        Adds values (e.g. for new keys) which were zero in all previous steps.
+        """
+        added = size - self.size
+        if added <= 0:
+            return
+        shape = (self.levels, added)
+        self.sums = np.concatenate([self.sums, np.zeros(shape, self.sums.dtype)], 1)
+        # the partial sums of the new values need noise as well, otherwise
+        # their totals would reveal that they were zero so far
+        new = noise(self.epsilon, self.sensitivity, self.integer, shape)
+        self.noisy_sums = np.concatenate([self.noisy_sums, new], 1)
+        self.total = np.concatenate([self.total, np.zeros(added, self.total.dtype)])
+
+    def update(self, values: Any) -> np.ndarray:
+        """
+        Adds the values of the next time step and returns the noisy totals.
+        """
+        if self.steps >= self.horizon:
+            raise ValueError("the horizon of the mechanism is exhausted")
+        self.steps += 1
+        t = self.steps
+        # the level of the partial sum that ends at this step, which replaces
+        # the partial sums of all lower levels
+        level = (t & -t).bit_length() - 1
+        values = np.asarray(values, dtype=self.sums.dtype)
+        self.total += values
+        self.sums[level] = self.sums[:level].sum(axis=0) + values
+        self.sums[:level] = 0
+        self.noisy_sums[:level] = 0
+        self.noisy_sums[level] = self.sums[level] + noise(
+            self.epsilon, self.sensitivity, self.integer, self.size
+        )
+        # the total consists of the partial sums of the levels set in `t`
+        levels = [i for i in range(self.levels) if t >> i & 1]
+        return self.noisy_sums[levels].sum(axis=0)
+
+
+class Counter:
+
+    """
+    Releases the noisy running totals of a vector of values after every time
+    step. If the `horizon` is not known, the hybrid mechanism is used, which
+    supports an unbounded number of steps.
+    """
+
+    def __init__(
+        self,
+        epsilon: float,
+        horizon: Optional[int] = None,
+        sensitivity: Any = 1,
+        integer: bool = True,
+        size: int = 1,
+    ):
+        self.epsilon = epsilon
+        self.horizon = horizon
+        self.sensitivity = sensitivity
+        self.integer = integer
+        self.steps = 0
+        # the noisy totals of all finished epochs
+        self.epochs = 0
+        self.offset: np.ndarray = np.zeros(
+            size, dtype=np.int64 if integer else np.float64
+        )
+        self.tree = self.new_tree(size)
+
+    def new_tree(self, size: int) -> BinaryTree:
+        if self.horizon is not None:
+            return BinaryTree(
+                self.epsilon, self.horizon, self.sensitivity, self.integer, size
+            )
+        # half of the budget is used for the trees, the other half for the
+        # totals of the epochs (every value belongs to a single epoch)
+        return BinaryTree(
+            self.epsilon / 2, 1 << self.epochs, self.sensitivity, self.integer, size
+        )
+
+    @property
+    def size(self) -> int:
+        return self.tree.size
+
+    def resize(self, size: int) -> None:
+        added = size - self.size
+        if added <= 0:
+            return
+        self.tree.resize(size)
+        # the new values need noise for every finished epoch as well
+        offset = np.zeros(added, dtype=self.offset.dtype)
+        for _ in range(self.epochs):
+            offset += noise(self.epsilon / 2, self.sensitivity, self.integer, added)
+        self.offset = np.concatenate([self.offset, offset])
+
+    def step(self, values: Any) -> np.ndarray:
+        """
+        Adds the values of the next time step and returns the noisy totals.
+        """
+        totals = self.tree.update(values)
+        self.steps += 1
+        if self.horizon is not None:
+            return totals
+        if self.tree.steps == self.tree.horizon:
+            # the epoch is finished, we release its total once
+            self.offset = self.offset + self.tree.total
+            self.offset += noise(
+                self.epsilon / 2, self.sensitivity, self.integer, self.size
+            )
+            self.epochs += 1
+            self.tree = self.new_tree(self.size)
+            return self.offset.copy()
+        return self.offset + totals
+
+
+class ContinualCounter(Counter):
+
+    """
+    Releases a noisy count (or sum) after every update of a stream.
+
+    :param epsilon: The privacy budget for all releases together.
+    :param horizon: The maximum number of updates, or `None` for an unbounded
+      stream (which increases the error of the totals).
+    :param sensitivity: The maximum value of a single update that is caused
+      by a single individual.
+    :param integer: Whether the updates are integers.
+    :param accountant: The budget accountant that `epsilon` is charged to.
+
+    For example, to release the number of events every minute::
+
+        counter = ContinualCounter(epsilon=1.0)
+        for events in minutes:
+            print(counter.update(len(events)))
+    """
+
+    def __init__(
+        self,
+        epsilon: float,
+        horizon: Optional[int] = None,
+        sensitivity: Any = 1,
+        integer: bool = True,
+        accountant: Optional[BudgetAccountant] = None,
+    ):
+        if accountant is not None:
+            accountant.spend(epsilon)
+        super().__init__(epsilon, horizon, sensitivity, integer)
+
+    def update(self, value: Any = 1) -> Any:
+        """
+        Adds a value and returns the noisy total of all values so far.
+        """
+        (total,) = self.step([value])
+        return total
+
+
+class KeyedCounter(Counter):
+
+    """
+    Maintains a `ContinualCounter` for every key (e.g. for every type of
+    event). All counters are updated at once in every step, and every step
+    returns the noisy totals of all keys. Takes the same arguments as
+    `ContinualCounter`, the sensitivity refers to the values of all keys in
+    a step together (e.g. `1` if every individual causes a single event).
+
+    :param keys: The keys of the counters. Keys that are not known in
+      advance are added once they appear in an update. Be aware that this
+      reveals that the key appeared, so use a fixed set of keys if the keys
+      themselves are sensitive.
+    """
+
+    def __init__(
+        self,
+        epsilon: float,
+        horizon: Optional[int] = None,
+        sensitivity: Any = 1,
+        integer: bool = True,
+        accountant: Optional[BudgetAccountant] = None,
+        keys: Iterable[Hashable] = (),
+    ):
+        if accountant is not None:
+            accountant.spend(epsilon)
+        self.keys: Dict[Hashable, int] = {}
+        for key in keys:
+            self.keys.setdefault(key, len(self.keys))
+        super().__init__(epsilon, horizon, sensitivity, integer, len(self.keys))
+
+    def update(self, values: Mapping[Hashable, Any]) -> Dict[Hashable, Any]:
+        """
+        Adds the values of the given keys (all other keys are zero) and
+        returns the noisy totals of all keys.
+        """
+        for key in values:
+            self.keys.setdefault(key, len(self.keys))
+        self.resize(len(self.keys))
+        vector = np.zeros(self.size, dtype=self.offset.dtype)
+        for key, value in values.items():
+            vector[self.keys[key]] = value
+        totals = self.step(vector)
+        return dict(zip(self.keys, totals.tolist()))
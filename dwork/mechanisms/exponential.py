@@ -1,6 +1,47 @@
 import math
+import numpy as np
+from typing import Any, Dict, Optional, Tuple
 from .random import random
+from ..instrumentation import draws, instrumented
 
 
-def exponential_noise(epsilon):
+def candidates(args: Tuple[Any, ...], kwargs: Dict[str, Any], value: Any) -> Any:
+    # one Gumbel sample is drawn for every candidate
+    return {"noise_draws": int(np.size(kwargs.get("utilities", args[0])))}
+
+
+@instrumented("mechanism", draws, nested=False)
+def exponential_noise(epsilon: float, size: Optional[Any] = None) -> Any:
+    if size is not None:
+        return -np.log1p(-random(size)) / epsilon
     return -math.log(1 - random()) / epsilon
+
+
+@instrumented("mechanism", candidates, nested=False)
+def exponential_mechanism(
+    utilities: Any,
+    epsilon: float,
+    sensitivity: float = 1.0,
+    weights: Optional[Any] = None,
+) -> Any:
+    """
+    Samples a candidate from the exponential mechanism, i.e. with a
+    probability proportional to `weights * exp(epsilon * utilities / (2 *
+    sensitivity))`, and returns its index.
+
+    We use the Gumbel-max trick: adding Gumbel noise to the logarithms of the
+    (unnormalized) probabilities and taking the maximum samples from the same
+    distribution, without computing exponentials that could overflow. If the
+    utilities are a matrix, one candidate is sampled from every row at once.
+
+    :param weights: The base measure of every candidate (e.g. the width of an
+      interval), candidates with a weight of zero are never sampled.
+    """
+    scores = epsilon * np.asarray(utilities, dtype=np.float64) / (2 * sensitivity)
+    if weights is not None:
+        with np.errstate(divide="ignore"):
+            scores = scores + np.log(np.asarray(weights, dtype=np.float64))
+    # -log(E) follows a Gumbel distribution if E is exponentially distributed
+    with np.errstate(divide="ignore"):
+        gumbel = -np.log(exponential_noise(1.0, size=scores.shape))
+    return np.argmax(scores + gumbel, axis=-1)
@@ -1,9 +1,17 @@
 from .random import random
+from ..instrumentation import draws, instrumented
+from typing import Any, Optional
+import numpy as np
 import math
 
 
-def geometric_noise(epsilon, symmetric=True):
+@instrumented("mechanism", draws, nested=False)
+def geometric_noise(
+    epsilon: float, symmetric: bool = True, size: Optional[Any] = None
+) -> Any:
     p = math.exp(-epsilon)
+    if size is not None:
+        return _geometric_noise_array(p, symmetric, size)
     if random() > p:
         # the probability, that we return 0
         if symmetric:
@@ -20,3 +28,19 @@ def geometric_noise(epsilon, symmetric=True):
         if pv < 0.5:
             k = -k
     return int(k)
+
+
+def _geometric_noise_array(p: float, symmetric: bool, size: Any) -> Any:
+    """
+    Vectorized version of `geometric_noise` that follows exactly the same
+    steps, but draws the random numbers for all samples at once.
+    """
+    # the samples for which we do not return 0
+    nonzero = random(size) <= p
+    if symmetric:
+        nonzero |= random(size) <= 0.5
+    # 1 - pv from above, which we calculate directly to avoid rounding to 0
+    k = np.log(p * (1.0 - random(size))) / math.log(p)
+    if symmetric:
+        k[random(size) < 0.5] *= -1
+    return np.where(nonzero, np.trunc(k), 0).astype(np.int64)
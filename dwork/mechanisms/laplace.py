@@ -1,9 +1,16 @@
 import math
+import numpy as np
+from typing import Any, Optional
 from .random import random
+from ..instrumentation import draws, instrumented
 from .exponential import exponential_noise
 
 
-def laplace_noise(epsilon):
+@instrumented("mechanism", draws, nested=False)
+def laplace_noise(epsilon: float, size: Optional[Any] = None) -> Any:
+    if size is not None:
+        sign = np.where(random(size) > 0.5, 1.0, -1.0)
+        return sign * exponential_noise(epsilon, size=size)
     if random() > 0.5:
         return exponential_noise(epsilon)
     else:
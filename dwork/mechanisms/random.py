@@ -1,7 +1,20 @@
 import secrets
+import numpy as np
+from typing import Any, Optional
 
 sr = secrets.SystemRandom()
 
 
-def random():
-    return sr.random()
+def random(size: Optional[Any] = None) -> Any:
+    """
+    Returns a cryptographically secure random number from the interval
+    [0, 1). If `size` is given, returns a NumPy array of that shape instead,
+    drawing all required random bytes from the operating system at once.
+    """
+    if size is None:
+        return sr.random()
+    n = int(np.prod(size))
+    # we use the upper 53 bits of every 64 bit integer, which is what
+    # `SystemRandom.random` does as well
+    bits = np.frombuffer(secrets.token_bytes(8 * n), dtype=np.uint64) >> 11
+    return (bits * 2.0**-53).reshape(size)
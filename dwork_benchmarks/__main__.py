@@ -0,0 +1,48 @@
+import argparse
+import json
+import sys
+from .suite import BENCHMARKS, run
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Runs the Dwork benchmarks on synthetic data."
+    )
+    parser.add_argument(
+        "--rows",
+        default="1e4,1e5,1e6",
+        help="comma-separated list of row counts (default: 1e4,1e5,1e6)",
+    )
+    parser.add_argument("--columns", type=int, default=4)
+    parser.add_argument("--groups", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--benchmarks",
+        help="comma-separated list of benchmarks (default: all of {})".format(
+            ", ".join(BENCHMARKS)
+        ),
+    )
+    parser.add_argument("--output", help="JSON file for the results")
+    args = parser.parse_args()
+
+    rows = [int(float(n)) for n in args.rows.split(",")]
+    benchmarks = args.benchmarks.split(",") if args.benchmarks else None
+    results = run(
+        rows,
+        columns=args.columns,
+        groups=args.groups,
+        repeat=args.repeat,
+        seed=args.seed,
+        benchmarks=benchmarks,
+        log=lambda message: print(message, file=sys.stderr),
+    )
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Type as PyType
+from dwork.dataschema import DataSchema
+from dwork.language.types import Integer, Float, Type
+
+
+def synthetic_schema(columns: int, groups: int) -> PyType[DataSchema]:
+    """
+    Returns a schema with the given number of numeric columns, which
+    alternate between integers and floats, and a `group` column with the
+    given cardinality that can be used for grouping.
+    """
+    attributes: Dict[str, Type] = {}
+    for i in range(columns):
+        if i % 2 == 0:
+            attributes[f"c{i}"] = Integer(min=0, max=200)
+        else:
+            attributes[f"c{i}"] = Float(min=0.0, max=200.0)
+    attributes["group"] = Integer(min=0, max=groups - 1)
+    return type("SyntheticSchema", (DataSchema,), attributes)
+
+
+def generate(
+    schema: PyType[DataSchema], rows: int, seed: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    Generates a data frame with uniformly distributed values that respect the
+    types and bounds of the given schema.
+    """
+    rng = np.random.default_rng(seed)
+    data: Dict[str, np.ndarray] = {}
+    for name, type in schema.attributes.items():
+        if type.min is None or type.max is None:
+            raise ValueError(f"column {name} needs finite bounds")
+        if isinstance(type, Integer):
+            data[name] = rng.integers(type.min, type.max, size=rows, endpoint=True)
+        elif isinstance(type, Float):
+            if not np.isfinite(type.min) or not np.isfinite(type.max):
+                raise ValueError(f"column {name} needs finite bounds")
+            data[name] = rng.uniform(type.min, type.max, size=rows)
+        else:
+            raise ValueError(f"cannot generate data for column {name}")
+    return pd.DataFrame(data)
@@ -0,0 +1,168 @@
+import platform
+import statistics
+import time
+import numpy as np
+import pandas as pd
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from dwork.dataset.pandas import PandasDataset
+from dwork.mechanisms import geometric_noise, laplace_noise
+from .data import synthetic_schema, generate
+
+# privacy parameter used by all benchmarks
+EPSILON = 0.5
+
+# benchmarks receive a PandasDataset, typed as `Any` as its items are unions
+Benchmark = Callable[[Any, int], Callable[[], Any]]
+
+BENCHMARKS: Dict[str, Benchmark] = {}
+
+
+def benchmark(name: str) -> Callable[[Benchmark], Benchmark]:
+    """
+    Registers a benchmark. A benchmark receives the dataset and the number of
+    rows and returns the function that should be timed.
+    """
+
+    def register(f: Benchmark) -> Benchmark:
+        BENCHMARKS[name] = f
+        return f
+
+    return register
+
+
+@benchmark("length.dp")
+def length_dp(ds: Any, rows: int) -> Callable[[], Any]:
+    return lambda: ds.len().dp(EPSILON)
+
+
+@benchmark("sum.dp")
+def sum_dp(ds: Any, rows: int) -> Callable[[], Any]:
+    return lambda: ds["c0"].sum().dp(EPSILON)
+
+
+@benchmark("truediv.dp")
+def truediv_dp(ds: Any, rows: int) -> Callable[[], Any]:
+    return lambda: (ds["c0"].sum() / ds.len()).dp(EPSILON)
+
+
+@benchmark("arithmetic.dp")
+def arithmetic_dp(ds: Any, rows: int) -> Callable[[], Any]:
+    # even columns are integers, mixing them with floats would lose the bounds
+    column = "c2" if "c2" in ds.schema.attributes else "c0"
+    return lambda: (ds["c0"] + ds[column] * 2 - 1).sum().dp(EPSILON)
+
+
+@benchmark("filter.dp")
+def filter_dp(ds: Any, rows: int) -> Callable[[], Any]:
+    return lambda: ds[ds["c0"] > 100]["c0"].sum().dp(EPSILON)
+
+
+@benchmark("filter.compound.dp")
+def compound_filter_dp(ds: Any, rows: int) -> Callable[[], Any]:
+    def f() -> Any:
+        condition = (ds["c0"] > 50) & (ds["c0"] < 150) | (ds["group"] == 0)
+        return ds[condition].len().dp(EPSILON)
+
+    return f
+
+
+@benchmark("group_by.dp")
+def group_by_dp(ds: Any, rows: int) -> Callable[[], Any]:
+    def f() -> Any:
+        dsg = ds.group_by(by=["group"])
+        return (dsg["c0"].sum() / dsg.len()).dp(EPSILON)
+
+    return f
+
+
+@benchmark("batch.dp")
+def batch_dp(ds: Any, rows: int) -> Callable[[], Any]:
+    def f() -> Any:
+        dsf = ds[ds["c0"] > 100]
+        expressions = [ds.len(), dsf.len()]
+        for column in ds.schema.attributes:
+            expressions += [ds[column].sum(), dsf[column].sum()]
+        return ds.evaluate_batch(expressions, EPSILON)
+
+    return f
+
+
+@benchmark("noise.laplace")
+def laplace(ds: Any, rows: int) -> Callable[[], Any]:
+    return lambda: laplace_noise(EPSILON, size=rows)
+
+
+@benchmark("noise.geometric")
+def geometric(ds: Any, rows: int) -> Callable[[], Any]:
+    return lambda: geometric_noise(EPSILON, size=rows)
+
+
+def measure(f: Callable[[], Any], repeat: int) -> List[float]:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def metadata(seed: Optional[int]) -> Dict[str, Any]:
+    try:
+        from importlib.metadata import version
+
+        dwork_version: Optional[str] = version("dwork")
+    except Exception:
+        dwork_version = None
+    return {
+        "dwork": dwork_version,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "timestamp": time.time(),
+        "seed": seed,
+    }
+
+
+def run(
+    rows: Iterable[int],
+    columns: int = 4,
+    groups: int = 100,
+    repeat: int = 3,
+    seed: Optional[int] = 0,
+    benchmarks: Optional[Iterable[str]] = None,
+    log: Optional[Callable[[str], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Runs the given benchmarks (or all of them) for every number of rows and
+    returns the results in a JSON-serializable form.
+    """
+    names = list(BENCHMARKS) if benchmarks is None else list(benchmarks)
+    for name in names:
+        if name not in BENCHMARKS:
+            raise ValueError(f"unknown benchmark: {name}")
+    schema = synthetic_schema(columns, groups)
+    results = []
+    for n in rows:
+        ds = PandasDataset(schema, generate(schema, n, seed=seed))
+        for name in names:
+            f = BENCHMARKS[name](ds, n)
+            # we run every benchmark once before measuring it
+            f()
+            times = measure(f, repeat)
+            result = {
+                "benchmark": name,
+                "rows": n,
+                "columns": columns,
+                "groups": groups,
+                "repeat": repeat,
+                "times": times,
+                "min": min(times),
+                "median": statistics.median(times),
+                "rows_per_second": n / min(times) if min(times) > 0 else None,
+            }
+            results.append(result)
+            if log is not None:
+                log(f"{name:24} rows={n:<12} min={min(times):.6f}s")
+    return {"metadata": metadata(seed), "results": results}
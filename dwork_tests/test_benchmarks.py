@@ -0,0 +1,26 @@
+import json
+import unittest
+
+from dwork_benchmarks.data import synthetic_schema, generate
+from dwork_benchmarks.suite import BENCHMARKS, run
+
+class BenchmarksTest(unittest.TestCase):
+
+    def test_synthetic_data(self):
+        schema = synthetic_schema(3, 10)
+        df = generate(schema, 1000, seed=1)
+        assert list(df.columns) == ["c0", "c1", "c2", "group"]
+        for name, type in schema.attributes.items():
+            assert df[name].min() >= type.min
+            assert df[name].max() <= type.max
+        assert df["group"].nunique() == 10
+        # the same seed produces the same data
+        assert df.equals(generate(schema, 1000, seed=1))
+
+    def test_benchmark_suite(self):
+        results = run([1000], columns=3, groups=5, repeat=1)
+        assert len(results["results"]) == len(BENCHMARKS)
+        for result in results["results"]:
+            assert result["rows"] == 1000
+            assert len(result["times"]) == 1
+        json.dumps(results)
@@ -0,0 +1,74 @@
+import unittest
+import threading
+import pytest
+
+from dwork.budget import BudgetAccountant, BudgetExceeded
+from dwork.dataset.pandas import PandasDataset
+from .test_expressions import load_ds, CountingLength
+
+class BudgetTest(unittest.TestCase):
+
+    def test_sequential_composition(self):
+        ds = load_ds()
+        accountant = BudgetAccountant(1.0)
+        ds = PandasDataset(ds.schema, ds.df, accountant=accountant)
+        (ds["Weight"].sum() / ds.len()).dp(0.5)
+        # filtered datasets share the accountant of the original dataset
+        dsf = ds[ds["Age"] > 30]
+        dsf.len().dp(0.25)
+        assert accountant.spent == pytest.approx(0.75)
+        assert accountant.queries == 2
+
+        # queries that exceed the budget are refused before evaluating them
+        CountingLength.calls = 0
+        with self.assertRaises(BudgetExceeded):
+            CountingLength(dsf).dp(0.5)
+        assert CountingLength.calls == 0
+        with self.assertRaises(BudgetExceeded):
+            ds.evaluate_batch([ds.len(), dsf.len()], 0.2)
+        assert accountant.spent == pytest.approx(0.75)
+
+        # failed queries do not spend any budget
+        with self.assertRaises(KeyError):
+            ds["Unknown"].sum().dp(0.1)
+        assert accountant.remaining == pytest.approx(0.25)
+
+        # the noisy group sizes of a grouping spend budget as well
+        ds.group_by(by=["Weight"], epsilon=0.2)
+        assert accountant.spent == pytest.approx(0.95)
+        with self.assertRaises(BudgetExceeded):
+            ds.group_by(by=["Weight"], epsilon=0.2)
+        ds.group_by(by=["Weight"], treshold=None)
+
+    def test_advanced_composition(self):
+        sequential = BudgetAccountant(2.0)
+        advanced = BudgetAccountant(2.0, delta=1e-5, composition="advanced")
+        for accountant in (sequential, advanced):
+            with self.assertRaises(BudgetExceeded):
+                for _ in range(10000):
+                    accountant.spend(0.01)
+        assert sequential.queries == 200
+        assert advanced.queries > 1000
+        assert advanced.spent <= 2.0
+
+    def test_concurrent_queries(self):
+        ds = load_ds()
+        accountant = BudgetAccountant(1.0)
+        ds = PandasDataset(ds.schema, ds.df, accountant=accountant)
+        results = []
+
+        def query():
+            for _ in range(50):
+                try:
+                    results.append(ds.len().dp(0.01))
+                except BudgetExceeded:
+                    pass
+
+        threads = [threading.Thread(target=query) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(results) == 100
+        assert accountant.queries == 100
+        assert accountant.remaining == pytest.approx(0.0)
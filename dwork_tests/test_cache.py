@@ -0,0 +1,87 @@
+import unittest
+import numpy as np
+import pytest
+
+from dwork.budget import BudgetAccountant
+from dwork.cache import ResultCache, MISSING
+from dwork.dataset.pandas import PandasDataset
+from .test_expressions import load_ds, CountingLength
+
+class CacheTest(unittest.TestCase):
+
+    def test_repeated_queries(self):
+        ds = load_ds()
+        accountant = BudgetAccountant(1.0)
+        cache = ResultCache()
+        ds = PandasDataset(ds.schema, ds.df, accountant=accountant, cache=cache)
+        CountingLength.calls = 0
+        first = CountingLength(ds).dp(0.5)
+        # structurally identical queries are answered from the cache, without
+        # reading the data or spending budget
+        assert CountingLength(ds).dp(0.5) == first
+        assert CountingLength.calls == 1
+        assert accountant.spent == pytest.approx(0.5)
+        assert cache.hits == 1
+
+        # queries with another epsilon value are evaluated again
+        CountingLength(ds).dp(0.25)
+        assert CountingLength.calls == 2
+        assert accountant.spent == pytest.approx(0.75)
+
+        # identical filters yield identical views
+        a = ds[ds["Age"] > 30]["Weight"].sum() / ds[ds["Age"] > 30].len()
+        b = ds[ds["Age"] > 30]["Weight"].sum() / ds[ds["Age"] > 30].len()
+        c = ds[ds["Age"] > 31]["Weight"].sum() / ds[ds["Age"] > 31].len()
+        assert a.key == b.key
+        assert a.key != c.key
+        assert a.dp(0.1) == b.dp(0.1)
+        assert accountant.spent == pytest.approx(0.85)
+
+        # batches only evaluate the queries that are not cached
+        results = ds.evaluate_batch([ds.len(), ds.len(), a], [0.05, 0.05, 0.1])
+        assert results[0] == results[1]
+        assert accountant.spent == pytest.approx(0.9)
+
+        # changing the data invalidates all cached results
+        ds.invalidate()
+        CountingLength(ds).dp(0.05)
+        assert CountingLength.calls == 3
+        assert accountant.spent == pytest.approx(0.95)
+
+    def test_uncached_datasets(self):
+        ds = load_ds()
+        CountingLength.calls = 0
+        CountingLength(ds).dp(0.5)
+        CountingLength(ds).dp(0.5)
+        assert CountingLength.calls == 2
+
+    def test_eviction(self):
+        cache = ResultCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        assert cache.get("a") == 1
+        cache.put("c", 3)
+        assert cache.get("b") is MISSING
+        assert cache.get("a") == 1
+        assert len(cache) == 2
+
+    def test_eviction_by_size(self):
+        cache = ResultCache(maxbytes=2000)
+        cache.put("a", np.zeros(100))
+        cache.put("b", np.zeros(100))
+        cache.put("c", 3.0)
+        assert cache.nbytes == 1600
+        # the least recently used arrays are evicted to make room
+        assert cache.get("a") is not MISSING
+        cache.put("d", np.zeros(100))
+        assert cache.get("b") is MISSING
+        assert cache.get("c") == 3.0
+        assert cache.nbytes == 1600
+        # results that exceed the limit on their own are not cached
+        cache.put("e", np.zeros(1000))
+        assert cache.get("e") is MISSING
+        assert cache.get("a") is not MISSING
+        cache.put("a", 1.0)
+        assert cache.nbytes == 800
+        cache.clear()
+        assert cache.nbytes == 0
@@ -1,11 +1,76 @@
 import unittest
-from dwork.dataset.pandas import PandasDataset
+import operator
+from dwork.dataset.pandas import PandasDataset, PandasAttributeCondition
 from .test_expressions import load_ds
 
+class CountingCondition(PandasAttributeCondition):
+
+    calls = 0
+
+    def mask(self):
+        CountingCondition.calls += 1
+        return super().mask()
+
 class DatasetTest(unittest.TestCase):
 
     def test_filtering(self):
         ds = load_ds()
         dsf = ds[ds["Age"] > 30]
         assert ds.len().true() > dsf.len().true()
-        assert dsf.len().true() == 563
\ No newline at end of file
+        assert dsf.len().true() == 563
+
+    def test_chained_filtering(self):
+        ds = load_ds()
+        dsf = ds[ds["Weight"] > 80][ds["Height"] > 170]
+        dsff = dsf[dsf["Age"] > 30]
+        df = ds.df
+        expected = df[(df["Weight"] > 80) & (df["Height"] > 170)]
+
+        # filtered datasets are views that share the data frame
+        assert dsf.df is ds.df
+        assert dsf.len().true() == len(expected)
+        assert dsf["Weight"].sum().true() == expected["Weight"].sum()
+        assert dsff.len().true() == (expected["Age"] > 30).sum()
+
+        # grouping a filtered dataset only considers the matching rows
+        dsg = dsf.group_by(by=["Weight"], treshold=None)
+        assert (dsg.len().true() == expected.groupby("Weight").size()).all()
+        assert sum(len(d.df) for d in dsg.datasets) == len(expected)
+
+    def test_comparisons(self):
+        ds = load_ds()
+        df = ds.df
+        for op in ("__gt__", "__ge__", "__lt__", "__le__", "__eq__", "__ne__"):
+            dsf = ds[getattr(ds["Age"], op)(38)]
+            assert dsf.len().true() == getattr(df["Age"], op)(38).sum()
+        # attributes can be compared with each other as well
+        assert ds[ds["Height"] > ds["Weight"]].len().true() == (df["Height"] > df["Weight"]).sum()
+
+    def test_compound_conditions(self):
+        ds = load_ds()
+        df = ds.df
+        age = ds["Age"] > 30
+        condition = age & (ds["Weight"] >= 80) & ~(ds["Height"] == 170) | (ds["Age"] < 25)
+        expected = (df["Age"] > 30) & (df["Weight"] >= 80) & ~(df["Height"] == 170) | (df["Age"] < 25)
+        assert ds[condition].len().true() == expected.sum()
+
+        # conjunctions are flattened into a single condition
+        assert len((age & (ds["Weight"] > 1) & (ds["Height"] > 1)).conditions) == 3
+
+        # negations only include rows of the dataset the condition refers to
+        dsf = ds[age]
+        assert ds[~(dsf["Weight"] > 80)].len().true() == ((df["Age"] > 30) & ~(df["Weight"] > 80)).sum()
+
+        # conditions cannot be combined using `and` or `or`
+        with self.assertRaises(ValueError):
+            age and age
+
+    def test_shared_conditions(self):
+        ds = load_ds()
+        a = CountingCondition(ds["Age"], operator.gt, 30)
+        b = CountingCondition(ds["Age"], operator.gt, 30)
+        c = CountingCondition(ds["Weight"], operator.gt, 80)
+        CountingCondition.calls = 0
+        ds[(a & c) | (b & ~c)]
+        # identical conditions are only evaluated once
+        assert CountingCondition.calls == 2
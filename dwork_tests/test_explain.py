@@ -0,0 +1,97 @@
+import json
+import unittest
+
+from dwork.budget import BudgetAccountant
+from dwork.dataset.pandas import PandasDataset
+from .test_expressions import load_ds
+from .test_streaming import load_streaming_ds
+
+class ExplainTest(unittest.TestCase):
+
+    def test_plan(self):
+        ds = load_ds()
+        rows = len(ds.df)
+        filtered = ds[(ds["Height"] > 170) & (ds["Weight"] < 100)]
+        x = (filtered["Weight"] * 2).sum() / ds.len()
+        plan = x.explain()
+        div = plan.root
+        assert div.operation == "TrueDiv"
+        total, length = div.children
+        assert total.description == "sum((Weight * 2))"
+        assert total.passes == 1 and total.rows == rows
+        assert total.columns == ["Weight"]
+        assert total.filters == ["(Height > 170) & (Weight < 100)"]
+        # the weights and the mask of the filter are read
+        assert total.bytes == rows * (ds.df["Weight"].dtype.itemsize + 1)
+        # the length of an unfiltered dataset needs no pass over the data
+        assert length.passes == 0 and length.sensitivity == 1
+        weight = total.children[0].children[0]
+        assert weight.bounds == [0, 200] and weight.sensitivity == 200
+        assert plan.passes == 1 and plan.columns == ["Weight"]
+        # plans are plain data
+        assert json.loads(json.dumps(plan.to_dict()))["passes"] == 1
+        assert "filters=(Height > 170) & (Weight < 100)" in str(plan)
+
+        # plans of expressions that are deeper than the recursion limit
+        y = ds["Weight"]
+        for i in range(1200):
+            y = y + ds["Height"] * 2
+        plan = y.sum().explain()
+        assert plan.root.sensitivity == 400
+        assert len(plan.to_dict()["plan"]["children"]) == 1
+        assert len(str(plan).splitlines()) == 4802
+
+    def test_shared_nodes(self):
+        ds = load_ds()
+        total = ds["Height"].sum()
+        plan = (total / total).explain()
+        first, second = plan.root.children
+        assert not first.shared and second.shared
+        assert plan.passes == 1
+
+    def test_analyze(self):
+        accountant = BudgetAccountant(1.0)
+        ds = load_ds()
+        ds = PandasDataset(ds.schema, ds.df, accountant=accountant)
+        filtered = ds[ds["Height"] > 170]
+        x = (filtered["Weight"] * 2).sum() / filtered.len()
+        assert x.explain().root.sensitivity is None
+        # the sensitivity of arithmetic on attributes is known without data
+        total = x.explain().root.children[0]
+        assert total.sensitivity == 400
+        assert total.children[0].sensitivity == 400
+        plan = x.explain(analyze=True)
+        assert plan.time >= plan.precompute_time > 0
+        total, length = plan.root.children
+        # only the rows that the filter selects are processed
+        selected = (ds.df["Height"] > 170).sum()
+        assert total.time > 0 and total.rows_processed == selected
+        assert not total.precomputed
+        # the length is computed in a single pass with other aggregates
+        assert length.precomputed and length.rows_processed == selected
+        assert total.children[0].rows_processed == 0
+        # the data-dependent sensitivity is computed from the true values
+        assert plan.root.sensitivity == x.sensitivity()
+        assert accountant.queries == 0
+
+    def test_grouped_and_streaming(self):
+        ds = load_ds()
+        grouped = ds.group_by(by="Weight", treshold=None)
+        node = grouped["Height"].mean().explain().root
+        assert node.grouping == "Weight" and node.passes == 1
+        assert grouped.len().explain().root.passes == 1
+
+        streaming = load_streaming_ds()
+        plan = streaming[streaming["Height"] > 170]["Weight"].sum().explain()
+        assert plan.root.passes == 1 and plan.root.rows is None
+        assert plan.root.filters == ["Height > 170"]
+        assert plan.rows is None
+        product = streaming["Weight"] - streaming["Height"] * 2
+        assert product.explain().root.sensitivity == 400
+
+        # the rows of streaming datasets are counted while they are scanned
+        plan = streaming[streaming["Height"] > 170]["Weight"].mean().explain(analyze=True)
+        assert plan.root.rows_processed == (ds.df["Height"] > 170).sum()
+        assert streaming.len().explain(analyze=True).root.rows_processed == len(ds.df)
+        plan = grouped["Height"].sum().explain(analyze=True)
+        assert plan.root.rows_processed == len(ds.df)
@@ -1,8 +1,10 @@
 import unittest
 import pandas as pd
+import numpy as np
 import os
 
-from dwork.dataset.pandas import PandasDataset
+from dwork.dataset import fused
+from dwork.dataset.pandas import PandasDataset, PandasLength
 from dwork.dataschema import DataSchema
 from dwork.language.expression import to_expression as te
 from dwork.language.types import Integer, Float
@@ -15,6 +17,14 @@ class AbsenteeismSchema(DataSchema):
     Weight = Integer(min=0, max=200)
     Height = Integer(min=0, max=200)
 
+class CountingLength(PandasLength):
+
+    calls = 0
+
+    def true(self):
+        CountingLength.calls += 1
+        return len(self.dataset.df)
+
 def load_ds():
     filename = f"{datasets_path}/absenteeism_at_work.csv"
     df = pd.read_csv(filename, sep=";")
@@ -111,4 +121,161 @@ class ExpressionsTest(unittest.TestCase):
 
         # we check that the DP mechanism does not always produce the same value
         # (this is not a proper DP test)
-        assert len(uniques) >= 3
\ No newline at end of file
+        assert len(uniques) >= 3
+
+    def test_memoization(self):
+        ds = load_ds()
+        n = CountingLength(ds)
+        x = ds["Weight"].sum()/n + n
+        CountingLength.calls = 0
+
+        # the length appears twice in the tree and is required by the
+        # sensitivity calculation as well, but it should be computed once
+        assert 60 <= x.dp(0.5) <= 1000
+        assert CountingLength.calls == 1
+
+        # every new evaluation recomputes the value
+        assert x.true() == ds.df["Weight"].sum()/len(ds.df) + len(ds.df)
+        assert CountingLength.calls == 2
+
+    def test_fused_evaluation(self):
+        ds = load_ds()
+        df = ds.df
+        dsf = ds[ds["Age"] > 30]
+        dff = df[df["Age"] > 30]
+        expressions = [
+            (
+                (te(1.0)+ds["Weight"]-te(2.0)*ds["Height"]).sum(),
+                (1.0+df["Weight"]-2.0*df["Height"]).sum(),
+            ),
+            ((te(300)-ds["Weight"]).sum(), (300-df["Weight"]).sum()),
+            ((ds["Weight"]//te(3)).sum(), (df["Weight"]//3).sum()),
+            ((te(1.0)/dsf["Weight"]).sum(), (1.0/dff["Weight"]).sum()),
+        ]
+        # constants that numexpr cannot express are evaluated with NumPy
+        infinite = [
+            ((ds["Weight"]*te(float("inf"))).sum(), float("inf")),
+            ((ds["Weight"]-te(float("-inf"))).sum(), float("inf")),
+        ]
+        numexpr = fused.numexpr
+        chunk_size = fused.CHUNK_SIZE
+        try:
+            # we evaluate the expressions in small chunks, with and without numexpr
+            fused.CHUNK_SIZE = 100
+            for module in (numexpr, None):
+                fused.numexpr = module
+                for x, tx in expressions:
+                    assert abs(x.true() - tx) < 1e-9
+                for x, tx in infinite:
+                    assert x.true() == tx
+        finally:
+            fused.numexpr = numexpr
+            fused.CHUNK_SIZE = chunk_size
+
+    def test_fused_division_by_zero(self):
+        df = pd.DataFrame({"Weight": [1, 2, 3, 0, 4], "Height": [1, 0, 2, 0, 0]})
+        ds = PandasDataset(AbsenteeismSchema, df)
+        numexpr = fused.numexpr
+        try:
+            # divisions by zero yield the same values as with pandas
+            for module in (numexpr, None):
+                fused.numexpr = module
+                for x, tx in (
+                    (ds["Weight"] // ds["Height"], df["Weight"] // df["Height"]),
+                    (ds["Weight"] / ds["Height"], df["Weight"] / df["Height"]),
+                    (ds["Weight"] // te(0), df["Weight"] // 0),
+                ):
+                    values = np.concatenate([v for _, v in fused.chunks(x.true(), len(df))])
+                    assert np.array_equal(values, tx.to_numpy(), equal_nan=True)
+                    assert x.sum().true() == tx.sum() == float("inf")
+                assert (ds["Height"] // ds["Height"]).sum().true() == 2
+        finally:
+            fused.numexpr = numexpr
+
+    def test_batch_evaluation(self):
+        ds = load_ds()
+        df = ds.df
+        dsf = ds[ds["Age"] > 30]
+        n = CountingLength(dsf)
+        expressions = [
+            ds["Weight"].sum(),
+            ds["Height"].sum()/ds.len(),
+            dsf["Weight"].sum()/n,
+            n,
+        ]
+        CountingLength.calls = 0
+        results = ds.evaluate_batch(expressions, epsilons=[0.5, 0.5, 0.5, 1.0])
+        assert len(results) == 4
+        assert 55000 <= results[0] <= 62000
+        assert 150 <= results[1] <= 190
+        assert 60 <= results[2] <= 100
+        assert 500 <= results[3] <= 620
+        # the row count was computed together with the sums
+        assert CountingLength.calls == 0
+
+        # the precomputed values match the values computed by the expressions
+        from dwork.language.evaluation import evaluation
+        with evaluation():
+            ds.precompute(expressions)
+            assert expressions[0].true() == df["Weight"].sum()
+            assert expressions[2].true() == df[df["Age"] > 30]["Weight"].sum()/(df["Age"] > 30).sum()
+            assert n.true() == (df["Age"] > 30).sum()
+
+        # a single epsilon can be used for all expressions
+        assert len(ds.evaluate_batch(expressions, 0.5)) == 4
+        with self.assertRaises(ValueError):
+            ds.evaluate_batch(expressions, [0.5])
+
+    def test_batch_non_finite_values(self):
+        # values in rows that a filter excludes do not affect batched sums
+        df = pd.DataFrame({"Weight": [1.0, 2.0, np.inf, 4.0, np.nan], "Height": [1, 2, 3, 4, 5]})
+        ds = PandasDataset(AbsenteeismSchema, df)
+        expressions = [
+            ds[ds["Height"] < 3]["Weight"].sum(),
+            ds[ds["Height"] != 3]["Weight"].sum(),
+            ds["Weight"].sum(),
+        ]
+        expected = [e.true() for e in expressions]
+        assert expected == [3.0, 7.0, np.inf]
+        from dwork.language.evaluation import evaluation
+        with evaluation():
+            ds.precompute(expressions)
+            assert [e.true() for e in expressions] == expected
+
+    def test_static_analysis(self):
+        ds = load_ds()
+        df = ds.df
+        # the expression is deeper than the recursion limit
+        x = ds["Weight"]
+        for i in range(1200):
+            x = x + ds["Height"]
+        s = x.sum()
+
+        # types and static sensitivities are computed once and cached
+        assert s.type is s.type
+        assert s.static_sensitivity == 200
+        assert s.true() == df["Weight"].sum() + 1200*df["Height"].sum()
+        assert s.dp(0.5) > 0
+
+        # data-dependent sensitivities of deep expressions can be computed
+        y = ds["Weight"]
+        for i in range(1200):
+            y = y + ds["Height"] * 2
+        assert y.static_sensitivity is None
+        assert y.sum().sensitivity() == 400
+        assert y.sum().true() == df["Weight"].sum() + 2400*df["Height"].sum()
+
+        # static sensitivities do not require evaluating the expression
+        n = CountingLength(ds)
+        CountingLength.calls = 0
+        assert (ds["Weight"].sum() + n).sensitivity() == 200
+        assert CountingLength.calls == 0
+
+        # data-dependent sensitivities are still computed from the data
+        assert (ds["Weight"].sum() / n).static_sensitivity is None
+        assert (ds["Weight"].sum() / n).sensitivity() > 0
+        assert CountingLength.calls == 1
+
+        # expressions cannot be modified after their construction
+        with self.assertRaises(AttributeError):
+            s.expression = x
@@ -1,5 +1,8 @@
 import unittest
+import pandas as pd
+import numpy as np
 
+from dwork.dataset.pandas import PandasDataset
 from .test_expressions import load_ds
 
 class GroupByTest(unittest.TestCase):
@@ -20,4 +23,71 @@ class GroupByTest(unittest.TestCase):
             # grouped by weight.
             results = mean_heights.dp(0.5)
             print("True:", ds["Height"].sum().true()/ds.len().true())
-            print("DP:", results)
\ No newline at end of file
+            print("DP:", results)
+
+    def test_vectorized_group_by(self):
+        ds = load_ds()
+        # we disable the treshold to compare the results with all groups
+        dsg = ds.group_by(by=["Weight"], treshold=None)
+
+        # expressions on grouped datasets are evaluated for all groups at once
+        # and return a series that is indexed by the group keys
+        mean_heights = dsg["Height"].sum()/dsg.len()
+
+        true_means = ds.df.groupby("Weight")["Height"].mean()
+        tv = mean_heights.true()
+        assert list(tv.index) == list(true_means.index)
+        assert (tv == true_means).all()
+        assert (dsg.len().true() == ds.df.groupby("Weight").size()).all()
+
+        results = mean_heights.dp(0.5)
+        assert list(results.index) == list(true_means.index)
+        # we check that the DP mechanism does not always produce the true value
+        # (this is not a proper DP test)
+        assert (results != tv).any()
+
+    def test_group_treshold(self):
+        ds = load_ds()
+        sizes = ds.df.groupby("Weight").size()
+
+        dsg = ds.group_by(by=["Weight"], treshold=10, epsilon=0.3)
+        assert len(dsg.groups) + dsg.suppressed_groups == len(sizes)
+        assert len(dsg.datasets) == len(dsg.groups)
+        assert len(dsg.len().true()) == len(dsg.groups)
+
+        dsg = ds.group_by(by=["Weight"], treshold=len(ds.df)*10)
+        assert dsg.groups == []
+        assert dsg.suppressed_groups == len(sizes)
+        assert len(dsg["Height"].sum().true()) == 0
+
+    def test_single_row_groups(self):
+        # the mean of a group with a single row has an infinite sensitivity,
+        # such groups have no DP value whereas filtered datasets raise
+        ds = load_ds()
+        row = pd.DataFrame({"Weight": [199], "Height": [150]})
+        ds = PandasDataset(ds.schema, pd.concat([ds.df, row], ignore_index=True))
+        dsg = ds.group_by(by=["Weight"], treshold=None)
+        results = (dsg["Height"].sum() / dsg.len()).dp(0.5)
+        assert list(results.index) == list(dsg.keys)
+        assert np.isnan(results[199])
+        assert not results.drop(199).isna().any()
+        filtered = ds[ds["Weight"] == 199]
+        with self.assertRaises(ValueError):
+            (filtered["Height"].sum() / filtered.len()).dp(0.5)
+
+    def test_surviving_single_row_group(self):
+        # with a noisy treshold, a group with a single row survives with a
+        # probability of a few percent
+        ds = load_ds()
+        row = pd.DataFrame({"Weight": [199], "Height": [150]})
+        ds = PandasDataset(ds.schema, pd.concat([ds.df, row], ignore_index=True))
+        for _ in range(1000):
+            dsg = ds.group_by(by=["Weight"], treshold=10, epsilon=0.3)
+            if 199 in dsg.groups:
+                break
+        else:
+            self.fail("the single row group was never kept")
+        results = (dsg["Height"].sum() / dsg.len()).dp(0.5)
+        assert len(results) == len(dsg.groups)
+        assert np.isnan(results[199])
+        assert results.notna().sum() == len(dsg.groups) - 1
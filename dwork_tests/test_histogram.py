@@ -0,0 +1,81 @@
+import time
+import unittest
+import numpy as np
+import pandas as pd
+
+from dwork.dataschema import DataSchema
+from dwork.dataset.pandas import PandasDataset
+from dwork.dataset.streaming import StreamingDataset
+from dwork.language.types import Integer, Float
+from .test_expressions import load_ds
+
+class GridSchema(DataSchema):
+    a = Integer(min=0, max=999)
+    b = Integer(min=0, max=999)
+    x = Float(min=0.0, max=1.0)
+
+class WideSchema(DataSchema):
+    a = Integer(min=0, max=10**12)
+
+class HistogramTest(unittest.TestCase):
+
+    def test_histogram(self):
+        ds = load_ds()
+        h = ds.histogram("Height")
+        assert h.true().shape == (201,)
+        counts = ds.df["Height"].value_counts()
+        assert (h.true()[counts.index] == counts.to_numpy()).all()
+        assert h.true().sum() == len(ds.df)
+
+        h = ds.histogram("Weight", bins=4)
+        expected, _ = np.histogram(ds.df["Weight"], bins=4, range=(0, 200))
+        assert (h.true() == expected).all()
+        h = ds.histogram("Weight", bins=[50, 70, 90, 200])
+        expected, _ = np.histogram(ds.df["Weight"], bins=[50, 70, 90, 200])
+        assert (h.true() == expected).all()
+        assert h.dp(0.5).shape == (3,)
+
+        dsf = ds[ds["Height"] > 170]
+        h = dsf.histogram("Height")
+        assert h.true().sum() == (ds.df["Height"] > 170).sum()
+        assert (h.true()[:171] == 0).all()
+
+        with self.assertRaises(ValueError):
+            ds.histogram("Weight", bins=[1])
+
+        # the size of the grid is checked before creating the bins
+        wide = PandasDataset(WideSchema, pd.DataFrame({"a": [0, 1]}))
+        with self.assertRaises(ValueError):
+            wide.histogram("a")
+        with self.assertRaises(ValueError):
+            wide.histogram("a", bins=10**12)
+
+    def test_crosstab(self):
+        ds = load_ds()
+        ct = ds.crosstab(["Weight", "Height"], bins=[10, None])
+        assert ct.true().shape == (10, 201)
+        assert ct.true().sum() == len(ds.df)
+        assert (ct.true().sum(axis=0) == ds.histogram("Height").true()).all()
+        result = ct.dp(1.0)
+        assert result.shape == (10, 201)
+        assert (result >= 0).all()
+
+        chunks = lambda: (ds.df[i : i + 100] for i in range(0, len(ds.df), 100))
+        sds = StreamingDataset(ds.schema, chunks)
+        assert (sds.crosstab(["Weight", "Height"], bins=[10, None]).true() == ct.true()).all()
+
+    def test_large_crosstab(self):
+        rows = 1_000_000
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({
+            "a": rng.integers(0, 1000, rows),
+            "b": rng.integers(0, 1000, rows),
+            "x": rng.random(rows),
+        })
+        ds = PandasDataset(GridSchema, df)
+        start = time.perf_counter()
+        result = ds.crosstab(["a", "b"]).dp(0.5)
+        # this takes well below a second on a typical machine
+        assert time.perf_counter() - start < 5
+        assert result.shape == (1000, 1000)
+        assert ds.histogram("x", bins=10).true().sum() == rows
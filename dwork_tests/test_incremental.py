@@ -0,0 +1,81 @@
+import unittest
+import pytest
+
+from dwork.cache import ResultCache
+from dwork.dataset.incremental import IncrementalDataset, GroupedIncrementalDataset
+from dwork.language import evaluation
+from .test_expressions import load_ds
+
+class IncrementalTest(unittest.TestCase):
+
+    def test_running_totals(self):
+        ds = load_ds()
+        df = ds.df
+        inc = IncrementalDataset(
+            ds.schema, df[:300], groupings=["Weight"], cache=ResultCache()
+        )
+        first = inc.len().dp(0.5)
+        for start in range(300, len(df), 200):
+            inc.append(df[start : start + 200])
+        # the totals are updated with every append
+        assert inc.rows == len(df)
+        assert inc.sums["Weight"] == df["Weight"].sum()
+        assert inc.len().true() == len(df)
+        assert inc["Weight"].sum().true() == df["Weight"].sum()
+        # appends invalidate cached results
+        assert inc.len().dp(0.5) != first
+        # batches use the totals as well
+        total = inc["Height"].sum()
+        with evaluation.evaluation():
+            inc.precompute([total])
+            assert total.true() == df["Height"].sum()
+
+        grouped = inc.group_by(by=["Weight"], treshold=None)
+        assert isinstance(grouped, GroupedIncrementalDataset)
+        expected = df.groupby("Weight")["Height"].sum()
+        assert (grouped["Height"].sum().true() == expected).all()
+        assert (grouped.len().true() == df.groupby("Weight").size()).all()
+        assert inc.totals[("Weight",)]["Height"].equals(expected)
+
+        # expressions that are not known from the totals read the data
+        filtered = inc[inc["Height"] > 170]
+        assert filtered.len().true() == (df["Height"] > 170).sum()
+        assert (inc["Height"] * 2).sum().true() == df["Height"].sum() * 2
+        assert (grouped["Height"] * 2).sum().true().equals(expected * 2)
+
+        # groupings and snapshots reflect the rows at the time they were created
+        snapshot = inc.snapshot()
+        inc.append(df[:10])
+        assert snapshot.len().true() == len(df)
+        assert snapshot["Weight"].sum().true() == df["Weight"].sum()
+        assert grouped.len().true().sum() == len(df)
+        assert inc.len().true() == len(df) + 10
+        assert filtered.len().true() == (df["Height"] > 170).sum()
+
+    def test_cached_snapshots_and_views(self):
+        # snapshots and views hold other rows than the dataset after an
+        # append, so they must not share cached results with it
+        ds = load_ds()
+        df = ds.df
+        inc = IncrementalDataset(ds.schema, df[:300], cache=ResultCache())
+        snapshot = inc.snapshot()
+        old = inc[inc["Height"] > 170]
+        old_rows = (df[:300]["Height"] > 170).sum()
+        inc.append(df[300:])
+        assert abs(snapshot.len().dp(1.0) - 300) < 100
+        assert abs(inc.len().dp(1.0) - len(df)) < 100
+        assert abs(old.len().dp(1.0) - old_rows) < 100
+        new = inc[inc["Height"] > 170]
+        assert abs(new.len().dp(1.0) - (df["Height"] > 170).sum()) < 100
+        # identical views on the same rows still share results
+        assert inc[inc["Height"] > 170].len().dp(1.0) == new.len().dp(1.0)
+        assert snapshot.len().dp(1.0) == snapshot.len().dp(1.0)
+
+    def test_append_errors(self):
+        ds = load_ds()
+        inc = IncrementalDataset(ds.schema, ds.df)
+        with self.assertRaises(ValueError):
+            inc.append(ds.df[["Height"]])
+        with self.assertRaises(ValueError):
+            IncrementalDataset(ds.schema, ds.df, groupings=["Unknown"])
+        assert inc["Height"].sum().true() == pytest.approx(ds.df["Height"].sum())
@@ -0,0 +1,59 @@
+import unittest
+import numpy as np
+import pandas as pd
+
+from dwork.dataset.pandas import PandasDataset
+from dwork.dataset.ingest import ingest
+from dwork.dataschema import DataSchema
+from dwork.language.types import Integer, Float
+from .test_expressions import load_ds
+
+class BoundedSchema(DataSchema):
+    x = Integer(min=0, max=200)
+    y = Integer(min=-1000, max=1000)
+    z = Float(min=0.0, max=1.0)
+
+class IngestTest(unittest.TestCase):
+
+    def test_compact_dtypes(self):
+        ds = load_ds()
+        cds = PandasDataset.ingest(ds.schema, ds.df)
+        assert cds.df["Weight"].dtype == np.uint8
+        assert cds.df["Height"].dtype == np.uint8
+        # columns that are not part of the schema are not modified
+        assert cds.df["Age"].dtype == ds.df["Age"].dtype
+
+        # arithmetic on compact columns does not overflow
+        values, compact_values = [
+            [
+                (d["Weight"] * 200 + d["Height"] * d["Height"]).sum().true(),
+                d[d["Age"] > 30]["Height"].sum().true(),
+                (d["Height"].sum() / d.len()).true(),
+            ]
+            for d in (ds, cds)
+        ]
+        assert compact_values == values
+        dsg = cds.group_by(by=["Age"], treshold=None)
+        assert (dsg["Weight"].sum().true() == ds.df.groupby("Age")["Weight"].sum()).all()
+
+    def test_bounds(self):
+        df = pd.DataFrame({"x": [-5, 10, 300], "y": [-2000, 0, 5], "z": [0.5, 1.5, np.nan], "other": ["a", "b", "c"]})
+        idf = ingest(BoundedSchema, df)
+        assert idf["x"].tolist() == [0, 10, 200]
+        assert idf["x"].dtype == np.uint8
+        assert idf["y"].tolist() == [-1000, 0, 5]
+        assert idf["y"].dtype == np.int16
+        assert idf["z"].tolist()[:2] == [0.5, 1.0]
+        assert np.isnan(idf["z"][2])
+        assert idf["other"].tolist() == ["a", "b", "c"]
+
+        with self.assertRaises(ValueError):
+            ingest(BoundedSchema, df, bounds="reject")
+        ingest(BoundedSchema, df[["x", "y"]][1:2], bounds="reject")
+
+        # integer columns with missing values are kept as floats
+        idf = ingest(BoundedSchema, pd.DataFrame({"x": [1.0, np.nan, 2.4]}))
+        assert idf["x"].dtype == np.float64
+        assert idf["x"][2] == 2.0
+        with self.assertRaises(ValueError):
+            ingest(BoundedSchema, pd.DataFrame({"x": [1.5]}), bounds="reject")
@@ -0,0 +1,95 @@
+import json
+import unittest
+import numpy as np
+
+from dwork.instrumentation import Collector, MetricsCollector, collecting
+from dwork.mechanisms import laplace_noise
+from dwork import instrumentation
+from dwork.language.types import Array, Integer
+from .test_expressions import load_ds
+from .test_streaming import load_streaming_ds
+
+class Recorder(Collector):
+
+    def __init__(self):
+        self.events = []
+
+    def pre(self, event, target):
+        self.events.append(("pre", event))
+
+    def post(self, event, target, duration, metrics):
+        assert duration >= 0
+        self.events.append(("post", event, metrics))
+
+class InstrumentationTest(unittest.TestCase):
+
+    def test_hooks(self):
+        ds = load_ds()
+        recorder = Recorder()
+        with collecting(recorder):
+            ds["Weight"].sum().true()
+            laplace_noise(1.0, size=10)
+        assert instrumentation.collectors == ()
+        assert recorder.events[0] == ("pre", "true")
+        posts = [e for e in recorder.events if e[0] == "post"]
+        assert len(posts) * 2 == len(recorder.events)
+        # the sum scans the weights of all rows
+        metrics = posts[-2][2]
+        assert metrics == {"rows_scanned": len(ds.df)}
+        # the exponential noise drawn by the Laplace mechanism is not reported
+        assert posts[-1] == ("post", "mechanism", {"noise_draws": 10})
+        # nothing is reported without collectors
+        ds["Weight"].sum().true()
+        assert len(recorder.events) == 6
+
+    def test_metrics(self):
+        ds = load_ds()
+        collector = MetricsCollector()
+        with collecting(collector):
+            filtered = ds[ds["Height"] > 170]
+            (filtered["Weight"].sum() / filtered.len()).dp(0.5)
+            ds.evaluate_batch([ds["Height"].sum(), ds["Height"].median()], 0.25)
+        counters = {
+            (c["metric"], c["event"], c["target"]): c["value"]
+            for c in collector.to_dict()["counters"]
+        }
+        assert counters["epsilon", "query", ""] == 1.0
+        assert counters["queries", "query", ""] == 3
+        assert counters["noise_draws", "mechanism", "exponential_mechanism"] > 0
+        # only the rows that the filter selects are summed up
+        selected = (ds.df["Height"] > 170).sum()
+        assert counters["rows_scanned", "true", "Sum"] == selected
+        assert counters["rows_scanned", "precompute", ""] == len(ds.df)
+        # the mask of the filter is materialized
+        mask = counters["bytes_materialized", "true", "PandasAttributeCondition"]
+        assert mask == len(ds.df)
+
+        data = json.loads(collector.to_json())
+        timings = {(t["event"], t["target"]): t for t in data["timings"]}
+        assert timings["dp", "TrueDiv"]["count"] == 1
+        assert timings["precompute", ""]["count"] == 1
+        assert list(timings["dp", "Sum"]["buckets"].values())[-1] == 1
+
+        text = collector.to_prometheus()
+        assert "# TYPE dwork_duration_seconds histogram" in text
+        assert 'dwork_duration_seconds_count{event="dp",target="TrueDiv"} 1' in text
+        assert 'dwork_epsilon_total{event="query",target=""} 1.0' in text
+        assert 'le="+Inf"' in text
+        collector.reset()
+        assert collector.to_dict() == {"timings": [], "counters": []}
+
+    def test_streaming_and_arrays(self):
+        streaming = load_streaming_ds()
+        collector = MetricsCollector()
+        with collecting(collector):
+            streaming[streaming["Height"] > 170]["Weight"].sum().true()
+            Array(Integer(min=0, max=10)).dp(np.zeros(5), 1, 0.5)
+        counters = {
+            (c["metric"], c["event"], c["target"]): c["value"]
+            for c in collector.to_dict()["counters"]
+        }
+        ds = load_ds()
+        assert counters["rows_scanned", "true", "Sum"] == (ds.df["Height"] > 170).sum()
+        # the noise of an array is added by the type of its items
+        assert counters["noised_values", "noise", "Array"] == 5
+        assert ("noised_values", "noise", "Integer") not in counters
@@ -0,0 +1,72 @@
+import unittest
+import numpy as np
+
+from dwork.budget import BudgetAccountant
+from dwork.mechanisms import geometric_noise, laplace_noise, exponential_noise
+from dwork.mechanisms import ContinualCounter, KeyedCounter
+from dwork.language.types import Integer, Float
+
+
+class MechanismsTest(unittest.TestCase):
+
+    def test_array_shapes(self):
+        for f in (geometric_noise, laplace_noise, exponential_noise):
+            assert f(0.5, size=100).shape == (100,)
+            assert f(0.5, size=(3, 4)).shape == (3, 4)
+        assert geometric_noise(0.5, size=10).dtype == np.int64
+
+    def test_geometric_distribution(self):
+        # the vectorized noise should follow the distribution of the scalar noise
+        # (this is not a proper statistical test)
+        for symmetric in (True, False):
+            scalar = np.array([geometric_noise(0.5, symmetric=symmetric) for _ in range(20000)])
+            vector = geometric_noise(0.5, symmetric=symmetric, size=200000)
+            assert abs((scalar == 0).mean() - (vector == 0).mean()) < 0.02
+            assert abs(np.abs(scalar).mean() - np.abs(vector).mean()) < 0.1
+            assert abs(scalar.mean() - vector.mean()) < 0.1
+            assert (vector >= 0).all() or symmetric
+
+    def test_laplace_distribution(self):
+        scalar = np.array([laplace_noise(0.5) for _ in range(20000)])
+        vector = laplace_noise(0.5, size=200000)
+        # the variance of the Laplace distribution is 2/epsilon^2
+        assert abs(vector.var() - 8.0) < 0.5
+        assert abs(scalar.var() - vector.var()) < 1.0
+        assert abs(vector.mean()) < 0.05
+
+    def test_vectorized_dp(self):
+        values = np.array([0, 50, 200, 100])
+        result = Integer(min=0, max=200).dp(values, 10, 0.5)
+        assert result.shape == (4,)
+        assert (result >= 0).all() and (result <= 200).all()
+        result = Float(min=0.0, max=200.0).dp(values.astype(float), 10, 0.5)
+        assert result.shape == (4,)
+        assert (result >= 0).all() and (result <= 200).all()
+
+    def test_continual_counter(self):
+        for horizon in (None, 1000):
+            counter = ContinualCounter(1.0, horizon=horizon)
+            errors = [counter.update(t % 3) - sum(i % 3 for i in range(t + 1)) for t in range(1000)]
+            # the error grows polylogarithmically with the number of steps
+            assert np.abs(errors).mean() < 200
+            assert len(counter.tree.sums) <= 11
+        with self.assertRaises(ValueError):
+            counter.update(1)
+
+        accountant = BudgetAccountant(1.0)
+        keyed = KeyedCounter(0.5, accountant=accountant, keys=["a"])
+        assert accountant.remaining == 0.5
+        for _ in range(100):
+            totals = keyed.update({"a": 1})
+        totals = keyed.update({"b": 10000})
+        assert set(totals) == {"a", "b"}
+        # after 101 steps, six epochs are finished and the current tree has a
+        # horizon of 64 (i.e. 7 levels). Half of the budget is used for the
+        # trees (split over their levels), the other half for the epochs.
+        assert keyed.epochs == 6 and keyed.tree.levels == 7
+        std = lambda eps: np.sqrt(2 * np.exp(-eps)) / (1 - np.exp(-eps))
+        sigma = np.sqrt(7 * std(0.25 / 7) ** 2 + 6 * std(0.25) ** 2)
+        assert abs(totals["a"] - 101) < 6 * sigma
+        assert abs(totals["b"] - 10000) < 6 * sigma
+        counter = ContinualCounter(1.0, integer=False)
+        assert isinstance(counter.update(0.5), float)
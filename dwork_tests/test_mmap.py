@@ -0,0 +1,41 @@
+import unittest
+import pytest
+import numpy as np
+
+from dwork.dataset import mmap
+from dwork.dataset.mmap import MmapDataset
+from .test_expressions import load_ds
+
+class MmapTest(unittest.TestCase):
+
+    def test_mmap_dataset(self):
+        ds = load_ds()
+        path = f"{self.tmp_path}/absenteeism"
+        mmap.save(ds, path)
+
+        mds = MmapDataset(path)
+        # the columns are memory-mapped, not loaded
+        values = mds.df["Weight"].to_numpy()
+        while values.base is not None and not isinstance(values, np.memmap):
+            values = values.base
+        assert isinstance(values, np.memmap)
+        assert mds.schema.attributes["Height"].max == 200
+        assert mds.len().true() == ds.len().true()
+        assert mds["Weight"].sum().true() == ds["Weight"].sum().true()
+        dsf = mds[mds["Age"] > 30]
+        assert dsf["Height"].sum().true() == ds[ds["Age"] > 30]["Height"].sum().true()
+        dsg = mds.group_by(by=["Weight"], treshold=None)
+        assert (dsg.len().true() == ds.df.groupby("Weight").size()).all()
+
+    def test_filtered_save(self):
+        ds = load_ds()
+        path = f"{self.tmp_path}/filtered"
+        dsf = ds[ds["Age"] > 30]
+        mmap.save(dsf, path, columns=["Weight"])
+        mds = MmapDataset(path, schema=ds.schema)
+        assert list(mds.df.columns) == ["Weight"]
+        assert mds["Weight"].sum().true() == dsf["Weight"].sum().true()
+
+    @pytest.fixture(autouse=True)
+    def _tmp_path(self, tmp_path):
+        self.tmp_path = tmp_path
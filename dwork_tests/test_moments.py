@@ -0,0 +1,64 @@
+import unittest
+import numpy as np
+import pytest
+
+from dwork.dataset.streaming import StreamingDataset
+from dwork.language.functions import Mean
+from .test_expressions import load_ds
+
+class MomentsTest(unittest.TestCase):
+
+    def test_moments(self):
+        ds = load_ds()
+        weight = ds.df["Weight"]
+        assert ds["Weight"].mean().true() == pytest.approx(weight.mean())
+        assert ds["Weight"].variance().true() == pytest.approx(weight.var(ddof=0))
+        assert ds["Weight"].std().true() == pytest.approx(weight.std(ddof=0))
+        # the sensitivity of the sum of the centered values only depends on
+        # the schema
+        assert ds["Weight"].mean().sensitivity() == 100
+        assert abs(ds["Weight"].mean().dp(1.0) - weight.mean()) < 5
+        # the noisy variance can become negative, the deviation is zero then
+        assert 0 <= ds["Weight"].std().dp(1.0) < 3 * weight.std(ddof=0)
+
+        x = ds["Weight"] + ds["Height"]
+        values = weight + ds.df["Height"]
+        assert x.mean().true() == pytest.approx(values.mean())
+
+        dsf = ds[ds["Height"] > 170]
+        assert dsf["Weight"].mean().true() == pytest.approx(weight[ds.df["Height"] > 170].mean())
+
+        # like quantiles, statistics of empty selections cannot be computed
+        empty = ds[ds["Height"] > 1000]["Weight"]
+        for statistic in (empty.mean(), empty.std(), empty.quantile(0.5)):
+            with self.assertRaises(ValueError):
+                statistic.true()
+
+    def test_single_pass(self):
+        ds = load_ds()
+        passes = []
+
+        class CountingMean(Mean):
+            def compute_moments(self):
+                passes.append(1)
+                return super().compute_moments()
+
+        mean = CountingMean(ds["Weight"])
+        ds.evaluate_batch([mean, ds["Weight"].variance(), ds["Weight"].std()], 0.5)
+        assert len(passes) == 1
+
+    def test_grouped(self):
+        ds = load_ds()
+        dsg = ds.group_by(by=["Height"], treshold=None)
+        expected = ds.df.groupby("Height")["Weight"]
+        assert np.allclose(dsg["Weight"].mean().true(), expected.mean())
+        assert np.allclose(dsg["Weight"].variance().true(), expected.var(ddof=0))
+        result = dsg["Weight"].mean().dp(1.0)
+        assert len(result) == len(expected.mean())
+        assert ((result >= 0) & (result <= 200)).all()
+
+        chunks = lambda: (ds.df[i : i + 100] for i in range(0, len(ds.df), 100))
+        sds = StreamingDataset(ds.schema, chunks)
+        assert sds["Weight"].variance().true() == pytest.approx(ds.df["Weight"].var(ddof=0))
+        sdsg = sds.group_by(by=["Height"], treshold=None)
+        assert np.allclose(sdsg["Weight"].mean().true(), expected.mean())
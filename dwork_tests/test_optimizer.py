@@ -0,0 +1,65 @@
+import unittest
+
+from dwork.language import evaluation
+from dwork.language.expression import Constant, walk
+from dwork.language.functions import Sum
+from dwork.language.operators import Add, Mul, TrueDiv
+from dwork.language.optimizer import Folded, optimize, optimize_all, type_key
+from .test_expressions import load_ds
+
+te = Constant
+
+
+class OptimizerTest(unittest.TestCase):
+
+    def check(self, expression):
+        optimized = optimize(expression)
+        assert type_key(optimized.type) == type_key(expression.type)
+        assert optimized.sensitivity() == expression.sensitivity()
+        assert optimized.true() == expression.true()
+        return optimized
+
+    def test_constant_folding(self):
+        ds = load_ds()
+        x = (te(2.0) * te(3.0) * ds["Weight"]).sum()
+        optimized = self.check(x)
+        assert optimized is not x
+        mul = optimized.expression
+        assert isinstance(mul.left, Folded) and mul.left.value == 6.0
+        # folded constants keep the type of the folded expression
+        assert type_key(mul.left.type) == type_key(x.expression.left.type)
+        self.check(te(1.0) + te(1.0) / te(2.0) * ds["Height"].sum())
+
+    def test_division_by_zero(self):
+        # divisions by zero are left to the evaluation
+        ds = load_ds()
+        x = ds["Height"].sum() + te(1.0) / te(0)
+        optimized = optimize(x)
+        division = optimized.right
+        assert isinstance(division, TrueDiv) and not isinstance(division, Folded)
+        with self.assertRaises(ZeroDivisionError):
+            optimized.true()
+
+    def test_hoisting(self):
+        ds = load_ds()
+        x = (ds["Weight"] * te(2) * te(3)).sum()
+        optimized = self.check(x)
+        multiplications = [n for n in walk(optimized) if isinstance(n, Mul)]
+        assert len(multiplications) == 1
+        self.check(((te(1) + ds["Weight"]) + te(2)).sum())
+        self.check((te(2.0) * (ds["Weight"] * te(1.5))).sum())
+
+    def test_common_subexpressions(self):
+        ds = load_ds()
+        a = ds["Weight"] + ds["Height"]
+        b = ds["Weight"] + ds["Height"]
+        x = (a * b).sum() + (a - b).sum()
+        optimized = self.check(x)
+        additions = {id(n) for n in walk(optimized) if isinstance(n, Add) and n.key == a.key}
+        assert len(additions) == 1
+
+        first, second = optimize_all([a.sum(), b.sum()])
+        assert first is second
+        # evaluating both together yields identical values as well
+        with evaluation.evaluation():
+            assert optimized.true() == x.true()
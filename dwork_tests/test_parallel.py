@@ -0,0 +1,70 @@
+import unittest
+import pickle
+
+from dwork.dataset.parallel import ParallelExecutor, detach, evaluate_shard, evaluate_shared
+from dwork.dataset.shared import SharedDataset
+from dwork.language.evaluation import evaluation
+from .test_expressions import load_ds
+
+class ParallelTest(unittest.TestCase):
+
+    def test_parallel_aggregates(self):
+        ds = load_ds()
+        dsf = ds[ds["Age"] > 30]
+        dsg = dsf.group_by(by=["Weight"], treshold=None)
+        expressions = [
+            ds["Weight"].sum() / ds.len(),
+            (dsf["Weight"] * 2 - dsf["Height"]).sum(),
+            dsf.len(),
+            dsg["Height"].sum() / dsg.len(),
+        ]
+        with ParallelExecutor(processes=4, min_shard_rows=1) as executor:
+            with evaluation():
+                executor.precompute(expressions)
+                parallel = [e.true() for e in expressions]
+                sensitivities = [e.sensitivity() for e in expressions]
+            # the worker processes are reused for further queries
+            pool = executor.pool()
+            results = executor.evaluate(expressions, 0.5)
+            assert executor.pool() is pool
+        assert parallel[:3] == [e.true() for e in expressions[:3]]
+        assert (parallel[3] == expressions[3].true()).all()
+        assert sensitivities[:3] == [e.sensitivity() for e in expressions[:3]]
+        assert len(results) == 4
+        assert list(results[3].index) == list(dsg.groups)
+
+    def test_shards(self):
+        ds = load_ds()
+        dsf = ds[ds["Age"] > 30]
+        _, tasks = ParallelExecutor().tasks([dsf["Weight"].sum(), dsf.len()])
+        for shards in (1, 3, 7):
+            partials = [evaluate_shard(tasks, shard, shards) for shard in range(shards)]
+            assert sum(p[0] for p in partials) == dsf["Weight"].sum().true()
+            assert sum(p[1] for p in partials) == dsf.len().true()
+
+    def test_shared_tasks(self):
+        ds = load_ds()
+        dsf = ds[ds["Age"] > 30]
+        dsg = dsf.group_by(by=["Weight"], treshold=None)
+        expressions = [(dsf["Weight"] * 2).sum(), dsg["Height"].sum(), dsg.len()]
+        with ParallelExecutor(processes=2) as executor:
+            _, tasks = executor.tasks(expressions)
+            shared_tasks = [task.map(executor.arrays.segment) for task in tasks]
+            # the workers only receive the segments of the arrays
+            assert len(pickle.dumps(shared_tasks)) < 2048
+            blocks = dict(executor.arrays.blocks)
+            assert len(blocks) == 4
+            # the arrays are copied into shared memory only once
+            [task.map(executor.arrays.segment) for task in tasks]
+            assert executor.arrays.blocks == blocks
+            partials = [evaluate_shared(shared_tasks, shard, 3) for shard in range(3)]
+            detach([])
+            assert sum(p[0] for p in partials) == expressions[0].true()
+            assert (sum(p[1] for p in partials) == expressions[1].true().to_numpy()).all()
+            assert (sum(p[2] for p in partials) == expressions[2].true().to_numpy()).all()
+            # the columns of shared datasets are not copied
+            with SharedDataset.publish(ds) as sds:
+                segment = executor.arrays.segment(sds.df["Weight"].to_numpy())
+                assert segment.name == sds.memory.name
+                assert len(executor.arrays.blocks) == 4
+        assert executor.arrays.blocks == {}
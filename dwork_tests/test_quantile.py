@@ -0,0 +1,55 @@
+import unittest
+import numpy as np
+
+from dwork.language import evaluation
+from dwork.language.functions import Quantile
+from dwork.mechanisms import exponential_mechanism
+from .test_expressions import load_ds
+
+class QuantileTest(unittest.TestCase):
+
+    def test_exponential_mechanism(self):
+        utilities = np.array([[0.0, -10.0, -10.0], [-10.0, -10.0, 0.0]])
+        choices = [exponential_mechanism(utilities, 2.0) for _ in range(100)]
+        assert np.mean([list(c) == [0, 2] for c in choices]) > 0.9
+        # candidates without weight are never sampled
+        choices = exponential_mechanism(np.zeros((1000, 3)), 1.0, weights=[1, 0, 1])
+        assert (choices != 1).all()
+
+    def test_quantiles(self):
+        ds = load_ds()
+        weight = ds["Weight"]
+        median = weight.median()
+        assert median.true() == ds.df["Weight"].median()
+        results = [median.dp(1.0) for _ in range(50)]
+        assert 0 <= min(results) and max(results) <= 200
+        assert abs(np.median(results) - median.true()) < 5
+
+        q = weight.quantiles([0.1, 0.5, 0.9])
+        assert (q.true() == np.quantile(ds.df["Weight"], [0.1, 0.5, 0.9])).all()
+        result = q.dp(3.0)
+        assert result.shape == (3,)
+        assert result[0] < result[2]
+
+        dsf = ds[ds["Height"] > 170]
+        assert dsf["Weight"].quantile(0.5).true() == ds.df[ds.df["Height"] > 170]["Weight"].median()
+
+        with self.assertRaises(ValueError):
+            weight.quantile(1.5)
+
+    def test_shared_sort(self):
+        ds = load_ds()
+        sorts = []
+
+        class CountingQuantile(Quantile):
+            def sort(self):
+                sorts.append(1)
+                return super().sort()
+
+        a = CountingQuantile(ds["Weight"], 0.25)
+        b = CountingQuantile(ds["Weight"], 0.75)
+        ds.evaluate_batch([a, b], 0.5)
+        assert len(sorts) == 1
+        with evaluation.evaluation():
+            a.true(), b.true()
+        assert len(sorts) == 2
@@ -0,0 +1,74 @@
+import unittest
+import gc
+import pickle
+import multiprocessing
+import numpy as np
+import pytest
+
+from dwork.budget import BudgetAccountant, BudgetExceeded
+from dwork.cache import ResultCache
+from dwork.dataset.pandas import PandasDataset
+from dwork.dataset.shared import SharedDataset
+from .test_expressions import load_ds
+
+def weight_sum(ds):
+    return ds[ds["Age"] > 30]["Weight"].sum().true()
+
+class SharedTest(unittest.TestCase):
+
+    def test_shared_dataset(self):
+        ds = load_ds()
+        with SharedDataset.publish(ds) as sds:
+            assert sds.len().true() == len(ds.df)
+            assert sds["Weight"].sum().true() == ds["Weight"].sum().true()
+            assert (sds.df["Age"].to_numpy() == ds.df["Age"].to_numpy()).all()
+            # the columns are not copied
+            assert np.shares_memory(sds.df["Weight"].to_numpy(), np.frombuffer(sds.memory.buf, dtype=np.uint8))
+
+            # pickling only transfers the handle
+            data = pickle.dumps(sds)
+            assert len(data) < 2048
+            attached = pickle.loads(data)
+            assert attached.schema.attributes.keys() == ds.schema.attributes.keys()
+            assert attached.schema.attributes["Weight"].max == 200
+            assert attached["Weight"].sum().true() == ds["Weight"].sum().true()
+            attached.close()
+
+            # attached copies are closed when they are garbage collected
+            attached = pickle.loads(data)
+            memory = attached.memory
+            del attached
+            gc.collect()
+            assert memory.buf is None
+
+            with multiprocessing.get_context("fork").Pool(2) as pool:
+                results = pool.map(weight_sum, [sds, sds])
+            assert results == [weight_sum(ds)] * 2
+
+    def test_filtered_publish(self):
+        ds = load_ds()
+        dsf = ds[ds["Age"] > 30]
+        with SharedDataset.publish(dsf, columns=["Weight", "Height"]) as sds:
+            assert list(sds.df.columns) == ["Weight", "Height"]
+            assert sds.len().true() == dsf.len().true()
+            assert sds["Height"].sum().true() == dsf["Height"].sum().true()
+
+    def test_budget(self):
+        ds = load_ds()
+        accountant = BudgetAccountant(1.0)
+        cache = ResultCache()
+        ds = PandasDataset(ds.schema, ds.df, accountant=accountant, cache=cache)
+        with SharedDataset.publish(ds[ds["Age"] > 30]) as sds:
+            assert sds.accountant is accountant
+            assert sds.cache is cache
+            # queries on the shared copy spend the budget of the original
+            sds["Weight"].sum().dp(0.5)
+            sds["Height"].sum().dp(0.5)
+            assert accountant.spent == pytest.approx(1.0)
+            with self.assertRaises(BudgetExceeded):
+                sds.len().dp(0.5)
+            # repeated queries are answered from the cache of the original
+            sds["Weight"].sum().dp(0.5)
+            # other processes could not charge the budget
+            with self.assertRaises(TypeError):
+                pickle.dumps(sds)
@@ -0,0 +1,119 @@
+import unittest
+import gc
+import tracemalloc
+import pytest
+import numpy as np
+import pandas as pd
+
+from dwork.dataset.streaming import StreamingDataset
+from .test_expressions import AbsenteeismSchema, datasets_path
+
+filename = f"{datasets_path}/absenteeism_at_work.csv"
+
+def load_streaming_ds(chunksize=100):
+    return StreamingDataset.from_csv(AbsenteeismSchema, filename, chunksize=chunksize, sep=";")
+
+class StreamingTest(unittest.TestCase):
+
+    def test_aggregates(self):
+        ds = load_streaming_ds()
+        df = pd.read_csv(filename, sep=";")
+
+        assert ds.len().true() == len(df)
+        assert ds["Weight"].sum().true() == df["Weight"].sum()
+        assert ds["Weight"].true().max() == df["Weight"].max()
+        assert ds["Height"].true().min() == df["Height"].min()
+        x = (ds["Weight"] * 2 - ds["Height"]).sum()
+        assert x.true() == (df["Weight"] * 2 - df["Height"]).sum()
+        assert (ds["Weight"].sum() / ds.len()).true() == df["Weight"].mean()
+        assert (ds["Weight"].sum() / ds.len()).dp(0.5) > 0
+
+        # the operations of deep expressions are evaluated without recursion
+        x = ds["Weight"]
+        for i in range(1200):
+            x = x + ds["Height"]
+        assert x.sum().true() == df["Weight"].sum() + 1200 * df["Height"].sum()
+
+    def test_memory(self):
+        # the memory used by a scan does not grow with the number of chunks
+        def chunks():
+            for i in range(40):
+                values = np.arange(50_000) % 200
+                yield pd.DataFrame({"Weight": values, "Height": values[::-1]})
+
+        chunk = 2 * 50_000 * 8
+        ds = StreamingDataset(AbsenteeismSchema, chunks)
+        queries = [
+            lambda: ds["Weight"].sum().true(),
+            lambda: ds[ds["Weight"] > 50]["Height"].sum().true(),
+            lambda: (ds[ds["Weight"] > 50]["Height"].sum() / ds.len()).dp(1.0),
+            lambda: ds.group_by(by=["Weight"], treshold=None)["Height"].sum().true(),
+        ]
+        for query in queries:
+            gc.collect()
+            tracemalloc.start()
+            try:
+                query()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            assert peak < 8 * chunk
+
+    def test_filtering(self):
+        ds = load_streaming_ds()
+        df = pd.read_csv(filename, sep=";")
+
+        dsf = ds[ds["Age"] > 30]
+        dsff = dsf[(dsf["Weight"] > 80) | ~(dsf["Height"] < 170)]
+        expected = df[df["Age"] > 30]
+        expected = expected[(expected["Weight"] > 80) | ~(expected["Height"] < 170)]
+        assert dsf.len().true() == (df["Age"] > 30).sum()
+        assert dsff.len().true() == len(expected)
+        assert dsff["Weight"].sum().true() == expected["Weight"].sum()
+        assert ds[ds["Height"] > ds["Weight"]].len().true() == (df["Height"] > df["Weight"]).sum()
+
+    def test_group_by(self):
+        ds = load_streaming_ds()
+        df = pd.read_csv(filename, sep=";")
+
+        dsg = ds[ds["Age"] > 30].group_by(by=["Weight"], treshold=None)
+        expected = df[df["Age"] > 30].groupby("Weight")
+        mean_heights = (dsg["Height"].sum() / dsg.len()).true()
+        assert list(mean_heights.index) == list(expected.size().index)
+        assert (mean_heights == expected["Height"].mean()).all()
+        assert (dsg.len().true() == expected.size()).all()
+        assert len(dsg.datasets) == len(dsg.groups)
+
+        dsg = ds.group_by(by=["Weight"], treshold=len(df) * 10)
+        assert dsg.groups == []
+        assert len(dsg["Height"].sum().true()) == 0
+
+    def test_single_scan(self):
+        scans = []
+        df = pd.read_csv(filename, sep=";")
+
+        def chunks():
+            scans.append(True)
+            for i in range(0, len(df), 100):
+                yield df[i:i + 100]
+
+        ds = StreamingDataset(AbsenteeismSchema, chunks)
+        dsf = ds[ds["Age"] > 30]
+        expressions = [ds["Weight"].sum() / ds.len(), dsf["Height"].sum(), dsf.len()]
+        results = ds.evaluate_batch(expressions, 0.5)
+        assert len(results) == 3
+        # all aggregates are computed in a single scan over the data
+        assert len(scans) == 1
+
+    def test_parquet(self):
+        pytest.importorskip("pyarrow")
+        df = pd.read_csv(filename, sep=";")
+        parquet_filename = f"{self.tmp_path}/absenteeism.parquet"
+        df.to_parquet(parquet_filename, row_group_size=100)
+        ds = StreamingDataset.from_parquet(AbsenteeismSchema, parquet_filename, batch_size=64)
+        assert ds.len().true() == len(df)
+        assert ds[ds["Age"] > 30]["Weight"].sum().true() == df[df["Age"] > 30]["Weight"].sum()
+
+    @pytest.fixture(autouse=True)
+    def _tmp_path(self, tmp_path):
+        self.tmp_path = tmp_path
@@ -4,7 +4,7 @@ from req import reqs
 
 setup(
     name="dwork",
-    python_requires=">=3.6",
+    python_requires=">=3.8",
     version="0.0.13",
     author="KIProtect GmbH",
     author_email="dwork@kiprotect.com",